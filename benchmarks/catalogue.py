@@ -0,0 +1,151 @@
+"""
+Builds synthetic working trees for the benchmarks: YAML catalogues for
+generate_files and a directory of Python scripts for
+generate_yaml_from_scripts, laid out the way the real repository is.
+"""
+import os
+import random
+import string
+import shutil
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT_TEMPLATES = [
+    '''"""
+Exports the daily {name} table to a CSV file.
+
+Objective: Keep a local copy of the {name} data for reporting.
+"""
+import argparse
+import pandas as pd
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default='{name}.csv')
+    args = parser.parse_args()
+    df = pd.read_csv('input_{name}.csv')
+    df.to_csv(args.output)
+
+if __name__ == "__main__":
+    main()
+''',
+    '''import os
+import requests
+
+def sync_{name}():
+    token = os.getenv('API_TOKEN')
+    response = requests.get('https://example.com/{name}', headers={{'Authorization': token}})
+    requests.post('https://example.com/{name}/copy', json=response.json())
+
+sync_{name}()
+''',
+]
+
+def random_pk():
+    return "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(5))
+
+def write_yaml(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f, sort_keys=False, indent=2)
+
+def write_templates(root, pk_count):
+    """labels.yaml from the repository and a pk.yaml with pk_count unused pks."""
+    templates = os.path.join(root, "src", "templates")
+    os.makedirs(templates, exist_ok=True)
+    shutil.copy(os.path.join(REPO_ROOT, "src", "templates", "labels.yaml"), templates)
+    pks = set()
+    while len(pks) < pk_count:
+        pks.add(random_pk())
+    with open(os.path.join(templates, "pk.yaml"), 'w') as f:
+        f.write("# Available pk's\n" + yaml.safe_dump([{"pk": pk, "used": False} for pk in pks], sort_keys=False))
+
+def markdown_item(index, reference_every):
+    item = {
+        "author": "bench@example.com",
+        "tagline_required": "1",
+        "update_date": "1/1/2025",
+        "version": "1",
+        "type": "article",
+        "pk": f"md{index:05d}",
+        "new_filename": f"article_{index:05d}.md",
+        "new_filepath": "finished_files/articles",
+        "old_filepath": "source_files/articles",
+        "description": f"Benchmark article number {index}",
+        "approx_total_words": "500",
+        "labels": ["#article", "#best_practice"],
+        "generated": "false",
+        "number_of_diagrams": "1",
+        "diagram_1_pk": f"dg{index:05d}",
+        "diagram_prompt_1": f"Architecture of benchmark article {index}",
+    }
+    if reference_every and index % reference_every == 0:
+        item["existing_filename"] = f"article_{index:05d}.md"
+    return item
+
+def script_item(index):
+    return {
+        "author": "bench@example.com",
+        "tagline_required": "1",
+        "update_date": "1/1/2025",
+        "version": "1",
+        "type": "script",
+        "pk": f"sc{index:05d}",
+        "new_filename": f"script_{index:05d}.py",
+        "new_filepath": "finished_files/scripts",
+        "old_filepath": "source_files/scripts",
+        "description": f"Benchmark script number {index}",
+        "objective": "Exercise the generator",
+        "input": "A configuration file",
+        "output": "A report",
+        "language": "python",
+        "labels": ["#script"],
+        "generated": "false",
+        "number_of_diagrams": "1",
+        "diagram_1_pk": f"ds{index:05d}",
+        "diagram_prompt_1": f"Flow chart of benchmark script {index}",
+    }
+
+def diagram_item(index):
+    return {
+        "new_filename": f"diagram_{index:05d}.png",
+        "new_filepath": "finished_files/images",
+        "text": f"Sequence diagram for benchmark flow {index}",
+    }
+
+def build_generate_catalogue(root, size, reference_every=10):
+    """
+    Writes markdown.yaml, script.yaml and diagram.yaml with `size` items split
+    evenly between them, plus a short previous version for every
+    reference_every-th article.
+    """
+    counts = [size // 3 + (1 if i < size % 3 else 0) for i in range(3)]
+    markdown = [markdown_item(i, reference_every) for i in range(counts[0])]
+    scripts = [script_item(i) for i in range(counts[1])]
+    diagrams = [diagram_item(i) for i in range(counts[2])]
+    yaml_dir = os.path.join(root, "source_files", "yaml")
+    write_yaml(os.path.join(yaml_dir, "markdown.yaml"), markdown)
+    write_yaml(os.path.join(yaml_dir, "script.yaml"), scripts)
+    write_yaml(os.path.join(yaml_dir, "diagram.yaml"), {"diagrams": diagrams})
+    for directory in ("finished_files/articles", "finished_files/scripts", "finished_files/images",
+                      "source_files/articles", "source_files/scripts"):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    for item in markdown:
+        if item.get("existing_filename"):
+            with open(os.path.join(root, item["old_filepath"], item["existing_filename"]), 'w') as f:
+                f.write(f"# {item['description']}\n\n" + "Previous version of the article. " * 50)
+    write_templates(root, pk_count=16)
+    return sum(counts)
+
+def build_scripts_catalogue(root, size):
+    """Writes `size` Python scripts (half with docstrings) and enough free pks for them."""
+    scripts_dir = os.path.join(root, "source_files", "scripts")
+    os.makedirs(scripts_dir, exist_ok=True)
+    os.makedirs(os.path.join(root, "source_files", "yaml"), exist_ok=True)
+    for index in range(size):
+        template = SCRIPT_TEMPLATES[index % len(SCRIPT_TEMPLATES)]
+        with open(os.path.join(scripts_dir, f"script_{index:05d}.py"), 'w') as f:
+            f.write(template.format(name=f"table_{index}"))
+    write_templates(root, pk_count=2 * size + 16)
+    return size
@@ -0,0 +1,390 @@
+"""
+Local stand-ins for the OpenAI-compatible chat endpoint (used through
+LLM=lmstudio), the OpenAI, Anthropic and Gemini batch APIs (used through
+--batch with OPENAI_BASE_URL, ANTHROPIC_BASE_URL or GEMINI_BASE_URL) and the
+Eraser render endpoint, so throughput can be measured without calling the
+real APIs.
+
+Run on their own with:
+    python -m benchmarks.mock_servers --latency 0.2 --jitter 0.05 --error-rate 0.01
+"""
+import re
+import json
+import time
+import uuid
+import zlib
+import random
+import struct
+import argparse
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOREM = (
+    "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud"
+).split()
+
+class Profile:
+    """Latency, jitter and failure rates applied to every request a mock server answers."""
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=0.1, completion_words=300):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.completion_words = completion_words
+
+    def delay(self):
+        return max(0.0, random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+    def fault(self):
+        """Returns 429 or 500 for a request that should fail, else None."""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+def completion_text(prompt, words):
+    """A canned completion; script analysis prompts get the YAML they ask for."""
+    if "Format your response as raw YAML" in prompt:
+        return (
+            "---\n"
+            "description: Processes the input data and writes a report.\n"
+            "objective: Automate a repetitive data task.\n"
+            "input: Takes a configuration file path.\n"
+            "output: Writes a CSV report.\n"
+            "labels:\n  - '#script'\n  - '#automation'\n"
+        )
+    return " ".join(random.choice(LOREM) for _ in range(words))
+
+def png_bytes(width=256, height=256):
+    """A valid solid-colour PNG, standing in for a rendered diagram."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    raw = b"".join(b"\x00" + b"\xff\xff\xff" * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 9))
+        + chunk(b"IEND", b"")
+    )
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    profile = Profile()
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("content-length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def read_json(self, body=None):
+        body = self.read_body() if body is None else body
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def fail(self):
+        """Sends a profile-chosen failure and returns True, or returns False."""
+        status = self.profile.fault()
+        if status == 429:
+            self.send_json(429, {"error": "rate limited"}, {"retry-after": str(self.profile.retry_after)})
+        elif status:
+            self.send_json(status, {"error": "mock server error"})
+        return bool(status)
+
+class LLMHandler(MockHandler):
+    """POST /v1/chat/completions, plain or streamed as server-sent events."""
+    def do_POST(self):
+        payload = self.read_json()
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": "not found"})
+            return
+        delay = self.profile.delay()
+        if self.fail():
+            return
+        prompt = "".join(message.get("content", "") for message in payload.get("messages", []))
+        text = completion_text(prompt, self.profile.completion_words)
+        if not payload.get("stream"):
+            time.sleep(delay)
+            self.send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            })
+            return
+        # Half the latency before the first chunk, the rest spread over the stream
+        pieces = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+        time.sleep(delay / 2)
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        for piece in pieces:
+            event = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(delay / 2 / len(pieces))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+class Batch:
+    """One submitted batch: its prompts by custom id, finished `latency` seconds after creation."""
+    def __init__(self, provider, prompts, latency):
+        self.id = f"batch_{uuid.uuid4().hex[:12]}"
+        self.provider = provider
+        self.prompts = prompts
+        self.ready_at = time.monotonic() + latency
+
+    @property
+    def finished(self):
+        return time.monotonic() >= self.ready_at
+
+class BatchHandler(MockHandler):
+    """
+    The batch endpoints goo10burg uses, for all three providers at once:
+    OpenAI (POST /files, POST /batches, GET /batches/<id>, GET /files/<id>/content),
+    Anthropic (POST /messages/batches, GET /messages/batches/<id>[/results]) and
+    Gemini (POST /models/<model>:batchGenerateContent, GET /batches/<id>).
+    A batch reports itself in progress until the profile latency has passed.
+    Any path prefix (/v1, /v1beta) is accepted.
+    """
+    lock = threading.Lock()
+    # Replaced with fresh dicts for each server by start_batch_server
+    files = {}
+    batches = {}
+
+    def create_batch(self, provider, prompts):
+        batch = Batch(provider, prompts, self.profile.delay())
+        with self.lock:
+            self.batches[batch.id] = batch
+        return batch
+
+    def completions(self, batch):
+        return {custom_id: completion_text(prompt, self.profile.completion_words)
+                for custom_id, prompt in batch.prompts.items()}
+
+    def send_lines(self, entries):
+        body = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/jsonl")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.fail():
+            return
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/files"):
+            self.upload_file(body)
+        elif path.endswith("/messages/batches"):
+            payload = self.read_json(body)
+            batch = self.create_batch("anthropic", {
+                request["custom_id"]: "".join(message.get("content", "")
+                                              for message in request["params"].get("messages", []))
+                for request in payload.get("requests", [])
+            })
+            self.send_json(200, {"id": batch.id, "processing_status": "in_progress"})
+        elif path.endswith("/batches"):
+            payload = self.read_json(body)
+            lines = self.files.get(payload.get("input_file_id"), "").splitlines()
+            requests = [json.loads(line) for line in lines if line.strip()]
+            batch = self.create_batch("openai", {
+                request["custom_id"]: "".join(message.get("content", "")
+                                              for message in request["body"].get("messages", []))
+                for request in requests
+            })
+            self.send_json(200, {"id": batch.id, "status": "validating"})
+        elif path.endswith(":batchGenerateContent"):
+            payload = self.read_json(body)
+            requests = payload.get("batch", {}).get("input_config", {}).get("requests", {}).get("requests", [])
+            batch = self.create_batch("gemini", {
+                request["metadata"]["key"]: "".join(part.get("text", "") for content in request["request"]["contents"]
+                                                    for part in content.get("parts", []))
+                for request in requests
+            })
+            self.send_json(200, {"name": f"batches/{batch.id}", "metadata": {"state": "BATCH_STATE_PENDING"}})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def upload_file(self, body):
+        """Takes the multipart upload of an OpenAI batch input file."""
+        message = BytesParser().parsebytes(
+            f"content-type: {self.headers.get('content-type')}\r\n\r\n".encode("utf-8") + body
+        )
+        content = ""
+        for part in message.walk():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True).decode("utf-8")
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self.lock:
+            self.files[file_id] = content
+        self.send_json(200, {"id": file_id, "purpose": "batch"})
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        match = re.search(r"/(batch_[0-9a-f]+)(/results)?$", path)
+        batch = self.batches.get(match.group(1)) if match else None
+        if path.endswith("/content"):
+            batch = self.batches.get(path.split("/")[-2].replace("file-", "", 1))
+            if batch is None:
+                self.send_json(404, {"error": "not found"})
+                return
+            self.send_lines(
+                {"custom_id": custom_id,
+                 "response": {"status_code": 200, "body": {"choices": [{"message": {"content": text}}]}}}
+                for custom_id, text in self.completions(batch).items()
+            )
+        elif batch is None:
+            self.send_json(404, {"error": "not found"})
+        elif batch.provider == "openai":
+            self.send_json(200, {
+                "id": batch.id,
+                "status": "completed" if batch.finished else "in_progress",
+                "output_file_id": f"file-{batch.id}" if batch.finished else None,
+            })
+        elif batch.provider == "anthropic" and match.group(2):
+            self.send_lines(
+                {"custom_id": custom_id,
+                 "result": {"type": "succeeded", "message": {"content": [{"type": "text", "text": text}]}}}
+                for custom_id, text in self.completions(batch).items()
+            )
+        elif batch.provider == "anthropic":
+            host, port = self.server.server_address[:2]
+            self.send_json(200, {
+                "id": batch.id,
+                "processing_status": "ended" if batch.finished else "in_progress",
+                "results_url": f"http://{host}:{port}/v1/messages/batches/{batch.id}/results"
+                               if batch.finished else None,
+            })
+        elif not batch.finished:
+            self.send_json(200, {"name": f"batches/{batch.id}", "metadata": {"state": "BATCH_STATE_RUNNING"}})
+        else:
+            self.send_json(200, {
+                "name": f"batches/{batch.id}",
+                "metadata": {"state": "BATCH_STATE_SUCCEEDED"},
+                "response": {"inlinedResponses": {"inlinedResponses": [
+                    {"metadata": {"key": custom_id},
+                     "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]}}
+                    for custom_id, text in self.completions(batch).items()
+                ]}},
+            })
+
+class EraserHandler(MockHandler):
+    """POST renders a diagram and returns its imageUrl; GET /images/... serves the PNG."""
+    image = png_bytes()
+
+    def do_POST(self):
+        self.read_json()
+        delay = self.profile.delay()
+        if self.fail():
+            return
+        time.sleep(delay)
+        host, port = self.server.server_address[:2]
+        self.send_json(200, {"imageUrl": f"http://{host}:{port}/images/{uuid.uuid4().hex}.png"})
+
+    def do_GET(self):
+        if not self.path.startswith("/images/"):
+            self.send_json(404, {"error": "not found"})
+            return
+        self.send_response(200)
+        self.send_header("content-type", "image/png")
+        self.send_header("content-length", str(len(self.image)))
+        self.end_headers()
+        self.wfile.write(self.image)
+
+class MockServer:
+    """Runs a handler on 127.0.0.1 with a free port in a background thread."""
+    def __init__(self, handler, profile, **attributes):
+        self.handler = type(handler.__name__, (handler,), {"profile": profile, **attributes})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def start_llm_server(profile):
+    return MockServer(LLMHandler, profile).start()
+
+def start_batch_server(profile):
+    return MockServer(BatchHandler, profile, files={}, batches={}).start()
+
+def start_eraser_server(profile):
+    return MockServer(EraserHandler, profile).start()
+
+def add_profile_arguments(parser, prefix="", defaults=None):
+    defaults = defaults or {}
+    dest = prefix.replace("-", "_")
+    parser.add_argument(f"--{prefix}latency", type=float, default=defaults.get("latency", 0.05),
+                        help="Mean response latency in seconds")
+    parser.add_argument(f"--{prefix}jitter", type=float, default=defaults.get("jitter", 0.0),
+                        help="Standard deviation of the latency in seconds")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=defaults.get("error_rate", 0.0),
+                        help="Fraction of requests answered with 500")
+    parser.add_argument(f"--{prefix}rate-limit-rate", type=float, default=defaults.get("rate_limit_rate", 0.0),
+                        help="Fraction of requests answered with 429")
+    return dest
+
+def profile_from_args(args, dest="", **kwargs):
+    return Profile(
+        latency=getattr(args, f"{dest}latency"),
+        jitter=getattr(args, f"{dest}jitter"),
+        error_rate=getattr(args, f"{dest}error_rate"),
+        rate_limit_rate=getattr(args, f"{dest}rate_limit_rate"),
+        **kwargs,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock LLM and Eraser servers")
+    add_profile_arguments(parser)
+    parser.add_argument("--completion-words", type=int, default=300)
+    args = parser.parse_args()
+    profile = profile_from_args(args, completion_words=args.completion_words)
+    llm = start_llm_server(profile)
+    batch = start_batch_server(profile)
+    eraser = start_eraser_server(profile)
+    print(f"LMSTUDIO_API_URL={llm.url}")
+    print(f"OPENAI_BASE_URL={batch.url}/v1")
+    print(f"ANTHROPIC_BASE_URL={batch.url}/v1")
+    print(f"GEMINI_BASE_URL={batch.url}/v1beta")
+    print(f"ERASER_API_URL={eraser.url}/api/render/prompt")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        llm.stop()
+        batch.stop()
+        eraser.stop()
+
+if __name__ == "__main__":
+    main()
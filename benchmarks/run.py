@@ -0,0 +1,169 @@
+"""
+Benchmarks generate_files and generate_yaml_from_scripts against local mock
+LLM and Eraser servers over synthetic catalogues, reporting items/sec, peak
+RSS and per-stage latency.
+
+    python -m benchmarks.run --sizes 10,100,1000 --latency 0.2 --jitter 0.05
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --tolerance 0.2
+    python -m benchmarks.run --targets generate --batch openai
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from benchmarks.catalogue import REPO_ROOT, build_generate_catalogue, build_scripts_catalogue
+from benchmarks.mock_servers import (
+    start_llm_server, start_batch_server, start_eraser_server, add_profile_arguments, profile_from_args,
+)
+
+# Base URL path each provider's batch client expects in front of its endpoints
+BATCH_BASE_PATHS = {"openai": "/v1", "anthropic": "/v1", "gemini": "/v1beta"}
+
+def benchmark_env(llm_url, eraser_url, args, batch_url=None):
+    env = dict(os.environ)
+    for name in ("LLM_CHAIN", "STREAM"):
+        env.pop(name, None)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "GOO10BURG_ROOT": REPO_ROOT,
+        "LLM": "lmstudio",
+        "LMSTUDIO_API_URL": llm_url,
+        "ERASER_API_URL": f"{eraser_url}/api/render/prompt",
+        "ERASER_API_KEY": "benchmark",
+        "LLM_CACHE": "false",
+        "STREAM": "true" if args.stream else "false",
+        "HTTP_MAX_CONNECTIONS": str(max(args.concurrency, args.diagram_concurrency) * 2),
+        "HTTP_MAX_KEEPALIVE": str(max(args.concurrency, args.diagram_concurrency) * 2),
+        "RETRY_BACKOFF_BASE": "0.05",
+        "RETRY_BACKOFF_CAP": "1",
+        "METRICS_ENABLED": "true",
+        "METRICS_DIR": "metrics",
+    })
+    if batch_url:
+        provider = args.batch
+        env.update({
+            "LLM": provider,
+            f"{provider.upper()}_API_KEY": "benchmark",
+            f"{provider.upper()}_BASE_URL": batch_url + BATCH_BASE_PATHS[provider],
+            "BATCH_WINDOW": "0.5",
+            "BATCH_POLL_INTERVAL": "0.2",
+        })
+    return env
+
+def run_one(target, size, env, args):
+    root = tempfile.mkdtemp(prefix=f"goo10burg-bench-{target}-{size}-")
+    try:
+        if target == "generate":
+            build_generate_catalogue(root, size)
+        else:
+            build_scripts_catalogue(root, size)
+        result_path = os.path.join(root, "result.json")
+        with open(os.path.join(root, "run.log"), 'w') as log:
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.worker", "--target", target,
+                 "--concurrency", str(args.concurrency),
+                 "--diagram-concurrency", str(args.diagram_concurrency),
+                 "--result", result_path] + (["--store"] if args.store else [])
+                + (["--batch"] if args.batch else []),
+                cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            raise Exception(f"Benchmark {target}/{size} failed, see {root}/run.log")
+        with open(result_path, 'r') as f:
+            result = json.load(f)
+        result["size"] = size
+        if args.batch:
+            result["batch"] = args.batch
+        return result
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+        else:
+            print(f"Kept working tree for {target}/{size} at {root}")
+
+def print_result(result):
+    target = f"{result['target']}/{result['batch']}" if result.get("batch") else result["target"]
+    print(f"{target:>9} {result['size']:>6} items: {result['items']:>6} done in {result['seconds']:8.2f}s, "
+          f"{result['items_per_second']:8.2f} items/s, peak RSS {result['peak_rss_mb']:7.1f} MB, "
+          f"import {result['import_seconds']:.2f}s")
+    for stage, stats in result["stages"].items():
+        print(f"{'':>17}{stage:>15}: {stats['calls']:>6} calls, {stats['failed']} failed, "
+              f"p50 {stats['p50']:.3f}s p95 {stats['p95']:.3f}s p99 {stats['p99']:.3f}s, "
+              f"queue p95 {stats['queue_p95']:.3f}s, retries {stats['retries']}")
+
+def regressions(results, baseline, tolerance):
+    """Lists runs whose throughput fell more than `tolerance` below the baseline."""
+    previous = {(r["target"], r["size"], r.get("batch")): r for r in baseline}
+    found = []
+    for result in results:
+        before = previous.get((result["target"], result["size"], result.get("batch")))
+        if before and before["items_per_second"] and \
+                result["items_per_second"] < before["items_per_second"] * (1 - tolerance):
+            found.append(f"{result['target']}/{result['size']}: {result['items_per_second']:.2f} items/s, "
+                         f"baseline {before['items_per_second']:.2f}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark goo10burg against local mock servers")
+    parser.add_argument("--sizes", default="10,100,1000,10000",
+                        help="Comma-separated catalogue sizes (default: 10,100,1000,10000)")
+    parser.add_argument("--targets", default="generate,scripts",
+                        help="Comma-separated targets: generate, scripts (default: both)")
+    parser.add_argument("--concurrency", type=int, default=16, help="LLM concurrency")
+    parser.add_argument("--diagram-concurrency", type=int, default=8, help="Eraser concurrency")
+    parser.add_argument("--stream", action="store_true", help="Stream completions")
+    parser.add_argument("--store", action="store_true", help="Run generate_files with the SQLite job store")
+    parser.add_argument("--batch", choices=sorted(BATCH_BASE_PATHS),
+                        help="Run generate_files in batch mode against the mock batch API of this provider")
+    parser.add_argument("--completion-words", type=int, default=300, help="Words per mock completion")
+    add_profile_arguments(parser)
+    add_profile_arguments(parser, prefix="eraser-", defaults={"latency": 0.1})
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare items/sec with results from an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed items/sec drop against the baseline (default: 0.2)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working trees")
+    args = parser.parse_args()
+
+    llm = start_llm_server(profile_from_args(args, completion_words=args.completion_words))
+    eraser = start_eraser_server(profile_from_args(args, "eraser_"))
+    batch = start_batch_server(profile_from_args(args, completion_words=args.completion_words)) if args.batch else None
+    env = benchmark_env(llm.url, eraser.url, args, batch.url if batch else None)
+    print(f"Mock LLM at {llm.url}, mock Eraser at {eraser.url}"
+          + (f", mock {args.batch} batch API at {batch.url}" if batch else ""))
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    if args.batch and "scripts" in targets:
+        print("Batch mode only applies to generate_files, skipping the scripts target")
+        targets.remove("scripts")
+    results = []
+    try:
+        for target in targets:
+            for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+                result = run_one(target, size, env, args)
+                print_result(result)
+                results.append(result)
+    finally:
+        llm.stop()
+        eraser.stop()
+        if batch:
+            batch.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"Regression: {line}")
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
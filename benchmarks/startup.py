@@ -0,0 +1,142 @@
+"""
+Measures how long the command-line entry points take to import, with
+`python -X importtime`, and checks that no provider SDK is imported before a
+model is called. Fails when an import gets slower than a baseline or a
+budget, or when an SDK shows up.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --baseline startup.json --tolerance 0.3
+    python -m benchmarks.startup --max-ms 500
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from benchmarks.catalogue import REPO_ROOT
+
+ENTRY_POINTS = [
+    "src.generator",
+    "src.worker",
+    "src.daemon",
+    "src.utils.script_to_yaml",
+    "src.utils.job_store",
+    "src.utils.csv_to_yaml",
+]
+
+# Top-level packages of the provider SDKs; none should load at import
+SDK_MODULES = ["openai", "anthropic", "google.generativeai", "tiktoken"]
+
+def startup_env(llm):
+    env = dict(os.environ)
+    for name in ("GEMINI_API_KEY", "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "OPENROUTER_API_KEY", "LLM_CHAIN"):
+        env.pop(name, None)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "LLM": llm,
+        # Keep .pyc writing out of the timings
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+def import_times(module, env):
+    """
+    Imports a module in a fresh interpreter and returns
+    ([(nesting level, imported module, cumulative microseconds), ...], error output),
+    in the order -X importtime prints them: every module after its imports.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    times = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        times.append((level, name.strip(), int(cumulative)))
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        return times, "\n".join(errors[-5:])
+    return times, ""
+
+def measure(module, env, repeat):
+    runs = []
+    for _ in range(repeat):
+        times, error = import_times(module, env)
+        if error:
+            raise Exception(f"Importing {module} failed:\n{error}")
+        runs.append(times)
+    sdks = {sdk for times in runs for _, name, _ in times for sdk in SDK_MODULES
+            if name == sdk or name.startswith(sdk + ".")}
+    # The entry point's direct imports are the level-1 lines just before its own
+    last = runs[-1]
+    end = next(i for i, (level, name, _) in enumerate(last) if level == 0 and name == module)
+    start = end
+    while start > 0 and last[start - 1][0] > 0:
+        start -= 1
+    heaviest = sorted(((name, us) for level, name, us in last[start:end] if level == 1),
+                      key=lambda entry: entry[1], reverse=True)[:5]
+    return {
+        "module": module,
+        "ms": round(statistics.median(next(us for level, name, us in times if level == 0 and name == module)
+                                      for times in runs) / 1000, 1),
+        "sdks": sorted(sdks),
+        "heaviest": [[name, round(us / 1000, 1)] for name, us in heaviest],
+    }
+
+def regressions(results, baseline, tolerance, max_ms):
+    previous = {r["module"]: r for r in baseline}
+    found = []
+    for result in results:
+        if result["sdks"]:
+            found.append(f"{result['module']} imports {', '.join(result['sdks'])} at startup")
+        if max_ms and result["ms"] > max_ms:
+            found.append(f"{result['module']}: {result['ms']:.1f} ms, budget {max_ms:.1f} ms")
+        before = previous.get(result["module"])
+        if before and result["ms"] > before["ms"] * (1 + tolerance):
+            found.append(f"{result['module']}: {result['ms']:.1f} ms, baseline {before['ms']:.1f} ms")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the goo10burg entry points")
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS),
+                        help="Comma-separated modules to import (default: every entry point)")
+    parser.add_argument("--llm", default="gemini", help="LLM setting to import with (default: gemini)")
+    parser.add_argument("--repeat", type=int, default=5, help="Imports per module; the median is reported")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with results from an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed slowdown against the baseline (default: 0.3)")
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail when any import takes longer than this")
+    args = parser.parse_args()
+
+    env = startup_env(args.llm)
+    results = []
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        result = measure(module, env, args.repeat)
+        results.append(result)
+        heaviest = ", ".join(f"{name} {ms:.1f}" for name, ms in result["heaviest"])
+        print(f"{module:>26}: {result['ms']:8.1f} ms  (heaviest: {heaviest})")
+        if result["sdks"]:
+            print(f"{'':>28}provider SDKs imported: {', '.join(result['sdks'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    baseline = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    found = regressions(results, baseline, args.tolerance, args.max_ms)
+    for line in found:
+        print(f"Regression: {line}")
+    if found:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Runs one benchmark in a fresh process, from inside a synthetic working tree,
+and writes its timings to a JSON file. Started by benchmarks.run with the
+environment pointing goo10burg at the mock servers, since config is read
+once at import.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+
+def completed_items(yaml_dir="source_files/yaml"):
+    """
+    Counts the catalogue entries marked generated after a run. Benchmark
+    catalogues start with every entry pending, so this is the number of
+    items the run completed, whatever files each item wrote.
+    """
+    from src.generator import GENERATED_SOURCES
+    from src.utils.job_store import is_generated
+    from src.utils.yaml_io import Catalogue
+    count = 0
+    for filename in GENERATED_SOURCES:
+        file_path = os.path.join(yaml_dir, filename)
+        if not os.path.exists(file_path):
+            continue
+        data = Catalogue.load(file_path).data
+        if isinstance(data, dict):
+            data = next((value for value in data.values() if isinstance(value, list)), [])
+        count += sum(1 for item in data or [] if isinstance(item, dict) and is_generated(item))
+    return count
+
+def stage_latencies(records):
+    from src.utils.metrics import percentile
+    stages = {}
+    for call in records:
+        stages.setdefault(call["stage"], []).append(call)
+    return {
+        stage: {
+            "calls": len(calls),
+            "failed": sum(1 for call in calls if not call["ok"]),
+            "p50": percentile([call["wall"] for call in calls], 50),
+            "p95": percentile([call["wall"] for call in calls], 95),
+            "p99": percentile([call["wall"] for call in calls], 99),
+            "queue_p95": percentile([call["queue_wait"] for call in calls], 95),
+            "retries": sum(call.get("retries", 0) for call in calls),
+        }
+        for stage, calls in sorted(stages.items())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one goo10burg benchmark")
+    parser.add_argument("--target", choices=["generate", "scripts"], required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--diagram-concurrency", type=int, default=8)
+    parser.add_argument("--store", action="store_true", help="Use the SQLite job store")
+    parser.add_argument("--batch", action="store_true", help="Submit prompts through the provider batch API")
+    parser.add_argument("--result", required=True, help="Where to write the JSON result")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.environ.get("GOO10BURG_ROOT", os.getcwd()))
+    started = time.perf_counter()
+    from src.utils.metrics import metrics
+    if args.target == "generate":
+        from src.generator import generate_files
+        imported = time.perf_counter()
+        asyncio.run(generate_files(llm_concurrency=args.concurrency, diagram_concurrency=args.diagram_concurrency,
+                                   store=args.store, batch=args.batch))
+        finished = time.perf_counter()
+        items = completed_items()
+    else:
+        from src.utils.script_to_yaml import generate_yaml_from_scripts
+        imported = time.perf_counter()
+        entries = asyncio.run(generate_yaml_from_scripts(
+            "source_files/scripts", "source_files/yaml/script_entries.yaml", concurrency=args.concurrency,
+        ))
+        finished = time.perf_counter()
+        items = len(entries or [])
+
+    result = {
+        "target": args.target,
+        "items": items,
+        "import_seconds": round(imported - started, 3),
+        "seconds": round(finished - imported, 3),
+        "items_per_second": round(items / (finished - imported), 2) if finished > imported else 0.0,
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "stages": stage_latencies(metrics.records),
+    }
+    with open(args.result, 'w') as f:
+        json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,137 @@ load_dotenv()
 class Config:
     def __init__(self):
         self.llm = os.getenv("LLM", "gemini").lower() # default to gemini, options: gemini, anthropic, openai
+        # Ordered provider chain for failover and hedging, e.g. LLM_CHAIN=gemini,openrouter,lmstudio
+        self.llm_chain = [name.strip().lower() for name in os.getenv("LLM_CHAIN", "").split(",") if name.strip()]
+        if self.llm_chain:
+            self.llm = self.llm_chain[0]
         self.gemini_api_key = os.getenv("GEMINI_API_KEY")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
         self.openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
         self.eraserio_api_key = os.getenv("ERASERIO_API_KEY")
+        # Maximum number of calls in flight at once, per provider
+        self.llm_concurrency = int(os.getenv("LLM_CONCURRENCY", "4"))
+        self.diagram_concurrency = int(os.getenv("DIAGRAM_CONCURRENCY", "2"))
+        # Shared HTTP connection pools
+        self.http2 = os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+        self.http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+        self.http_max_keepalive = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+        self.http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.http_timeout = float(os.getenv("HTTP_TIMEOUT", "120"))
+        # Eraser rendering and retry backoff (seconds)
+        self.eraser_render_url = os.getenv("ERASER_API_URL", "https://app.eraser.io/api/render/prompt")
+        self.eraser_max_retries = int(os.getenv("ERASER_MAX_RETRIES", "5"))
+        self.retry_backoff_base = float(os.getenv("RETRY_BACKOFF_BASE", "1"))
+        self.retry_backoff_cap = float(os.getenv("RETRY_BACKOFF_CAP", "60"))
+        # On-disk LLM response cache
+        self.llm_cache_enabled = os.getenv("LLM_CACHE", "true").lower() in ("1", "true", "yes")
+        self.llm_cache_path = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+        self.llm_cache_max_bytes = int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.llm_cache_max_age = int(float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 86400)
+        # Fingerprints of the inputs each generated item was last built from
+        self.manifest_path = os.getenv("BUILD_MANIFEST_PATH", "source_files/yaml/.build_manifest.json")
+        # Per-item completion journal used by --resume
+        self.journal_path = os.getenv("JOURNAL_PATH", "source_files/yaml/.journal.jsonl")
+        # Provider batch APIs (--batch); base URLs can point at a local stand-in server
+        self.openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.anthropic_base_url = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1")
+        self.gemini_base_url = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+        self.batch_window = float(os.getenv("BATCH_WINDOW", "2"))
+        self.batch_max_size = int(os.getenv("BATCH_MAX_SIZE", "10000"))
+        self.batch_poll_interval = float(os.getenv("BATCH_POLL_INTERVAL", "30"))
+        # Write completions to the output file chunk by chunk as they arrive
+        self.stream = os.getenv("STREAM", "false").lower() in ("1", "true", "yes")
+        # Provider quotas in requests and tokens per minute (0 = unlimited),
+        # overridable with e.g. GEMINI_RPM / GEMINI_TPM
+        default_rate_limits = {
+            "gemini": (60, 1000000),
+            "anthropic": (50, 40000),
+            "openai": (500, 200000),
+            "openrouter": (200, 0),
+            "lmstudio": (0, 0),
+        }
+        self.rate_limits = {
+            provider: {
+                "rpm": int(os.getenv(f"{provider.upper()}_RPM", rpm)),
+                "tpm": int(os.getenv(f"{provider.upper()}_TPM", tpm)),
+            }
+            for provider, (rpm, tpm) in default_rate_limits.items()
+        }
+        self.rate_limit_max_retries = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "6"))
+        # Hedged requests and circuit breakers for the provider chain (seconds)
+        self.llm_call_deadline = float(os.getenv("LLM_CALL_DEADLINE", "300"))
+        self.hedge_default_delay = float(os.getenv("HEDGE_DEFAULT_DELAY", "30"))
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+        self.hedge_p95_multiplier = float(os.getenv("HEDGE_P95_MULTIPLIER", "1.0"))
+        self.breaker_error_rate = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+        self.breaker_max_p95 = float(os.getenv("BREAKER_MAX_P95", "180"))
+        self.breaker_min_calls = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+        self.breaker_cooldown = float(os.getenv("BREAKER_COOLDOWN", "60"))
+        # Ask the LLM for topic labels even when the script's imports imply
+        # some; those labels then only seed the LLM's choice
+        self.script_llm_topic_labels = os.getenv("SCRIPT_LLM_TOPIC_LABELS", "false").lower() in ("1", "true", "yes")
+        # pk pool; the allocator keeps its index next to it (pk.sqlite3)
+        self.pk_yaml_path = os.getenv("PK_YAML_PATH", "src/templates/pk.yaml")
+        # Prompt size: total tokens per prompt; reference files larger than what
+        # the template leaves are condensed chunk by chunk and cached by hash
+        self.prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "24000"))
+        self.condense_chunk_tokens = int(os.getenv("CONDENSE_CHUNK_TOKENS", "6000"))
+        self.condense_max_rounds = int(os.getenv("CONDENSE_MAX_ROUNDS", "3"))
+        self.summary_cache_dir = os.getenv("SUMMARY_CACHE_DIR", ".cache/summaries")
+        # Store new YAML catalogues as one `---` document per item, so single
+        # items can be streamed and patched without rewriting the whole file
+        self.yaml_multi_document = os.getenv("YAML_MULTI_DOCUMENT", "false").lower() in ("1", "true", "yes")
+        # YAML catalogues and the SQLite job store mirroring them (--store)
+        self.yaml_dir = os.getenv("YAML_DIR", "source_files/yaml")
+        self.job_store_path = os.getenv("JOB_STORE_PATH", "source_files/yaml/jobs.sqlite3")
+        # WAL needs shared memory, so use DELETE when the store is shared by
+        # workers on several hosts over a network file system
+        self.job_store_journal_mode = os.getenv("JOB_STORE_JOURNAL_MODE", "WAL")
+        # Workers (python -m src.worker) lease claimed jobs for this many
+        # seconds, renewing them while they run; a job whose lease runs out
+        # goes back to the queue, and fails after worker_max_attempts claims
+        self.worker_lease_seconds = float(os.getenv("WORKER_LEASE_SECONDS", "300"))
+        self.worker_max_attempts = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+        self.worker_poll_interval = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+        # Diagrams of markdown and script items (diagram_prompt_#) are saved here
+        self.images_dir = os.getenv("IMAGES_DIR", "finished_files/images")
+        # Rendered diagrams kept once by hash of their text and render options,
+        # and hardlinked to every image file that uses them
+        self.diagram_store_enabled = os.getenv("DIAGRAM_STORE", "true").lower() in ("1", "true", "yes")
+        self.diagram_store_dir = os.getenv("DIAGRAM_STORE_DIR", ".cache/diagrams")
+        # Optional Pillow post-processing of diagrams: lossless PNG optimisation,
+        # variants, thumbnails (longest side in px, 0 = none) and metadata,
+        # in a pool of image_workers processes (0 = one per CPU)
+        self.image_processing = os.getenv("IMAGE_PROCESSING", "false").lower() in ("1", "true", "yes")
+        self.image_formats = [f.strip().lower() for f in os.getenv("IMAGE_FORMATS", "webp,avif").split(",") if f.strip()]
+        self.image_thumbnail_size = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "320"))
+        self.image_workers = int(os.getenv("IMAGE_WORKERS", "0"))
+        self.image_cache_dir = os.getenv("IMAGE_CACHE_DIR", ".cache/images")
+        # Daemon (python -m src.daemon): source directories watched besides
+        # yaml_dir, and seconds they must be quiet before a build starts
+        self.watch_dirs = [d.strip() for d in os.getenv("WATCH_DIRS", "source_files/markdown,source_files/scripts").split(",")
+                           if d.strip()]
+        self.daemon_debounce = float(os.getenv("DAEMON_DEBOUNCE", "3"))
+        self.daemon_poll_interval = float(os.getenv("DAEMON_POLL_INTERVAL", "2"))
+        # Per-call metrics: metrics/calls.jsonl and a Prometheus textfile
+        self.metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.metrics_dir = os.getenv("METRICS_DIR", "metrics")
+        # Estimated USD per million (input, output) tokens, overridable with
+        # e.g. GEMINI_PRICE_IN / GEMINI_PRICE_OUT
+        default_token_prices = {
+            "gemini": (0.5, 1.5),
+            "anthropic": (8.0, 24.0),
+            "openai": (0.5, 1.5),
+            "openrouter": (0.5, 1.5),
+            "lmstudio": (0.0, 0.0),
+        }
+        self.token_prices = {
+            provider: (
+                float(os.getenv(f"{provider.upper()}_PRICE_IN", price_in)),
+                float(os.getenv(f"{provider.upper()}_PRICE_OUT", price_out)),
+            )
+            for provider, (price_in, price_out) in default_token_prices.items()
+        }
 
 config = Config()
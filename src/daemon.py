@@ -0,0 +1,216 @@
+import os
+import asyncio
+from src.generator import GENERATED_SOURCES, catalogue_jobs, write_back, finish_images
+from src.utils.scheduler import scheduler
+from src.utils.http_clients import http_clients
+from src.utils.llm_cache import llm_cache
+from src.utils.manifest import manifest
+from src.utils.rate_limiter import rate_limiters
+from src.utils.metrics import metrics
+from src.utils.image_processing import image_processor
+from src.utils.diagram_store import diagram_store
+from src.utils.yaml_io import Catalogue, YAMLError
+from src.config import config
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# Editors and our own atomic writes go through files like these first
+IGNORED_SUFFIXES = (".tmp", ".part", ".swp", "~")
+
+class Watcher:
+    """
+    Tells which files under a set of directories were added, changed or
+    removed since the last look. It sleeps on inotify when inotify_simple is
+    installed (Linux) and polls the directories otherwise; either way the
+    changes themselves come from comparing size and mtime snapshots.
+    """
+    def __init__(self, directories, poll_interval=None):
+        self.directories = [d for d in directories if os.path.isdir(d)]
+        self.poll_interval = poll_interval or config.daemon_poll_interval
+        self.inotify = None
+        self.snapshot = self.scan()
+        if INotify is not None:
+            self.inotify = INotify()
+            mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.CREATE | flags.DELETE
+            for directory in self.directories:
+                for root, _, _ in os.walk(directory):
+                    self.inotify.add_watch(root, mask)
+
+    @property
+    def mode(self):
+        return "inotify" if self.inotify else f"polling every {self.poll_interval:g}s"
+
+    def scan(self):
+        snapshot = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.startswith('.') or name.endswith(IGNORED_SUFFIXES):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def changes(self):
+        """Returns the paths that differ from the previous snapshot."""
+        snapshot = self.scan()
+        changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                   if snapshot.get(path) != self.snapshot.get(path)}
+        self.snapshot = snapshot
+        return changed
+
+    async def wait(self):
+        """Returns after the next file system event, or after a poll interval."""
+        if self.inotify is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self.inotify.fileno(), lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(self.inotify.fileno())
+        self.inotify.read(timeout=0)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+class Daemon:
+    """
+    Keeps the generator running: provider clients, connection pools, parsed
+    catalogues and file hashes stay warm between builds, and each change to
+    the watched directories is answered with a build of just the entries it
+    affects, once the directories have been quiet for `debounce` seconds.
+    """
+    def __init__(self, yaml_dir=None, watch_dirs=None, debounce=None, poll_interval=None):
+        self.yaml_dir = yaml_dir or config.yaml_dir
+        self.watch_dirs = watch_dirs or [self.yaml_dir] + config.watch_dirs
+        self.debounce = config.daemon_debounce if debounce is None else debounce
+        self.poll_interval = poll_interval
+        self.catalogues = {}
+
+    def load(self, filename):
+        """
+        Returns the cached catalogue for a YAML file, parsing it again only
+        when the file changed since it was loaded or written back.
+        """
+        file_path = os.path.join(self.yaml_dir, filename)
+        catalogue = self.catalogues.get(filename)
+        if catalogue is not None and catalogue.file_stat() == catalogue.stat:
+            return catalogue, False
+        if not os.path.exists(file_path):
+            self.catalogues.pop(filename, None)
+            return None, False
+        try:
+            catalogue = Catalogue.load(file_path)
+        except YAMLError as e:
+            print(f"Error parsing YAML file {filename}: {e}")
+            return None, False
+        self.catalogues[filename] = catalogue
+        return catalogue, True
+
+    def affected(self, changed):
+        """
+        Returns the catalogues to check for pending entries: every reloaded
+        catalogue, and all of them when a referenced source file changed,
+        since any entry may point at it. Unchanged entries are then skipped
+        by their manifest fingerprint.
+        """
+        yaml_dir = os.path.abspath(self.yaml_dir)
+        sources_changed = any(os.path.dirname(os.path.abspath(path)) != yaml_dir for path in changed)
+        affected = []
+        for filename in GENERATED_SOURCES:
+            catalogue, reloaded = self.load(filename)
+            if catalogue is not None and (reloaded or sources_changed):
+                affected.append((filename, catalogue))
+        return affected
+
+    async def build(self, changed):
+        affected = self.affected(changed)
+        if not affected:
+            return
+        jobs = []
+        for filename, catalogue in affected:
+            jobs.extend(catalogue_jobs(filename, catalogue))
+        if not jobs:
+            print(f"No pending entries after changes to {len(changed)} files")
+            return
+        print(f"Building {len(jobs)} changed or new entries ({len(changed)} files changed)")
+        metrics.open()
+        try:
+            await scheduler.run(jobs)
+            print(llm_cache.stats())
+            print(diagram_store.stats())
+        finally:
+            finish_images()
+            write_back(affected)
+            manifest.save()
+            metrics.close()
+
+    async def run(self, llm_concurrency=None, diagram_concurrency=None):
+        scheduler.configure(llm_concurrency, diagram_concurrency)
+        rate_limiters.configure(scheduler.concurrency["llm"])
+        watcher = Watcher(self.watch_dirs, self.poll_interval)
+        print(f"Watching {', '.join(watcher.directories)} ({watcher.mode}, debounce {self.debounce:g}s)")
+        try:
+            async with http_clients.lifetime():
+                # Catch up on anything that changed while the daemon was stopped
+                await self.build({os.path.join(self.yaml_dir, name) for name in GENERATED_SOURCES})
+                while True:
+                    await watcher.wait()
+                    changed = watcher.changes()
+                    if not changed:
+                        continue
+                    # Wait until writes settle, so a file saved in several steps
+                    # or a batch of new files is built once
+                    while True:
+                        await asyncio.sleep(self.debounce)
+                        more = watcher.changes()
+                        if not more:
+                            break
+                        changed |= more
+                    await self.build(changed)
+        finally:
+            watcher.close()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Watch the YAML and source directories and build changed entries')
+    parser.add_argument('--llm-concurrency', type=int, default=config.llm_concurrency,
+                      help=f'Maximum concurrent LLM calls (default: {config.llm_concurrency})')
+    parser.add_argument('--diagram-concurrency', type=int, default=config.diagram_concurrency,
+                      help=f'Maximum concurrent Eraser calls (default: {config.diagram_concurrency})')
+    parser.add_argument('--debounce', type=float, default=config.daemon_debounce,
+                      help=f'Seconds the directories must be quiet before building (default: {config.daemon_debounce:g})')
+    parser.add_argument('--poll-interval', type=float, default=config.daemon_poll_interval,
+                      help=f'Seconds between scans without inotify (default: {config.daemon_poll_interval:g})')
+    parser.add_argument('--stream', action='store_true', default=config.stream,
+                      help='Stream completions straight into the output files')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Do not read or write the LLM response cache')
+    parser.add_argument('--images', action='store_true', default=config.image_processing,
+                      help='Optimise diagrams and make WebP/AVIF variants, thumbnails and metadata (needs Pillow)')
+    args = parser.parse_args()
+    config.stream = args.stream
+    llm_cache.configure(enabled=not args.no_cache and config.llm_cache_enabled)
+    image_processor.configure(enabled=args.images)
+
+    daemon = Daemon(debounce=args.debounce, poll_interval=args.poll_interval)
+    try:
+        asyncio.run(daemon.run(args.llm_concurrency, args.diagram_concurrency))
+    except KeyboardInterrupt:
+        print("Daemon stopped")
+    finally:
+        llm_cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,298 @@
 import os
-import yaml
+import re
 import subprocess
 import json
 import asyncio
 import httpx
+import inspect
+from functools import partial
 from src.utils.eraser_api import EraserAPI
 from src.utils.gemini_api import GeminiAPI
+from src.utils.scheduler import scheduler
+from src.utils.http_clients import http_clients
+from src.utils.llm_cache import llm_cache
+from src.utils.manifest import manifest
+from src.utils.journal import journal
+from src.utils.file_handler import atomic_write, stream_to_file
+from src.utils.batch_api import batch_collector
+from src.utils.rate_limiter import rate_limiters
+from src.utils.prompt_builder import build_prompt, count_tokens, section_tokens, CHARS_PER_TOKEN
+from src.utils.metrics import metrics
+from src.utils.yaml_io import Catalogue, YAMLError
+from src.utils.job_store import job_store
+from src.utils.diagram_store import diagram_store
+from src.utils.image_processing import image_processor
 from src.config import config
 
 gemini_api = GeminiAPI()
+eraser_api = None
 
-async def generate_files():
+def get_eraser_api():
+    """Returns the EraserAPI shared by every diagram in the run."""
+    global eraser_api
+    if eraser_api is None:
+        eraser_api = EraserAPI()
+    return eraser_api
+
+async def generate_files(llm_concurrency=None, diagram_concurrency=None, resume=False, batch=False, store=False):
     """
     Generates markdown and script files from YAML configurations.
+
+    Pending items from every YAML file are scheduled as concurrent jobs; calls
+    to the LLM and to Eraser are capped separately by the scheduler. Each
+    completed item is journaled immediately, and with resume=True the journal
+    of an interrupted run is replayed so those items are not generated again.
+    With batch=True, prompts are submitted together through the provider's
+    batch API instead of one request per item. With store=True, pending items
+    are queried from the SQLite job store instead of parsed from every YAML
+    file, and the YAML files are exported from the store afterwards.
     """
     try:
         print("Starting generator...")
-        yaml_dir = "source_files/yaml"
-        print(f"Looking for YAML files in {yaml_dir}")
-        yaml_files = [f for f in os.listdir(yaml_dir) if f.endswith(".yaml")]
-        total_files = len(yaml_files)
-        print(f"Found {total_files} YAML files to process: {yaml_files}")
-        
-        processed_count = 0
-        for filename in yaml_files:
-            if filename.endswith(".yaml"):
-                file_path = os.path.join(yaml_dir, filename)
-                with open(file_path, 'r') as yaml_file:
-                    try:
-                        data = yaml.safe_load(yaml_file)
-                        print(f"Processing {filename}...")
-                        if filename == "diagram.yaml":
-                            print("Processing diagrams...")
-                            for diagram in data["diagrams"]:
-                                if str(diagram.get("generated")).lower() == "false":
-                                    print(f"Generating diagram: {diagram.get('new_filename')}")
-                                    await generate_diagram(diagram)
-                                    diagram["generated"] = "yes"
-                                    processed_count += 1
-                                    print(f"Progress: {processed_count}/{total_files} files processed")
-                        elif isinstance(data, list):
-                            print(f"Found list data in {filename}")
-                            for item in data:
-                                print(f"Checking item in {filename}: generated = {item.get('generated')}")
-                                generated = str(item.get("generated")).lower()
-                                if generated == "false":
-                                    if filename == "markdown.yaml":
-                                        await generate_markdown(item)
-                                    elif filename == "script.yaml":
-                                        await generate_script(item)
-                                    item["generated"] = "yes"
-                                    processed_count += 1
-                                    print(f"Progress: {processed_count}/{total_files} files processed")
-                        elif isinstance(data, dict):
-                            print(f"Found dict data in {filename}")
-                            print(f"Checking dict in {filename}: generated = {data.get('generated')}")
-                            generated = str(data.get("generated")).lower()
-                            if generated == "false":
-                                if filename == "markdown.yaml":
-                                    await generate_markdown(data)
-                                elif filename == "script.yaml":
-                                    await generate_script(data)
-                                data["generated"] = "yes"
-                                processed_count += 1
-                                print(f"Progress: {processed_count}/{total_files} files processed")
-                        with open(file_path, 'w') as yaml_file:
-                            yaml.dump(data, yaml_file, indent=2)
-                    except yaml.YAMLError as e:
-                        print(f"Error parsing YAML file {filename}: {e}")
-                    except Exception as e:
-                        print(f"Error processing file {filename}: {e}")
-                        import traceback
-                        print(traceback.format_exc())
+        scheduler.configure(llm_concurrency, diagram_concurrency)
+        rate_limiters.configure(scheduler.concurrency["llm"])
+        replayed = journal.replay() if resume else {}
+        if store:
+            loaded_files = []
+            jobs = store_jobs(replayed)
+        else:
+            loaded_files, jobs = yaml_jobs(config.yaml_dir, replayed)
+
+        if batch:
+            if batch_collector.supports(gemini_api.llm):
+                batch_collector.configure(enabled=True)
+                # Every prompt has to reach the collector before the batch is submitted
+                scheduler.configure(llm_concurrency=max(1, len(jobs)))
+            else:
+                print(f"{gemini_api.llm} has no batch API, generating items one request at a time")
+
+        print(f"Scheduling {len(jobs)} pending items "
+              f"(llm concurrency: {scheduler.concurrency['llm']}, "
+              f"diagram concurrency: {scheduler.concurrency['diagram']})")
+        journal.open(resume=resume)
+        metrics.open()
+        try:
+            async with http_clients.lifetime():
+                await scheduler.run(jobs)
+            print(llm_cache.stats())
+            print(diagram_store.stats())
+        finally:
+            # Runs on Ctrl-C too, so completed items keep their generated flag
+            finish_images()
+            written = export_store() if store else write_back(loaded_files)
+            manifest.save()
+            journal.close(clear=written)
+            metrics.close()
     except Exception as e:
         print(f"Error in generate_files: {e}")
         import traceback
         print(traceback.format_exc())
 
-async def generate_markdown(config):
+def finish_images():
+    """Writes the metadata of post-processed images and stops the image process pool."""
+    if image_processor.enabled:
+        image_processor.save_index()
+        print(image_processor.stats())
+    image_processor.close()
+
+def yaml_jobs(yaml_dir, replayed):
     """
-    Generates a markdown file from a YAML configuration using Gemini.
+    Parses every YAML file in yaml_dir and returns (loaded catalogues, jobs)
+    for the items that need building.
+    """
+    print(f"Looking for YAML files in {yaml_dir}")
+    yaml_files = [f for f in os.listdir(yaml_dir) if f.endswith(".yaml")]
+    total_files = len(yaml_files)
+    print(f"Found {total_files} YAML files to process: {yaml_files}")
+
+    loaded_files = []
+    jobs = []
+    for filename in yaml_files:
+        file_path = os.path.join(yaml_dir, filename)
+        try:
+            catalogue = Catalogue.load(file_path)
+        except YAMLError as e:
+            print(f"Error parsing YAML file {filename}: {e}")
+            continue
+        print(f"Processing {filename}...")
+        loaded_files.append((filename, catalogue))
+        jobs.extend(catalogue_jobs(filename, catalogue, replayed))
+    return loaded_files, jobs
+
+def catalogue_jobs(filename, catalogue, replayed=None):
+    """Returns jobs for the items of one loaded catalogue that need building."""
+    replayed = replayed or {}
+    template = prompt_template(filename)
+    jobs = []
+    for item, generate in pending_items(filename, catalogue.data, template):
+        label = f"{filename}: {item.get('new_filename')}"
+        key = manifest.item_key(filename, item)
+        if key in replayed and replayed[key] == manifest.fingerprint(item, template) \
+                and manifest.output_exists(item):
+            print(f"Resuming: {label} already completed")
+            mark_generated(filename, item, template, catalogue)
+            continue
+        jobs.append((label, partial(generate, item),
+                     partial(mark_generated, filename, item, template, catalogue)))
+    return jobs
+
+def store_jobs(replayed):
+    """
+    Imports YAML files changed since the last sync into the job store and
+    returns jobs for its pending rows only. Pending rows the build manifest
+    shows are up to date are marked generated instead of built again.
+    """
+    job_store.sync_from_yaml()
+    templates = {}
+    jobs = []
+    up_to_date = []
+    for filename, store_key, item in job_store.pending(sources=list(GENERATED_SOURCES)):
+        if filename not in templates:
+            templates[filename] = prompt_template(filename)
+        template = templates[filename]
+        label = f"{filename}: {item.get('new_filename')}"
+        if store_key in replayed and replayed[store_key] == manifest.fingerprint(item, template) \
+                and manifest.output_exists(item):
+            print(f"Resuming: {label} already completed")
+            mark_generated(filename, item, template, store_key=store_key)
+            continue
+        reason = manifest.needs_build(filename, item, template)
+        if not reason:
+            up_to_date.append(store_key)
+            continue
+        print(f"Building {item.get('new_filename')} from {filename}: {reason}")
+        jobs.append((label, partial(generator_for(filename), item),
+                     partial(mark_generated, filename, item, template, store_key=store_key)))
+    if up_to_date:
+        job_store.mark_generated(*up_to_date)
+        print(f"Job store: {len(up_to_date)} pending items are up to date, marked generated")
+    print(f"Job store: {job_store.counts()}")
+    return jobs
+
+def export_store():
+    """Writes the job store back to the YAML files. Returns True on success."""
+    try:
+        job_store.export_yaml()
+        return True
+    except Exception as e:
+        print(f"Error exporting the job store to YAML: {e}")
+        import traceback
+        print(traceback.format_exc())
+        return False
+
+def write_back(loaded_files):
+    """
+    Atomically writes the updated generated flags back to each YAML file;
+    multi-document files only have their changed items rewritten.
+    Returns True when every file was written.
+    """
+    written = True
+    for filename, catalogue in loaded_files:
+        try:
+            catalogue.save()
+        except Exception as e:
+            written = False
+            print(f"Error writing YAML file {filename}: {e}")
+            import traceback
+            print(traceback.format_exc())
+    return written
+
+def prompt_template(filename):
+    """
+    Returns the source of the prompt builder for a YAML file, so editing a
+    prompt changes the fingerprint of every item built with it.
+    """
+    builders = {"markdown.yaml": build_markdown_prompt, "script.yaml": build_script_prompt}
+    builder = builders.get(filename)
+    return inspect.getsource(builder) if builder else ""
+
+# diagram_prompt_1, diagram_prompt_2, ... in markdown and script items
+DIAGRAM_PROMPT_FIELD = re.compile(r'^diagram_prompt_(\d+)$')
+
+# YAML files whose items the generator builds
+GENERATED_SOURCES = ("diagram.yaml", "markdown.yaml", "script.yaml")
+
+def generator_for(filename):
+    """Returns the coroutine function that builds items of a YAML file."""
+    return {
+        "diagram.yaml": generate_diagram,
+        "markdown.yaml": generate_markdown,
+        "script.yaml": generate_script,
+    }.get(filename)
+
+def pending_items(filename, data, template=""):
+    """
+    Returns (item, generator function) pairs for every item in a parsed YAML
+    file that needs building: its inputs changed since the last build, its
+    output is missing, or it is marked generated: false.
+    """
+    generate = generator_for(filename)
+    if generate is None:
+        return []
+    if filename == "diagram.yaml":
+        print("Processing diagrams...")
+        if isinstance(data, dict):
+            items = data.get("diagrams", [])
+        else:
+            items = data if isinstance(data, list) else []
+    else:
+        items = data if isinstance(data, list) else [data]
+
+    pending = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        reason = manifest.needs_build(filename, item, template)
+        if reason:
+            print(f"Building {item.get('new_filename')} from {filename}: {reason}")
+            pending.append((item, generate))
+    return pending
+
+def mark_generated(filename, item, template="", catalogue=None, store_key=None):
+    item["generated"] = "yes"
+    if catalogue is not None:
+        catalogue.mark_dirty(item)
+    if store_key is not None:
+        job_store.mark_generated(store_key)
+    fingerprint = manifest.record(filename, item, template)
+    journal.record(store_key or manifest.item_key(filename, item), fingerprint)
+
+async def write_generated_text(prompt, file_path, sections=None):
+    """
+    Generates text for a prompt and writes it to file_path. With streaming on,
+    chunks go straight to a temp file that is renamed when the stream ends.
+    `sections` (from build_prompt) is recorded with the item's LLM call.
+    Returns True once the file is written.
+    """
+    if config.stream and not batch_collector.enabled:
+        try:
+            async with scheduler.limit("llm"):
+                with metrics.measure("llm", provider=gemini_api.llm, model=gemini_api.model, stream=True) as call:
+                    call["prompt_tokens"] = count_tokens(prompt, gemini_api.llm)
+                    call.update(section_tokens(sections))
+                    written, first_chunk = await stream_to_file(file_path, gemini_api.stream_text(prompt))
+                    call.update(completion_tokens=int(written / CHARS_PER_TOKEN.get(gemini_api.llm, 4.0)),
+                                bytes=os.path.getsize(file_path) if written else 0,
+                                first_chunk=first_chunk, ok=written > 0)
+        except Exception as e:
+            print(f"Error streaming text to {file_path}: {e}")
+            return False
+        return written > 0
+
+    async with scheduler.limit("llm"):
+        content = await gemini_api.generate_text(prompt, sections=sections)
+    if not content:
+        return False
+    print(f"Content generated, writing to file...")
+    with metrics.measure("write", path=file_path) as call:
+        atomic_write(file_path, content)
+        call["bytes"] = len(content.encode("utf-8"))
+    return True
+
+def build_markdown_prompt(config, existing_content=""):
+    """
+    Builds the Gemini prompt for a markdown YAML configuration.
+    existing_content is the previous version, already fitted to the token budget.
     """
     # Extract all parameters from config
     new_filename = config.get("new_filename")
@@ -102,7 +315,6 @@ async def generate_markdown(config):
     total_paragraphs = config.get("total_paragraphs", "1")
     update_date = config.get("update_date")
     version = config.get("version")
-    diagram_1_pk = config.get("diagram_1_pk")
 
     front_matter = f"""---
 author: {author}
@@ -111,16 +323,6 @@ update_date: {update_date}
 version: {version}
 ---
 """
-    # Get existing content if available
-    existing_content = ""
-    if existing_filename and old_filepath:
-        try:
-            with open(os.path.join(old_filepath, existing_filename), 'r') as old_file:
-                existing_content = old_file.read()
-                print(f"Found existing content in {existing_filename}")
-        except FileNotFoundError:
-            print(f"No existing file found at {old_filepath}/{existing_filename}")
-
     prompt = f"""{front_matter}
 Generate markdown content for a document titled '{new_filename}' with the following specifications:
 
@@ -151,22 +353,41 @@ Structure:
 Labels to include:
 {labels}
 """
-    print(f"Generating markdown content for {new_filename}...")
-    content = await gemini_api.generate_text(prompt)
-    if new_filename and new_filepath and content:
-        print(f"Content generated, writing to file...")
-        file_path = os.path.join(new_filepath, new_filename)
-        with open(file_path, 'w') as md_file:
-            md_file.write(content)
-        print(f"Generated markdown file: {file_path}")
-        if diagram_1_pk:
-            await generate_diagram(config)
-            with open(file_path, 'a') as md_file:
-                md_file.write(f"\n# diagram_pk: {diagram_1_pk}")
+    return prompt
 
-async def generate_script(config):
+async def generate_markdown(config):
     """
-    Generates a script file from a YAML configuration using Gemini.
+    Generates a markdown file from a YAML configuration using Gemini.
+    Returns True once the file is written.
+    """
+    new_filename = config.get("new_filename")
+    new_filepath = config.get("new_filepath")
+    diagram_1_pk = config.get("diagram_1_pk")
+    if not (new_filename and new_filepath):
+        return False
+    file_path = os.path.join(new_filepath, new_filename)
+
+    async def write_text():
+        prompt, sections = await build_prompt(gemini_api, build_markdown_prompt, config, new_filename)
+        print(f"Generating markdown content for {new_filename}...")
+        return await write_generated_text(prompt, file_path, sections)
+
+    written, diagrams_written = await with_diagrams(write_text(), config if diagram_1_pk else None)
+    if not written:
+        return False
+    print(f"Generated markdown file: {file_path}")
+    if not diagrams_written:
+        print(f"Diagrams for {new_filename} failed, leaving it pending")
+        return False
+    if diagram_1_pk:
+        with open(file_path, 'a') as md_file:
+            md_file.write(f"\n# diagram_pk: {diagram_1_pk}")
+    return True
+
+def build_script_prompt(config, existing_content=""):
+    """
+    Builds the Gemini prompt for a script YAML configuration.
+    existing_content is the existing script, already fitted to the token budget.
     """
     new_filename = config.get("new_filename")
     new_filepath = config.get("new_filepath")
@@ -182,23 +403,12 @@ async def generate_script(config):
     tagline_required = config.get("tagline_required")
     update_date = config.get("update_date")
     version = config.get("version")
-    diagram_1_pk = config.get("diagram_1_pk")
-    diagram_prompt_1 = config.get("diagram_prompt_1")
 
     front_matter = f"""# author: {author}
 # tagline_required: {tagline_required}
 # update_date: {update_date}
 # version: {version}
 """
-    
-    if existing_filename and old_filepath:
-        try:
-            with open(os.path.join(old_filepath, existing_filename), 'r') as old_file:
-                existing_content = old_file.read()
-        except FileNotFoundError:
-            existing_content = ""
-    else:
-        existing_content = ""
 
     prompt = f"""{front_matter}
 Generate script content for a script named '{new_filename}' with the following requirements:
@@ -218,52 +428,214 @@ Generate script content for a script named '{new_filename}' with the following r
 Here is the content of an existing script that may be helpful (sanitize any specific details):
 {existing_content}
 """
-    print(f"Generating script content for {new_filename}...")
-    content = await gemini_api.generate_text(prompt)
-    if new_filename and new_filepath and content:
-        print(f"Content generated, writing to file...")
-        file_path = os.path.join(new_filepath, new_filename)
-        with open(file_path, 'w') as script_file:
-            script_file.write(content)
-        print(f"Generated script file: {file_path}")
-        if diagram_prompt_1 and diagram_1_pk:
-            await generate_diagram(config)
-            with open(file_path, 'a') as script_file:
-                script_file.write(f"\n# diagram_pk: {diagram_1_pk}")
+    return prompt
+
+async def generate_script(config):
+    """
+    Generates a script file from a YAML configuration using Gemini.
+    Returns True once the file is written.
+    """
+    new_filename = config.get("new_filename")
+    new_filepath = config.get("new_filepath")
+    diagram_1_pk = config.get("diagram_1_pk")
+    diagram_prompt_1 = config.get("diagram_prompt_1")
+    if not (new_filename and new_filepath):
+        return False
+    file_path = os.path.join(new_filepath, new_filename)
+    with_diagram = bool(diagram_prompt_1 and diagram_1_pk)
+
+    async def write_text():
+        prompt, sections = await build_prompt(gemini_api, build_script_prompt, config, new_filename)
+        print(f"Generating script content for {new_filename}...")
+        return await write_generated_text(prompt, file_path, sections)
+
+    written, diagrams_written = await with_diagrams(write_text(), config if with_diagram else None)
+    if not written:
+        return False
+    print(f"Generated script file: {file_path}")
+    if not diagrams_written:
+        print(f"Diagrams for {new_filename} failed, leaving it pending")
+        return False
+    if with_diagram:
+        with open(file_path, 'a') as script_file:
+            script_file.write(f"\n# diagram_pk: {diagram_1_pk}")
+    return True
+
+def item_diagrams(item):
+    """
+    Returns diagram configs for the diagram_prompt_# fields of a markdown or
+    script item, saved in config.images_dir. As update_goo10burg.md sets out,
+    the only diagram of an item (number_of_diagrams: 1) is named like the
+    item with a .png extension, and several are numbered new_filename_#.png.
+    """
+    prompts = []
+    for field, text in item.items():
+        match = DIAGRAM_PROMPT_FIELD.match(field)
+        if match and text:
+            prompts.append((int(match.group(1)), text))
+    prompts.sort()
+    if not prompts:
+        return []
+    base = os.path.splitext(item.get("new_filename"))[0]
+    count = str(item.get("number_of_diagrams") or len(prompts))
+    diagrams = []
+    for number, text in prompts:
+        new_filename = f"{base}.png" if count == "1" else f"{base}_{number}.png"
+        diagrams.append({"new_filename": new_filename, "new_filepath": config.images_dir, "text": text})
+        if count == "1":
+            break
+    return diagrams
+
+async def with_diagrams(text_job, item=None):
+    """
+    Runs an item's text generation together with the renders of its
+    diagrams, so the item takes as long as the slower of the two instead of
+    both. Pass item=None for an item without diagrams.
+
+    Returns:
+        tuple: (text job result, whether every diagram was written)
+    """
+    diagrams = item_diagrams(item) if item else []
+    results = await asyncio.gather(text_job, *(generate_diagram(diagram) for diagram in diagrams),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results[0], all(results[1:])
 
 
 async def generate_diagram(config):
     """
     Generates a diagram file from a YAML configuration using the Eraser API.
+    A diagram with the same text rendered before, by this or another item,
+    is linked from the diagram store instead of rendered again.
+    Returns True once the image is written.
     """
     new_filename = config.get("new_filename")
     new_filepath = config.get("new_filepath")
     text = config.get("text")
-    if new_filename and new_filepath and text:
-        print(f"Generating diagram for {new_filename}...")
-        eraser_api = EraserAPI()
-        diagram_data = eraser_api.get_diagram(text)
-        if diagram_data and diagram_data.get("imageUrl"):
-            image_url = diagram_data.get("imageUrl")
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(image_url)
-                    response.raise_for_status()
-                    file_path = os.path.join(new_filepath, new_filename)
-                    with open(file_path, 'wb') as image_file:
-                        image_file.write(response.content)
-                    print(f"Generated diagram file: {file_path}")
-            except httpx.HTTPError as e:
-                print(f"Error fetching diagram image: {e}")
-        else:
+    if not (new_filename and new_filepath and text):
+        return False
+    file_path = os.path.join(new_filepath, new_filename)
+    extension = os.path.splitext(new_filename)[1] or ".png"
+
+    async def render():
+        content = None
+        if image_processor.enabled and diagram_store.enabled:
+            # Reuse the copy stored before image processing was turned on, instead of rendering again
+            unprocessed = diagram_store.path(diagram_store.make_key(text), extension)
+            if os.path.exists(unprocessed):
+                with open(unprocessed, 'rb') as f:
+                    content = f.read()
+        if content is None:
+            content = await render_diagram(text, new_filename)
+        # Optimised before it is stored, so every file linking to it gets the smaller image
+        try:
+            return await image_processor.optimize(content)
+        except Exception as e:
+            print(f"Error optimising diagram for {new_filename}, keeping it as rendered: {e}")
+            return content
+
+    if not diagram_store.enabled:
+        content = await render()
+        if not content:
+            return False
+        with metrics.measure("write", path=file_path) as call:
+            atomic_write(file_path, content, mode='wb')
+            call["bytes"] = len(content)
+    else:
+        stored = await diagram_store.fetch(diagram_key(text), render, extension)
+        if not stored:
+            return False
+        with metrics.measure("write", path=file_path) as call:
+            diagram_store.place(stored, file_path)
+            call["bytes"] = os.path.getsize(file_path)
+    print(f"Generated diagram file: {file_path}")
+    await post_process_image(file_path)
+    return True
+
+def diagram_key(text):
+    """
+    The diagram store key of a diagram: its text, the render URL and, with
+    image processing on, that the stored image is optimised, so turning the
+    stage on does not keep serving images stored before.
+    """
+    options = {"render_url": config.eraser_render_url}
+    if image_processor.enabled:
+        options["optimized"] = True
+    return diagram_store.make_key(text, options)
+
+async def post_process_image(file_path):
+    """Makes an image's variants, thumbnail and metadata when IMAGE_PROCESSING is on. Never fails the diagram."""
+    if not image_processor.enabled:
+        return
+    try:
+        with metrics.measure("image_processing", path=file_path):
+            await image_processor.process(file_path)
+    except Exception as e:
+        print(f"Error post-processing image {file_path}: {e}")
+
+async def render_diagram(text, new_filename):
+    """Renders a diagram with Eraser and downloads the image. Returns its bytes, or None."""
+    print(f"Generating diagram for {new_filename}...")
+    async with scheduler.limit("diagram"):
+        diagram_data = await get_eraser_api().get_diagram(text)
+        if not (diagram_data and diagram_data.get("imageUrl")):
             print(f"Could not generate diagram for {new_filename}")
+            return None
+        try:
+            with metrics.measure("image_download") as call:
+                response = await http_clients.get("images").get(diagram_data.get("imageUrl"))
+                response.raise_for_status()
+                call["bytes"] = len(response.content)
+            return response.content
+        except httpx.HTTPError as e:
+            print(f"Error fetching diagram image: {e}")
+            return None
+
+def main():
+    """Main entry point for the generator."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate markdown, script and diagram files from YAML configurations')
+    parser.add_argument('--llm-concurrency', type=int, default=config.llm_concurrency,
+                      help=f'Maximum concurrent LLM calls (default: {config.llm_concurrency})')
+    parser.add_argument('--diagram-concurrency', type=int, default=config.diagram_concurrency,
+                      help=f'Maximum concurrent Eraser calls (default: {config.diagram_concurrency})')
+    parser.add_argument('--resume', action='store_true',
+                      help='Skip items an interrupted run already completed, using its journal')
+    parser.add_argument('--batch', action='store_true',
+                      help='Submit all pending prompts through the provider batch API (openai, anthropic, gemini)')
+    parser.add_argument('--stream', action='store_true', default=config.stream,
+                      help='Stream completions straight into the output files')
+    parser.add_argument('--store', action='store_true',
+                      help='Query pending items from the SQLite job store instead of parsing every YAML file')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Do not read or write the LLM response cache')
+    parser.add_argument('--refresh', action='store_true',
+                      help='Ignore cached LLM responses but store the fresh ones')
+    parser.add_argument('--images', action='store_true', default=config.image_processing,
+                      help='Optimise diagrams and make WebP/AVIF variants, thumbnails and metadata (needs Pillow)')
+    args = parser.parse_args()
+    config.stream = args.stream
+    image_processor.configure(enabled=args.images)
+    llm_cache.configure(enabled=not args.no_cache and config.llm_cache_enabled, refresh=args.refresh)
 
-if __name__ == "__main__":
     try:
         print("Starting main...")
-        asyncio.run(generate_files())
+        asyncio.run(generate_files(
+            llm_concurrency=args.llm_concurrency,
+            diagram_concurrency=args.diagram_concurrency,
+            resume=args.resume,
+            batch=args.batch,
+            store=args.store,
+        ))
         print("Generator completed successfully")
     except Exception as e:
         print(f"Error in main: {e}")
         import traceback
         print(traceback.format_exc())
+    finally:
+        llm_cache.close()
+
+if __name__ == "__main__":
+    main()
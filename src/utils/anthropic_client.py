@@ -2,6 +2,8 @@ import os
 import asyncio
 from dotenv import load_dotenv
 from anthropic import Anthropic
+from src.utils.streaming import iterate_in_thread
+from src.utils.rate_limiter import is_rate_limit_error
 
 load_dotenv()
 
@@ -11,16 +13,31 @@ class AnthropicClient:
         if not self.api_key:
             raise Exception("ANTHROPIC_API_KEY environment variable not set")
         self.client = Anthropic(api_key=self.api_key)
+        self.model = "claude-2"
+        self.generation_params = {"max_tokens_to_sample": 1024}
 
     async def generate_text(self, prompt):
         try:
             response = await asyncio.to_thread(
                 self.client.completions.create,
-                model="claude-2",
-                max_tokens_to_sample=1024,
+                model=self.model,
+                max_tokens_to_sample=self.generation_params["max_tokens_to_sample"],
                 prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
             )
             return response.completion
         except Exception as e:
+            if is_rate_limit_error(e):
+                raise
             print(f"Error generating text with Anthropic API: {e}")
             return None
+
+    async def stream_text(self, prompt):
+        stream = iterate_in_thread(lambda: self.client.completions.create(
+            model=self.model,
+            max_tokens_to_sample=self.generation_params["max_tokens_to_sample"],
+            prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
+            stream=True,
+        ))
+        async for event in stream:
+            if event.completion:
+                yield event.completion
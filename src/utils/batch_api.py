@@ -0,0 +1,300 @@
+import json
+import asyncio
+from abc import ABC, abstractmethod
+from src.config import config
+from src.utils.http_clients import http_clients
+
+class BatchBackend(ABC):
+    """
+    Submits a list of (custom_id, prompt) pairs through a provider batch
+    endpoint, polls until the batch finishes and returns {custom_id: text}.
+    Subclasses implement create, status, state and results.
+    """
+    name = ""
+    finished_states = set()
+
+    def __init__(self, model, params=None):
+        self.model = model
+        self.params = params or {}
+
+    @property
+    def client(self):
+        return http_clients.get(f"{self.name}-batch")
+
+    async def run(self, requests):
+        batch_id = await self.create(requests)
+        print(f"Submitted {self.name} batch {batch_id} with {len(requests)} prompts")
+        while True:
+            batch = await self.status(batch_id)
+            state = self.state(batch)
+            if state in self.finished_states:
+                print(f"{self.name} batch {batch_id} finished: {state}")
+                return await self.results(batch)
+            print(f"{self.name} batch {batch_id} is {state}, polling again in {config.batch_poll_interval}s")
+            await asyncio.sleep(config.batch_poll_interval)
+
+    @abstractmethod
+    async def create(self, requests):
+        """Submits the requests and returns the batch id."""
+
+    @abstractmethod
+    async def status(self, batch_id):
+        """Fetches the batch object."""
+
+    @abstractmethod
+    def state(self, batch):
+        """The batch's processing state, one of finished_states once it is done."""
+
+    @abstractmethod
+    async def results(self, batch):
+        """Downloads the output of a finished batch as {custom_id: text}."""
+
+class OpenAIBatch(BatchBackend):
+    """OpenAI Batch API: upload a JSONL file, create a batch, download the output file."""
+    name = "openai"
+    finished_states = {"completed", "failed", "expired", "cancelled"}
+
+    def __init__(self, model, params=None):
+        super().__init__(model, params)
+        self.base_url = config.openai_base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {config.openai_api_key}"}
+
+    async def create(self, requests):
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": self.model, "messages": [{"role": "user", "content": prompt}], **self.params},
+            })
+            for custom_id, prompt in requests
+        ]
+        upload = await self.client.post(
+            f"{self.base_url}/files",
+            headers=self.headers,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+        )
+        upload.raise_for_status()
+        response = await self.client.post(
+            f"{self.base_url}/batches",
+            headers=self.headers,
+            json={
+                "input_file_id": upload.json()["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            },
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def status(self, batch_id):
+        response = await self.client.get(f"{self.base_url}/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    def state(self, batch):
+        return batch.get("status")
+
+    async def results(self, batch):
+        output_file_id = batch.get("output_file_id")
+        if not output_file_id:
+            return {}
+        response = await self.client.get(f"{self.base_url}/files/{output_file_id}/content", headers=self.headers)
+        response.raise_for_status()
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            body = (entry.get("response") or {}).get("body") or {}
+            try:
+                results[entry["custom_id"]] = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                print(f"Batch request {entry.get('custom_id')} failed: {entry.get('error')}")
+        return results
+
+class AnthropicBatch(BatchBackend):
+    """Anthropic Message Batches API."""
+    name = "anthropic"
+    finished_states = {"ended"}
+
+    def __init__(self, model, params=None):
+        super().__init__(model, params)
+        self.base_url = config.anthropic_base_url.rstrip("/")
+        self.headers = {
+            "x-api-key": config.anthropic_api_key or "",
+            "anthropic-version": "2023-06-01",
+        }
+
+    async def create(self, requests):
+        max_tokens = self.params.get("max_tokens_to_sample", 1024)
+        response = await self.client.post(
+            f"{self.base_url}/messages/batches",
+            headers=self.headers,
+            json={
+                "requests": [
+                    {
+                        "custom_id": custom_id,
+                        "params": {
+                            "model": self.model,
+                            "max_tokens": max_tokens,
+                            "messages": [{"role": "user", "content": prompt}],
+                        },
+                    }
+                    for custom_id, prompt in requests
+                ]
+            },
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def status(self, batch_id):
+        response = await self.client.get(f"{self.base_url}/messages/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    def state(self, batch):
+        return batch.get("processing_status")
+
+    async def results(self, batch):
+        results_url = batch.get("results_url")
+        if not results_url:
+            return {}
+        response = await self.client.get(results_url, headers=self.headers)
+        response.raise_for_status()
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            result = entry.get("result") or {}
+            if result.get("type") != "succeeded":
+                print(f"Batch request {entry.get('custom_id')} failed: {result.get('type')}")
+                continue
+            content = result.get("message", {}).get("content", [])
+            results[entry["custom_id"]] = "".join(block.get("text", "") for block in content if block.get("type") == "text")
+        return results
+
+class GeminiBatch(BatchBackend):
+    """Gemini Batch Mode with inline requests (batchGenerateContent)."""
+    name = "gemini"
+    finished_states = {"BATCH_STATE_SUCCEEDED", "BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED"}
+
+    def __init__(self, model, params=None):
+        super().__init__(model, params)
+        self.base_url = config.gemini_base_url.rstrip("/")
+        self.headers = {"x-goog-api-key": config.gemini_api_key or ""}
+
+    async def create(self, requests):
+        response = await self.client.post(
+            f"{self.base_url}/models/{self.model}:batchGenerateContent",
+            headers=self.headers,
+            json={
+                "batch": {
+                    "display_name": "goo10burg",
+                    "input_config": {
+                        "requests": {
+                            "requests": [
+                                {
+                                    "request": {"contents": [{"parts": [{"text": prompt}]}]},
+                                    "metadata": {"key": custom_id},
+                                }
+                                for custom_id, prompt in requests
+                            ]
+                        }
+                    },
+                }
+            },
+        )
+        response.raise_for_status()
+        return response.json()["name"]
+
+    async def status(self, batch_id):
+        response = await self.client.get(f"{self.base_url}/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    def state(self, batch):
+        return (batch.get("metadata") or {}).get("state") or batch.get("state")
+
+    async def results(self, batch):
+        output = batch.get("response") or (batch.get("metadata") or {}).get("output") or {}
+        inlined = (output.get("inlinedResponses") or {}).get("inlinedResponses", [])
+        results = {}
+        for entry in inlined:
+            custom_id = (entry.get("metadata") or {}).get("key")
+            try:
+                parts = entry["response"]["candidates"][0]["content"]["parts"]
+                results[custom_id] = "".join(part.get("text", "") for part in parts)
+            except (KeyError, IndexError, TypeError):
+                print(f"Batch request {custom_id} failed: {entry.get('error')}")
+        return results
+
+BATCH_BACKENDS = {
+    "openai": OpenAIBatch,
+    "anthropic": AnthropicBatch,
+    "gemini": GeminiBatch,
+}
+
+class BatchCollector:
+    """
+    Gathers prompts from concurrent generate_text calls and submits them as
+    one provider batch once no new prompt has arrived for a short window (or
+    the batch is full). Each caller awaits the answer to its own prompt.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.window = config.batch_window
+        self.max_size = config.batch_max_size
+        self.backend = None
+        self.pending = []
+        self.timer = None
+        self.counter = 0
+        self.in_flight = set()
+
+    def configure(self, enabled):
+        self.enabled = enabled
+
+    def supports(self, provider):
+        return provider in BATCH_BACKENDS
+
+    async def submit(self, provider, model, prompt, params=None):
+        """Queues a prompt for the next batch and waits for its completion text."""
+        if self.backend is None:
+            self.backend = BATCH_BACKENDS[provider](model, params)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.counter += 1
+        self.pending.append((f"request-{self.counter}", prompt, future))
+        if self.timer:
+            self.timer.cancel()
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        else:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        """Submits everything queued so far as one batch."""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        requests, self.pending = self.pending, []
+        if requests:
+            task = asyncio.create_task(self.run_batch(requests))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def run_batch(self, requests):
+        try:
+            results = await self.backend.run([(custom_id, prompt) for custom_id, prompt, _ in requests])
+        except Exception as e:
+            print(f"Error running {self.backend.name} batch: {e}")
+            results = {}
+        print(f"Batch returned {len(results)}/{len(requests)} completions")
+        for custom_id, _, future in requests:
+            if not future.done():
+                future.set_result(results.get(custom_id))
+
+batch_collector = BatchCollector()
@@ -1,53 +1,164 @@
 import csv
 import os
-import sys
-import subprocess
-import json
+import re
+from itertools import islice
 
-def csv_to_yaml(csv_file_path):
+FIELDS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           "update_goo10burg.md")
+PK_PATTERN = re.compile(r'^[a-z0-9]{5}$')
+
+def load_field_lists(fields_file=FIELDS_FILE):
+    """
+    Reads the allowed fields per YAML config file from the "## Fields" section
+    of update_goo10burg.md, e.g. {"script": ["pk", "type", ...], ...}.
+    A `#` in a field name (diagram_prompt_#) matches any number.
     """
-    Converts a CSV file to a YAML file.
+    fields = {}
+    current = None
+    in_fields = False
+    with open(fields_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('## '):
+                in_fields = line[3:].strip().lower() == 'fields'
+                current = None
+            elif in_fields and line.startswith('### '):
+                current = line[4:].strip().rstrip(':').lower()
+                fields[current] = []
+            elif in_fields and current and line.startswith('- '):
+                fields[current].append(line[2:].strip())
+    return fields
 
-    Args:
-        csv_file_path (str): The path to the CSV file.
+def field_matcher(allowed):
+    patterns = [re.compile('^' + re.escape(field).replace('\\#', r'\d+') + '$') for field in allowed]
+    return lambda name: any(pattern.match(name) for pattern in patterns)
+
+def validated_rows(csv_file_path, kind, fields_file=FIELDS_FILE):
+    """
+    Yields the rows of a CSV file one at a time, checked against the field
+    list for its kind: unknown columns are reported once, and rows with a
+    missing, malformed or repeated pk are skipped with a message.
     """
-    yaml_file_path = os.path.splitext(csv_file_path)[0] + ".yaml"
-    data = []
-    with open(csv_file_path, 'r') as csvfile:
+    field_lists = load_field_lists(fields_file)
+    if kind not in field_lists:
+        raise Exception(f"Unknown config type '{kind}', expected one of: {', '.join(field_lists)}")
+    allowed = field_matcher(field_lists[kind])
+    seen_pks = set()
+    skipped = 0
+    with open(csv_file_path, 'r', newline='') as csvfile:
         csvreader = csv.DictReader(csvfile)
-        for row in csvreader:
-            data.append(row)
-    
+        unknown = [name for name in csvreader.fieldnames or [] if not allowed(name)]
+        if unknown:
+            print(f"{csv_file_path}: columns not in the {kind} field list: {', '.join(unknown)}")
+        for line_number, row in enumerate(csvreader, start=2):
+            pk = (row.get('pk') or '').strip()
+            problem = None
+            if not pk:
+                problem = "missing pk"
+            elif not PK_PATTERN.match(pk):
+                problem = f"pk '{pk}' is not 5 lowercase alphanumeric characters"
+            elif pk in seen_pks:
+                problem = f"duplicate pk '{pk}'"
+            if problem:
+                skipped += 1
+                print(f"{csv_file_path}:{line_number}: skipping row, {problem}")
+                continue
+            seen_pks.add(pk)
+            yield row
+    if skipped:
+        print(f"{csv_file_path}: skipped {skipped} invalid rows")
+
+def chunks(rows, chunk_size):
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def write_yaml_chunks(rows, yaml_file_path, chunk_size):
+    """
+    Writes rows to a temporary file one chunk at a time and renames it into
+    place at the end, so memory stays flat and readers never see half a file.
+    """
+    from src.config import config
+    from src.utils import yaml_io
+    temp_path = yaml_file_path + ".part"
+    count = 0
     try:
-        # Attempt to use the system's pyyaml if available
-        import yaml
-        with open(yaml_file_path, 'w') as yamlfile:
-            yaml.dump(data, yamlfile, indent=2)
-    except ImportError:
-        # If pyyaml is not available, use a subprocess to run a python script with pyyaml
-        print("pyyaml not found, using subprocess")
-        script_content = """
-import yaml
-import sys
-import json
-data = json.loads(sys.argv[1])
-with open(sys.argv[2], 'w') as yamlfile:
-    yaml.dump(data, yamlfile, indent=2)
-"""
-        process = subprocess.Popen([sys.executable, '-c', script_content, json.dumps(data), yaml_file_path], executable=sys.executable, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
-        if stderr:
-            print(f"Error during subprocess execution: {stderr.decode()}")
-        if stdout:
-            print(f"Subprocess output: {stdout.decode()}")
+        with open(temp_path, 'w') as yamlfile:
+            for chunk in chunks(rows, chunk_size):
+                if config.yaml_multi_document:
+                    yamlfile.write("".join(yaml_io.dumps_document(row) for row in chunk))
+                else:
+                    yamlfile.write(yaml_io.dumps(chunk))
+                count += len(chunk)
+            if not count and not config.yaml_multi_document:
+                yamlfile.write("[]\n")
+            yamlfile.flush()
+            os.fsync(yamlfile.fileno())
+        os.replace(temp_path, yaml_file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
+
+def insert_into_store(rows, source, chunk_size):
+    """
+    Adds rows to the job store as pending items, one transaction per chunk.
+    The source's YAML file is imported first when it changed since the last
+    sync, since the export at the end replaces it with the store's rows.
+    """
+    from src.utils.job_store import job_store
+    job_store.sync_from_yaml([source])
+    count = 0
+    for chunk in chunks(rows, chunk_size):
+        count += len(job_store.add_items(source, [dict(row, generated='false') for row in chunk]))
+    # Keep the YAML view in step, so the next sync does not drop the new rows
+    job_store.export_yaml([source])
+    return count
+
+def csv_to_yaml(csv_file_path, yaml_file_path=None, kind=None, store=False, chunk_size=1000):
+    """
+    Converts a CSV file to a YAML file, streaming rows so large files run in
+    constant memory.
+
+    Args:
+        csv_file_path (str): The path to the CSV file.
+        yaml_file_path (str): Output path; defaults to the CSV path with .yaml.
+        kind (str): Field list to validate against (script, markdown, image,
+            package); defaults to the CSV file name.
+        store (bool): Insert the rows into the job store instead of writing YAML.
+        chunk_size (int): Rows written or inserted at a time.
+    """
+    yaml_file_path = yaml_file_path or os.path.splitext(csv_file_path)[0] + ".yaml"
+    kind = kind or os.path.splitext(os.path.basename(csv_file_path))[0].lower()
+    rows = validated_rows(csv_file_path, kind)
+
+    if store:
+        count = insert_into_store(rows, os.path.basename(yaml_file_path), chunk_size)
+        print(f"Inserted {count} {kind} rows from {csv_file_path} into the job store")
+        return count
+
+    count = write_yaml_chunks(rows, yaml_file_path, chunk_size)
+    print(f"Wrote {count} {kind} rows from {csv_file_path} to {yaml_file_path}")
+    return count
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert CSV files to YAML configurations')
+    parser.add_argument('csv_files', nargs='+', help='CSV files (image.csv, markdown.csv, package.csv, script.csv)')
+    parser.add_argument('--kind', help='Field list to validate against (default: the CSV file name)')
+    parser.add_argument('--output', help='Output YAML path (only with a single CSV file)')
+    parser.add_argument('--store', action='store_true',
+                      help='Insert rows into the job store instead of writing YAML')
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                      help='Rows written or inserted at a time (default: 1000)')
+    args = parser.parse_args()
+    if args.output and len(args.csv_files) > 1:
+        parser.error('--output needs a single CSV file')
+    for csv_file in args.csv_files:
+        csv_to_yaml(csv_file, args.output, kind=args.kind, store=args.store, chunk_size=args.chunk_size)
 
 if __name__ == '__main__':
-    # Example usage:
-    csv_file = "/Users/dionedge/dev/goo10burg/tests/image.csv"
-    csv_to_yaml(csv_file)
-    csv_file = "/Users/dionedge/dev/goo10burg/tests/markdown.csv"
-    csv_to_yaml(csv_file)
-    csv_file = "/Users/dionedge/dev/goo10burg/tests/package.csv"
-    csv_to_yaml(csv_file)
-    csv_file = "/Users/dionedge/dev/goo10burg/tests/script.csv"
-    csv_to_yaml(csv_file)
+    main()
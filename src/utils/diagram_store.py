@@ -0,0 +1,121 @@
+import os
+import json
+import shutil
+import asyncio
+import hashlib
+from src.config import config
+from src.utils.file_handler import atomic_write
+
+class DiagramStore:
+    """
+    Content-addressed store of rendered diagrams, keyed by a hash of the
+    diagram text and the render options. Each image is kept once under
+    config.diagram_store_dir and hardlinked (or copied, where links are not
+    possible) to every file that uses it, so a diagram already rendered for
+    another document skips the Eraser round-trip. Renders of the same key
+    that overlap in one run share a single request.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or config.diagram_store_dir
+        self.enabled = config.diagram_store_enabled
+        self.in_flight = {}
+        self.hits = 0
+        self.renders = 0
+
+    @staticmethod
+    def make_key(text, options=None):
+        """Hashes the diagram text with the render options (by default the Eraser render URL)."""
+        options = options if options is not None else {"render_url": config.eraser_render_url}
+        payload = json.dumps({"text": text, "options": options}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key, extension=".png"):
+        return os.path.join(self.directory, f"{key}{extension}")
+
+    async def fetch(self, key, render, extension=".png"):
+        """
+        Returns the stored image path for a key, calling `render` (a coroutine
+        function returning the image bytes, or None on failure) only when it
+        is neither stored nor already being rendered. Returns None when the
+        render fails.
+        """
+        stored = self.path(key, extension)
+        if os.path.exists(stored):
+            self.hits += 1
+            return stored
+        if stored in self.in_flight:
+            self.hits += 1
+            return await asyncio.shield(self.in_flight[stored])
+        task = asyncio.ensure_future(self.render_into(stored, render))
+        self.in_flight[stored] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(stored, None))
+        return await asyncio.shield(task)
+
+    async def render_into(self, stored, render):
+        content = await render()
+        if not content:
+            return None
+        self.renders += 1
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(stored, content, mode='wb')
+        return stored
+
+    @staticmethod
+    def place(stored, file_path):
+        """
+        Puts a stored image at file_path, as a hardlink when the file system
+        allows it and a copy otherwise. The new link is renamed over any
+        existing file, so readers never see it missing.
+        """
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(file_path) and os.path.samefile(stored, file_path):
+            return
+        temp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{os.getpid()}.link")
+        try:
+            try:
+                os.link(stored, temp_path)
+            except OSError:
+                shutil.copyfile(stored, temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def stats(self):
+        return f"Diagram store: {self.hits} reused, {self.renders} rendered"
+
+    def prune(self):
+        """
+        Removes stored images that no output links to any more (link count 1).
+        Copies placed where hardlinks were not possible are not tracked, so
+        their stored originals are removed too and rendered again if needed.
+        """
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for name in os.listdir(self.directory):
+            stored = os.path.join(self.directory, name)
+            if os.path.isfile(stored) and os.stat(stored).st_nlink == 1:
+                os.remove(stored)
+                removed += 1
+        return removed
+
+diagram_store = DiagramStore()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Manage the content-addressed diagram store')
+    parser.add_argument('command', choices=['status', 'prune'],
+                      help='show how many images are stored, or remove those no output links to')
+    args = parser.parse_args()
+    if args.command == 'status':
+        names = os.listdir(diagram_store.directory) if os.path.isdir(diagram_store.directory) else []
+        size = sum(os.path.getsize(os.path.join(diagram_store.directory, name)) for name in names)
+        print(f"{len(names)} images, {size / (1024 * 1024):.1f} MB in {diagram_store.directory}")
+    else:
+        print(f"Removed {diagram_store.prune()} unused images from {diagram_store.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
-import requests
 import os
+import asyncio
+import httpx
 from dotenv import load_dotenv
+from src.config import config
+from src.utils.http_clients import http_clients
+from src.utils.retry import RETRY_STATUS_CODES, backoff_delay, retry_after_seconds
+from src.utils.metrics import metrics
 
 load_dotenv()
 
@@ -12,20 +17,54 @@ class EraserAPI:
         if not self.api_key:
             raise Exception("ERASER_API_KEY environment variable or .env file not set")
         self.base_url = "https://api.eraser.io/v1"
+        self.render_url = config.eraser_render_url
+        self.max_retries = config.eraser_max_retries
 
+    @property
+    def client(self):
+        return http_clients.get("eraser")
 
-    def get_diagram(self, text):
-        url = "https://app.eraser.io/api/render/prompt"
+    async def get_diagram(self, text):
+        """
+        Renders a diagram from a prompt. Retries 429 and 5xx responses with
+        jittered exponential backoff, honouring Retry-After when present.
+        """
         headers = {
             "accept": "application/json",
             "content-type": "application/json",
             "authorization": f"Bearer {self.api_key}"
         }
         payload = { "text": text }
-        try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching diagram from Eraser API: {e}")
-            return None
+        with metrics.measure("diagram") as call:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    call["retries"] += 1
+                try:
+                    response = await self.client.post(self.render_url, json=payload, headers=headers)
+                except httpx.TransportError as e:
+                    if attempt == self.max_retries:
+                        print(f"Error fetching diagram from Eraser API: {e}")
+                        call["ok"] = False
+                        return None
+                    delay = backoff_delay(attempt, config.retry_backoff_base, config.retry_backoff_cap)
+                    print(f"Eraser API connection error ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    delay = retry_after_seconds(response.headers)
+                    if delay is None:
+                        delay = backoff_delay(attempt, config.retry_backoff_base, config.retry_backoff_cap)
+                    print(f"Eraser API returned {response.status_code}, retrying in {delay:.1f}s "
+                          f"(attempt {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(delay)
+                    continue
+
+                call["bytes"] = len(response.content)
+                try:
+                    response.raise_for_status()
+                    return response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    print(f"Error fetching diagram from Eraser API: {e}")
+                    call["ok"] = False
+                    return None
@@ -0,0 +1,68 @@
+import os
+import time
+import tempfile
+
+def keep_permissions(temp_path, file_path):
+    """
+    Gives a mkstemp file (created 0600) the mode of the file it replaces, or
+    the usual 0644 for a new file.
+    """
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    os.chmod(temp_path, mode)
+
+def atomic_write(file_path, content, mode='w'):
+    """
+    Writes content to a temporary file next to file_path, fsyncs it and
+    renames it into place, so readers never see a half-written file.
+    """
+    directory = os.path.dirname(file_path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        keep_permissions(temp_path, file_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+async def stream_to_file(file_path, chunks):
+    """
+    Writes text chunks from an async iterator to a temporary file as they
+    arrive and renames it to file_path once the stream ends. Nothing is
+    written to file_path when the stream is empty or fails.
+
+    Returns:
+        tuple: (characters written, seconds until the first chunk or None)
+    """
+    directory = os.path.dirname(file_path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".part")
+    started = time.monotonic()
+    first_chunk = None
+    written = 0
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            async for chunk in chunks:
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - started
+                    print(f"First chunk for {os.path.basename(file_path)} after {first_chunk:.2f}s")
+                temp_file.write(chunk)
+                temp_file.flush()
+                written += len(chunk)
+            os.fsync(temp_file.fileno())
+        if written:
+            keep_permissions(temp_path, file_path)
+            os.replace(temp_path, file_path)
+        else:
+            os.remove(temp_path)
+        return written, first_chunk
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -1,40 +1,219 @@
 import os
 import asyncio
 from dotenv import load_dotenv
-from openai import OpenAI
-import google.generativeai as genai
 from src.config import config
-from src.utils.anthropic_client import AnthropicClient
-from src.utils.openrouter_client import OpenRouterClient
-from src.utils.lmstudio_client import LMStudioClient
+from src.utils.providers import PROVIDERS, create_client
+from src.utils.llm_cache import llm_cache
+from src.utils.batch_api import batch_collector
+from src.utils.streaming import iterate_in_thread
+from src.utils.rate_limiter import rate_limiters, is_rate_limit_error, estimate_tokens
+from src.utils.provider_chain import ProviderChain
+from src.utils.prompt_builder import count_tokens, section_tokens
+from src.utils.metrics import metrics
 
 load_dotenv()
 
 class GeminiAPI:
-    def __init__(self):
-        self.llm = config.llm
+    """
+    Sends prompts to the configured LLM. The provider's SDK is imported and
+    its client constructed on first use (see src/utils/providers.py), so
+    creating a GeminiAPI costs nothing for commands that never call a model.
+    """
+    def __init__(self, llm=None, with_chain=True):
+        self.llm = llm or config.llm
+        if self.llm not in PROVIDERS:
+            raise Exception(f"Invalid LLM specified in config: {self.llm}")
+        self.with_chain = with_chain
+        self._client = None
+        self._model = None
+        self._chain = None
+        self._chain_built = False
+
+    def load(self):
+        """Constructs the provider client if it was not yet, and returns it."""
+        if self._client is None:
+            self._client, self._model = create_client(self.llm)
+        return self._client
+
+    @property
+    def client(self):
+        return self.load()
+
+    @property
+    def model(self):
+        self.load()
+        return self._model
+
+    @property
+    def generation_params(self):
+        # Anything besides the prompt that changes the completion belongs here,
+        # since it is part of the response cache key
+        return getattr(self.client, "generation_params", {})
+
+    @property
+    def chain(self):
+        """Fallback providers from LLM_CHAIN, used for hedging and failover."""
+        if not self._chain_built:
+            self._chain_built = True
+            if self.with_chain and len(config.llm_chain) > 1:
+                apis = [self]
+                for name in config.llm_chain:
+                    if name == self.llm:
+                        continue
+                    try:
+                        api = GeminiAPI(name, with_chain=False)
+                        api.load()
+                        apis.append(api)
+                    except Exception as e:
+                        print(f"Skipping {name} in provider chain: {e}")
+                if len(apis) > 1:
+                    self._chain = ProviderChain(apis)
+                    print(f"Provider chain: {' -> '.join(api.llm for api in apis)}")
+        return self._chain
+
+    @property
+    def cache_provider(self):
+        # Answers may come from any provider in the chain, so the chain is the cache identity
+        return ",".join(api.llm for api in self.chain.apis) if self.chain else self.llm
+
+    async def generate_text(self, prompt, batch=True, sections=None):
+        """
+        Returns the completion for a prompt, served from the response cache
+        when the same (provider, model, prompt, params) was answered before.
+        With batch=False the prompt skips the batch collector even in batch
+        mode, for calls whose answer is needed before the item's own prompt.
+        `sections` are the prompt's per-section token counts from build_prompt,
+        recorded with the call.
+        """
+        with metrics.measure("llm", provider=self.llm, model=self.model) as call:
+            call["prompt_tokens"] = count_tokens(prompt, self.llm)
+            call.update(section_tokens(sections))
+            key = llm_cache.make_key(self.cache_provider, self.model, prompt, self.generation_params)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                print(f"Using cached {self.llm} response")
+                call.update(cached=True, completion_tokens=count_tokens(cached, self.llm),
+                            bytes=len(cached.encode("utf-8")))
+                return cached
+            if batch and batch_collector.enabled and batch_collector.supports(self.llm):
+                call["batch"] = True
+                text = await batch_collector.submit(self.llm, self.model, prompt, self.generation_params)
+            elif self.chain:
+                text = await self.chain.generate_text(prompt)
+            else:
+                text = await self.call_with_rate_limit(prompt)
+            call["ok"] = bool(text)
+            if text:
+                call.update(completion_tokens=count_tokens(text, self.llm), bytes=len(text.encode("utf-8")))
+                llm_cache.put(key, self.cache_provider, self.model, text)
+            return text
+
+    async def stream_text(self, prompt):
+        """
+        Yields the completion for a prompt in chunks as the provider produces
+        them. A cached response is yielded as one chunk. When the cache is on,
+        the chunks are also collected so the full response can be stored.
+        """
+        key = llm_cache.make_key(self.cache_provider, self.model, prompt, self.generation_params)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            print(f"Using cached {self.llm} response")
+            yield cached
+            return
+        collected = [] if llm_cache.enabled else None
+        async for chunk in self.stream_with_rate_limit(prompt):
+            if collected is not None:
+                collected.append(chunk)
+            yield chunk
+        if collected:
+            llm_cache.put(key, self.cache_provider, self.model, "".join(collected))
+
+    async def call_with_rate_limit(self, prompt):
+        """
+        Calls the provider within its quota, retrying 429s with backoff while
+        the limiter lowers concurrency. Returns None if the retries run out.
+        """
+        limiter = rate_limiters.get(self.llm)
+        tokens = estimate_tokens(prompt)
+        for attempt in range(config.rate_limit_max_retries + 1):
+            await limiter.acquire(tokens)
+            try:
+                text = await self.call_provider(prompt)
+            except BaseException as e:
+                if not is_rate_limit_error(e):
+                    limiter.release()
+                    raise
+                delay = limiter.retry_delay(e, attempt)
+                limiter.release(rate_limited=True, retry_after=delay)
+                if attempt == config.rate_limit_max_retries:
+                    print(f"Giving up on {self.llm} after {attempt + 1} rate-limited attempts")
+                    return None
+                print(f"{self.llm} returned 429, retrying in {delay:.1f}s")
+                metrics.add(retries=1)
+                await asyncio.sleep(delay)
+                continue
+            limiter.release()
+            return text
+
+    async def stream_with_rate_limit(self, prompt):
+        """
+        Streams from the provider within its quota. A 429 before the first
+        chunk is retried like call_with_rate_limit; once chunks have been
+        yielded the error is raised.
+        """
+        limiter = rate_limiters.get(self.llm)
+        tokens = estimate_tokens(prompt)
+        for attempt in range(config.rate_limit_max_retries + 1):
+            await limiter.acquire(tokens)
+            started = False
+            try:
+                async for chunk in self.stream_provider(prompt):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not is_rate_limit_error(e) or attempt == config.rate_limit_max_retries:
+                    limiter.release(rate_limited=is_rate_limit_error(e))
+                    raise
+                delay = limiter.retry_delay(e, attempt)
+                limiter.release(rate_limited=True, retry_after=delay)
+                print(f"{self.llm} returned 429, retrying in {delay:.1f}s")
+                metrics.add(retries=1)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                limiter.release()
+                raise
+            limiter.release()
+            return
+
+    async def stream_provider(self, prompt):
         if self.llm == "gemini":
-            self.api_key = config.gemini_api_key
-            if not self.api_key:
-                raise Exception("GEMINI_API_KEY environment variable not set")
-            genai.configure(api_key=self.api_key)
-            self.client = genai.GenerativeModel('gemini-pro')
-        elif self.llm == "anthropic":
-            self.client = AnthropicClient()
+            print("Streaming request to Gemini API...")
+            stream = iterate_in_thread(lambda: self.client.generate_content(prompt, stream=True))
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
         elif self.llm == "openai":
-            self.api_key = config.openai_api_key
-            if not self.api_key:
-                raise Exception("OPENAI_API_KEY environment variable not set")
-            self.client = OpenAI(api_key=self.api_key)
-        elif self.llm == "openrouter":
-            self.client = OpenRouterClient()
-        elif self.llm == "lmstudio":
-            self.client = LMStudioClient()
+            stream = iterate_in_thread(lambda: self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=self.model,
+                stream=True,
+            ))
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        elif self.llm in ("anthropic", "openrouter", "lmstudio"):
+            async for chunk in self.client.stream_text(prompt):
+                yield chunk
         else:
             raise Exception(f"Invalid LLM specified in config: {self.llm}")
 
-
-    async def generate_text(self, prompt):
+    async def call_provider(self, prompt):
+        """
+        Sends one request to the configured provider. Rate-limit errors are
+        raised for the limiter to handle; other errors are logged and None
+        is returned.
+        """
         try:
             if self.llm == "gemini":
                 print("Sending request to Gemini API...")
@@ -42,9 +221,10 @@ class GeminiAPI:
                 print("Received response from Gemini API")
                 return response.text
             elif self.llm == "openai":
-                chat_completion = self.client.chat.completions.create(
+                chat_completion = await asyncio.to_thread(
+                    self.client.chat.completions.create,
                     messages=[{"role": "user", "content": prompt}],
-                    model="gpt-3.5-turbo",
+                    model=self.model,
                 )
                 return chat_completion.choices[0].message.content
             elif self.llm == "anthropic":
@@ -56,6 +236,8 @@ class GeminiAPI:
             else:
                 raise Exception(f"Invalid LLM specified in config: {self.llm}")
         except Exception as e:
+            if is_rate_limit_error(e):
+                raise
             print(f"Error generating text with Gemini API: {e}")
             return None
 
@@ -0,0 +1,63 @@
+import httpx
+from contextlib import asynccontextmanager
+from src.config import config
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class HTTPClientRegistry:
+    """
+    Hands out pooled httpx.AsyncClient instances, one per name, so every
+    provider client and the image downloader reuse keep-alive connections for
+    the whole run instead of opening a new connection per request.
+    """
+    def __init__(self):
+        self.clients = {}
+
+    def get(self, name="default", **kwargs):
+        """
+        Returns the shared client registered under a name, creating it on first use.
+
+        Args:
+            name (str): Pool name, usually the provider ("openrouter", "eraser", ...).
+            **kwargs: Extra httpx.AsyncClient arguments (e.g. headers, base_url),
+                only used when the client is created.
+        """
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=config.http2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=config.http_max_connections,
+                    max_keepalive_connections=config.http_max_keepalive,
+                    keepalive_expiry=config.http_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(config.http_timeout),
+                **kwargs,
+            )
+            self.clients[name] = client
+        return client
+
+    async def aclose(self):
+        """Closes every pooled client."""
+        clients, self.clients = self.clients, {}
+        for name, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"Error closing HTTP client {name}: {e}")
+
+    @asynccontextmanager
+    async def lifetime(self):
+        """
+        Scopes the pooled clients to a block, closing them when it exits.
+        """
+        try:
+            yield self
+        finally:
+            await self.aclose()
+
+http_clients = HTTPClientRegistry()
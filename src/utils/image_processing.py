@@ -0,0 +1,258 @@
+import io
+import os
+import json
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from src.config import config
+from src.utils.file_handler import atomic_write
+from src.utils.diagram_store import DiagramStore
+
+# Pillow is optional, and imported only once an image is processed
+PILLOW = importlib.util.find_spec("PIL") is not None
+
+# Pillow plugin needed to write each variant format
+VARIANT_FEATURES = {"webp": "webp", "avif": "avif"}
+
+def optimize_png(content):
+    """
+    Re-encodes PNG bytes losslessly at the highest zlib effort and returns
+    whichever of the result and the original is smaller. Runs in a pool process.
+    """
+    from PIL import Image
+    with Image.open(io.BytesIO(content)) as image:
+        image.load()
+        output = io.BytesIO()
+        image.save(output, "PNG", optimize=True)
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(content) else content
+
+def make_variants(source_path, output_dir, formats, thumbnail_size):
+    """
+    Writes the variants of one image into output_dir (image.<format> for
+    each format and a thumbnail thumb.png) and returns its metadata. Runs in
+    a pool process.
+    """
+    from PIL import Image
+    with Image.open(source_path) as image:
+        image.load()
+        meta = {
+            "width": image.width,
+            "height": image.height,
+            "bytes": os.path.getsize(source_path),
+            "variants": {},
+        }
+        for image_format in formats:
+            name = f"image.{image_format}"
+            if image_format == "webp":
+                image.save(os.path.join(output_dir, name), "WEBP", lossless=True, method=6)
+            else:
+                image.save(os.path.join(output_dir, name), image_format.upper())
+            meta["variants"][image_format] = name
+        if thumbnail_size:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((thumbnail_size, thumbnail_size))
+            thumbnail.save(os.path.join(output_dir, "thumb.png"), "PNG", optimize=True)
+            meta["variants"]["thumbnail"] = "thumb.png"
+    for name in meta["variants"].values():
+        meta.setdefault("variant_bytes", {})[name] = os.path.getsize(os.path.join(output_dir, name))
+    return meta
+
+class ImageProcessor:
+    """
+    Optional post-processing of diagram images with Pillow: lossless PNG
+    optimisation, WebP/AVIF variants, a thumbnail and dimension metadata.
+    The work runs in a process pool, and results are cached under
+    config.image_cache_dir by a hash of the input image and the options, so
+    an unchanged image is never processed twice. Variants are hardlinked
+    next to the image as <name>.webp, <name>.avif and <name>_thumb.png, and
+    the metadata is collected in images.json in the image's directory.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or config.image_cache_dir
+        self.enabled = config.image_processing and PILLOW
+        self._formats = None
+        self.thumbnail_size = config.image_thumbnail_size
+        self.pool = None
+        self.in_flight = {}
+        self.index = {}
+        self.processed = 0
+        self.cached = 0
+
+    def configure(self, enabled=None):
+        if enabled is not None:
+            if enabled and not PILLOW:
+                print("Pillow is not installed, skipping image post-processing")
+                enabled = False
+            self.enabled = enabled
+
+    @property
+    def formats(self):
+        """The configured variant formats this Pillow build can write."""
+        if self._formats is None:
+            from PIL import features
+            self._formats = [f for f in config.image_formats
+                             if f in VARIANT_FEATURES and features.check(VARIANT_FEATURES[f])]
+        return self._formats
+
+    def options_hash(self):
+        payload = json.dumps({"formats": self.formats, "thumbnail": self.thumbnail_size}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    async def run(self, function, *args):
+        if self.pool is None:
+            # Spawned rather than forked, since the event loop already runs threads
+            self.pool = ProcessPoolExecutor(max_workers=config.image_workers or None,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+
+    async def optimize(self, content):
+        """Returns PNG bytes losslessly optimised (cached by input hash), or the input unchanged."""
+        if not self.enabled or not content or not content.startswith(b"\x89PNG"):
+            return content
+        digest = hashlib.sha256(content).hexdigest()
+        cached = os.path.join(self.cache_dir, "optimized", f"{digest}.png")
+        if os.path.exists(cached):
+            with open(cached, 'rb') as f:
+                return f.read()
+        optimized = await self.run(optimize_png, content)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        atomic_write(cached, optimized, mode='wb')
+        print(f"Optimised image: {len(content)} -> {len(optimized)} bytes")
+        return optimized
+
+    async def process(self, file_path):
+        """
+        Makes the variants and metadata of an image, from the cache when the
+        same image was processed with the same options before, and links the
+        variants next to it. Returns the metadata, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        digest = await asyncio.to_thread(self.hash_file, file_path)
+        entry = os.path.join(self.cache_dir, f"{digest}-{self.options_hash()}")
+        meta_path = os.path.join(entry, "meta.json")
+        if os.path.exists(meta_path):
+            self.cached += 1
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        elif entry in self.in_flight:
+            self.cached += 1
+            meta = await asyncio.shield(self.in_flight[entry])
+        else:
+            task = asyncio.ensure_future(self.build(file_path, entry))
+            self.in_flight[entry] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(entry, None))
+            meta = await asyncio.shield(task)
+        directory, filename = os.path.split(file_path)
+        base = os.path.splitext(filename)[0]
+        variants = {}
+        for kind, name in meta["variants"].items():
+            target = f"{base}_thumb.png" if kind == "thumbnail" else f"{base}.{kind}"
+            DiagramStore.place(os.path.join(entry, name), os.path.join(directory, target))
+            variants[kind] = target
+        self.index.setdefault(directory, {})[filename] = {
+            "width": meta["width"], "height": meta["height"], "bytes": meta["bytes"], "variants": variants,
+        }
+        return meta
+
+    async def build(self, file_path, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Build in a temporary directory and rename it, so a half-made entry is never used
+        building = tempfile.mkdtemp(dir=self.cache_dir, prefix=".building-")
+        try:
+            meta = await self.run(make_variants, file_path, building, self.formats, self.thumbnail_size)
+            with open(os.path.join(building, "meta.json"), 'w') as f:
+                json.dump(meta, f, indent=2, sort_keys=True)
+            try:
+                os.rename(building, entry)
+            except OSError:
+                # Another process finished the same entry first
+                shutil.rmtree(building, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+        self.processed += 1
+        return meta
+
+    @staticmethod
+    def hash_file(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def save_index(self):
+        """Merges the metadata of the images processed so far into images.json in their directories."""
+        for directory, images in self.index.items():
+            index_path = os.path.join(directory, "images.json")
+            index = {}
+            if os.path.exists(index_path):
+                try:
+                    with open(index_path, 'r') as f:
+                        index = json.load(f)
+                except (ValueError, OSError) as e:
+                    print(f"Error reading {index_path}, rewriting it: {e}")
+            index.update(images)
+            atomic_write(index_path, json.dumps(index, indent=2, sort_keys=True))
+        self.index = {}
+
+    def stats(self):
+        return f"Image post-processing: {self.processed} processed, {self.cached} from cache"
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+image_processor = ImageProcessor()
+
+async def process_directory(directory, optimize=True):
+    """Post-processes every PNG in a directory, e.g. images rendered before the stage was turned on."""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.endswith(".png") and not name.endswith("_thumb.png") and not name.startswith("."))
+    semaphore = asyncio.Semaphore(config.image_workers or os.cpu_count() or 1)
+
+    async def one(name):
+        file_path = os.path.join(directory, name)
+        async with semaphore:
+            try:
+                if optimize and os.stat(file_path).st_nlink == 1:
+                    # Linked files belong to the diagram store; they are relinked to
+                    # optimised copies when regenerated with image processing on
+                    with open(file_path, 'rb') as f:
+                        content = f.read()
+                    optimized = await image_processor.optimize(content)
+                    if optimized != content:
+                        atomic_write(file_path, optimized, mode='wb')
+                await image_processor.process(file_path)
+            except Exception as e:
+                print(f"Error processing image {file_path}: {e}")
+
+    await asyncio.gather(*(one(name) for name in names))
+    image_processor.save_index()
+    print(image_processor.stats())
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Optimise images and make WebP/AVIF variants, thumbnails and metadata')
+    parser.add_argument('directories', nargs='*', default=[config.images_dir],
+                      help=f'Image directories (default: {config.images_dir})')
+    parser.add_argument('--no-optimize', action='store_true', help='Leave the PNG files themselves unchanged')
+    args = parser.parse_args()
+    image_processor.configure(enabled=True)
+    if not image_processor.enabled:
+        return
+    try:
+        for directory in args.directories:
+            asyncio.run(process_directory(directory, optimize=not args.no_optimize))
+    finally:
+        image_processor.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+from src.config import config
+from src.utils import yaml_io
+from src.utils.file_handler import keep_permissions
+from src.utils.manifest import manifest
+
+# Item type for catalogues whose items carry no `type` field
+SOURCE_TYPES = {
+    "markdown.yaml": "article",
+    "script.yaml": "script",
+    "diagram.yaml": "diagram",
+    "image.yaml": "image",
+    "package.yaml": "package",
+}
+
+GENERATED_VALUES = ("yes", "true", "1")
+
+def is_generated(item):
+    return str(item.get("generated", "")).lower() in GENERATED_VALUES
+
+def item_content(item):
+    """The item as stored: its fields without the generated flag, which has its own column."""
+    return json.dumps({k: v for k, v in item.items() if k != "generated"}, sort_keys=True, default=str)
+
+class JobStore:
+    """
+    SQLite store for every catalogue item, with indexed columns for type,
+    generated state, pk, diagram pk and package, so pending work and pk
+    relationships are found without parsing the YAML files. The YAML layout
+    in source_files/yaml stays the editable view: files changed since the
+    last sync are imported (YAML wins), and the store is exported back
+    after a run.
+    """
+    def __init__(self, path=None, yaml_dir=None):
+        self.path = path or config.job_store_path
+        self.yaml_dir = yaml_dir or config.yaml_dir
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode={config.job_store_journal_mode}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                item_key TEXT NOT NULL UNIQUE,
+                source TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                type TEXT,
+                pk TEXT,
+                diagram_pk TEXT,
+                package TEXT,
+                generated INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                data TEXT NOT NULL,
+                updated_at REAL
+            )"""
+        )
+        # Lease columns for workers, added to stores created before them
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, definition in (("lease_owner", "TEXT"), ("lease_expires", "REAL"),
+                                 ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+            if name not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (generated, source, position)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_source ON jobs (source, position)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_type ON jobs (type)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pk ON jobs (pk)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_diagram_pk ON jobs (diagram_pk)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_package ON jobs (package)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, source, position)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return conn
+
+    @staticmethod
+    def columns(source, item):
+        package = item.get("package") or item.get("zipfile")
+        if isinstance(package, (list, dict)):
+            package = json.dumps(package, sort_keys=True)
+        return {
+            "type": item.get("type") or SOURCE_TYPES.get(source),
+            "pk": str(item["pk"]) if item.get("pk") is not None else None,
+            "diagram_pk": str(item["diagram_1_pk"]) if item.get("diagram_1_pk") is not None else None,
+            "package": str(package) if package is not None else None,
+        }
+
+    def upsert_items(self, conn, source, items, start=0):
+        """
+        Inserts or updates items of one source inside the caller's transaction.
+        An item whose fields changed goes back to pending, like a changed
+        fingerprint in the build manifest. Returns the item keys written.
+        """
+        keys = []
+        seen = set()
+        now = time.time()
+        for position, item in enumerate(items, start=start):
+            if not isinstance(item, dict):
+                continue
+            key = manifest.item_key(source, item)
+            if key in seen:
+                key = f"{key}#{position}"
+            keys.append(key)
+            seen.add(key)
+            data = item_content(item)
+            generated = 1 if is_generated(item) else 0
+            columns = self.columns(source, item)
+            conn.execute(
+                """INSERT INTO jobs (item_key, source, position, type, pk, diagram_pk, package,
+                                     generated, status, data, updated_at)
+                   VALUES (:key, :source, :position, :type, :pk, :diagram_pk, :package,
+                           :generated, CASE WHEN :generated THEN 'done' ELSE 'pending' END, :data, :now)
+                   ON CONFLICT(item_key) DO UPDATE SET
+                       position = excluded.position, type = excluded.type, pk = excluded.pk,
+                       diagram_pk = excluded.diagram_pk, package = excluded.package,
+                       generated = CASE WHEN jobs.data != excluded.data THEN 0 ELSE excluded.generated END,
+                       status = CASE WHEN jobs.status IN ('running', 'failed') AND jobs.data = excluded.data
+                                          AND NOT excluded.generated THEN jobs.status
+                                     WHEN jobs.data != excluded.data OR NOT excluded.generated THEN 'pending'
+                                     ELSE 'done' END,
+                       data = excluded.data, updated_at = excluded.updated_at""",
+                {"key": key, "source": source, "position": position, "generated": generated,
+                 "data": data, "now": now, **columns},
+            )
+        return keys
+
+    def import_file(self, conn, source, file_path):
+        """
+        Replaces one source's rows with the items in its YAML file, in one
+        transaction. The file is checked again under the write lock, so an
+        export by another worker is never imported back over newer state.
+        In a {container: [...]} file, the keys around the item list are kept
+        as YAML text and written back unchanged on export.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.get_meta(conn, f"mtime:{source}") == str(os.path.getmtime(file_path)):
+                conn.execute("COMMIT")
+                return
+            data = yaml_io.Catalogue.load(file_path).data
+            container = None
+            before, after = {}, {}
+            if isinstance(data, dict):
+                container = next((k for k, v in data.items() if isinstance(v, list)), None)
+                items = data.get(container, []) if container else [data]
+                if container:
+                    names = list(data)
+                    position = names.index(container)
+                    before = {name: data[name] for name in names[:position]}
+                    after = {name: data[name] for name in names[position + 1:]}
+            else:
+                items = data if isinstance(data, list) else []
+            keys = self.upsert_items(conn, source, items)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS imported (item_key TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM imported")
+            conn.executemany("INSERT OR IGNORE INTO imported VALUES (?)", [(key,) for key in keys])
+            conn.execute(
+                "DELETE FROM jobs WHERE source = ? AND item_key NOT IN (SELECT item_key FROM imported)", (source,)
+            )
+            self.set_meta(conn, f"container:{source}", container or "")
+            self.set_meta(conn, f"before:{source}", yaml_io.dumps(before, sort_keys=False) if before else "")
+            self.set_meta(conn, f"after:{source}", yaml_io.dumps(after, sort_keys=False) if after else "")
+            self.set_meta(conn, f"multi_document:{source}", "1" if yaml_io.is_multi_document(file_path) else "")
+            self.set_meta(conn, f"mtime:{source}", str(os.path.getmtime(file_path)))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"Imported {len(keys)} items from {file_path} into the job store")
+
+    def sync_from_yaml(self, sources=None):
+        """Imports every YAML catalogue (or just `sources`) that changed since the last import or export."""
+        if not os.path.isdir(self.yaml_dir):
+            return
+        conn = self.connect()
+        try:
+            for filename in sorted(os.listdir(self.yaml_dir)):
+                if not filename.endswith(".yaml") or (sources is not None and filename not in sources):
+                    continue
+                file_path = os.path.join(self.yaml_dir, filename)
+                if self.get_meta(conn, f"mtime:{filename}") == str(os.path.getmtime(file_path)):
+                    continue
+                try:
+                    self.import_file(conn, filename, file_path)
+                except yaml_io.YAMLError as e:
+                    print(f"Error parsing YAML file {filename}: {e}")
+        finally:
+            conn.close()
+
+    def export_yaml(self, sources=None, chunk_size=1000):
+        """
+        Writes each source back to its YAML file in its original shape
+        (list, multi-document or {container: [...]} with the other top-level
+        keys as imported), with generated flags from the store. Rows are streamed to a temporary file in chunks and
+        renamed into place, so large sources export in constant memory.
+        """
+        conn = self.connect()
+        try:
+            if sources is None:
+                sources = [row[0] for row in conn.execute("SELECT DISTINCT source FROM jobs")]
+            for source in sources:
+                file_path = os.path.join(self.yaml_dir, source)
+                container = self.get_meta(conn, f"container:{source}")
+                before = self.get_meta(conn, f"before:{source}") or ""
+                after = self.get_meta(conn, f"after:{source}") or ""
+                multi_document = self.get_meta(conn, f"multi_document:{source}")
+                if multi_document is None:
+                    multi_document = config.yaml_multi_document
+                os.makedirs(self.yaml_dir, exist_ok=True)
+                # Hold the write lock so no status changes land between the
+                # snapshot and the recorded mtime
+                conn.execute("BEGIN IMMEDIATE")
+                fd, temp_path = tempfile.mkstemp(dir=self.yaml_dir, prefix=f".{source}.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        if container and not multi_document:
+                            f.write(before)
+                        rows = conn.execute(
+                            "SELECT data, generated FROM jobs WHERE source = ? ORDER BY position", (source,)
+                        )
+                        written = 0
+                        while True:
+                            chunk = rows.fetchmany(chunk_size)
+                            if not chunk:
+                                break
+                            items = []
+                            for row in chunk:
+                                item = json.loads(row["data"])
+                                item["generated"] = "yes" if row["generated"] else "false"
+                                items.append(item)
+                            if multi_document:
+                                f.write("".join(yaml_io.dumps_document(item) for item in items))
+                            else:
+                                if container and not written:
+                                    f.write(f"{container}:\n")
+                                f.write(yaml_io.dumps(items))
+                            written += len(items)
+                        if not written and not multi_document:
+                            f.write(f"{container}: []\n" if container else "[]\n")
+                        if container and not multi_document:
+                            f.write(after)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    keep_permissions(temp_path, file_path)
+                    os.replace(temp_path, file_path)
+                    self.set_meta(conn, f"mtime:{source}", str(os.path.getmtime(file_path)))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+        finally:
+            conn.close()
+
+    def pending(self, sources=None):
+        """Returns (source, item key, item) for every row not yet generated, in catalogue order."""
+        conn = self.connect()
+        try:
+            query = "SELECT source, item_key, data FROM jobs WHERE generated = 0 AND status != 'running'"
+            params = []
+            if sources:
+                query += f" AND source IN ({','.join('?' * len(sources))})"
+                params = list(sources)
+            query += " ORDER BY source, position"
+            return [(row["source"], row["item_key"], json.loads(row["data"])) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def mark_generated(self, *item_keys):
+        """Marks rows generated in one transaction."""
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE jobs SET generated = 1, status = 'done', lease_owner = NULL, lease_expires = NULL, "
+                    "updated_at = ? WHERE item_key = ?",
+                    [(now, item_key) for item_key in item_keys],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def claim(self, worker_id, limit=1, lease_seconds=None, sources=None):
+        """
+        Atomically leases up to `limit` pending rows to a worker, in catalogue
+        order, after putting rows whose lease expired (their worker died)
+        back in the queue.
+
+        Returns:
+            list: (source, item key, item) for each claimed row
+        """
+        lease_seconds = lease_seconds or config.worker_lease_seconds
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self.requeue_expired(conn, now)
+                query = "SELECT id, source, item_key, data FROM jobs WHERE status = 'pending' AND generated = 0"
+                params = []
+                if sources:
+                    query += f" AND source IN ({','.join('?' * len(sources))})"
+                    params = list(sources)
+                query += " ORDER BY source, position LIMIT ?"
+                rows = conn.execute(query, params + [limit]).fetchall()
+                conn.executemany(
+                    "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(worker_id, now + lease_seconds, now, row["id"]) for row in rows],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return [(row["source"], row["item_key"], json.loads(row["data"])) for row in rows]
+        finally:
+            conn.close()
+
+    def requeue_expired(self, conn, now=None):
+        """Puts running rows whose lease expired back to pending (or failed after too many attempts)."""
+        now = now or time.time()
+        cursor = conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_owner = NULL, lease_expires = NULL "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (config.worker_max_attempts, now),
+        )
+        if cursor.rowcount:
+            print(f"Requeued {cursor.rowcount} jobs whose worker stopped renewing its lease")
+        return cursor.rowcount
+
+    def heartbeat(self, worker_id, item_keys, lease_seconds=None):
+        """Extends the leases a worker holds. Returns how many were renewed."""
+        if not item_keys:
+            return 0
+        lease_seconds = lease_seconds or config.worker_lease_seconds
+        conn = self.connect()
+        try:
+            cursor = conn.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND lease_owner = ? "
+                f"AND item_key IN ({','.join('?' * len(item_keys))})",
+                [time.time() + lease_seconds, worker_id] + list(item_keys),
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def release(self, worker_id, item_key, failed=True):
+        """
+        Gives a claimed job back. A failed one goes back to pending for another
+        try, or to failed once it has used up config.worker_max_attempts; one
+        released unfinished (the worker is stopping) does not use an attempt.
+        """
+        conn = self.connect()
+        try:
+            if failed:
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                    "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE item_key = ? AND lease_owner = ? AND status = 'running'",
+                    (config.worker_max_attempts, time.time(), item_key, worker_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = MAX(attempts - 1, 0), "
+                    "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE item_key = ? AND lease_owner = ? AND status = 'running'",
+                    (time.time(), item_key, worker_id),
+                )
+        finally:
+            conn.close()
+
+    def requeue(self, include_failed=False):
+        """Puts every running (and optionally failed) job back in the queue, e.g. after a crash of all workers."""
+        conn = self.connect()
+        try:
+            statuses = ("running", "failed") if include_failed else ("running",)
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, attempts = 0 "
+                f"WHERE generated = 0 AND status IN ({','.join('?' * len(statuses))})",
+                statuses,
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def add_items(self, source, items):
+        """
+        Appends items to a source after its existing rows, in one transaction.
+        An item whose key is already in the store, e.g. a pk repeated in an
+        earlier call, is skipped with a message instead of overwriting it.
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                items = [item for item in items if isinstance(item, dict)]
+                existing = self.existing_keys(conn, [manifest.item_key(source, item) for item in items])
+                added = []
+                for item in items:
+                    key = manifest.item_key(source, item)
+                    if key in existing:
+                        print(f"{source}: skipping {key}, already in the job store")
+                        continue
+                    existing.add(key)
+                    added.append(item)
+                row = conn.execute("SELECT MAX(position) FROM jobs WHERE source = ?", (source,)).fetchone()
+                start = row[0] + 1 if row[0] is not None else 0
+                keys = self.upsert_items(conn, source, added, start=start)
+                conn.execute("COMMIT")
+                return keys
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def find(self, **columns):
+        """
+        Looks items up by indexed columns, e.g. find(pk="ab12c"),
+        find(diagram_pk="x9y8z") or find(package="bundle.zip").
+        """
+        allowed = {"type", "pk", "diagram_pk", "package", "source", "generated"}
+        unknown = set(columns) - allowed
+        if unknown:
+            raise Exception(f"Cannot look jobs up by {', '.join(sorted(unknown))}")
+        where = " AND ".join(f"{name} = ?" for name in columns) or "1"
+        conn = self.connect()
+        try:
+            return [
+                (row["source"], json.loads(row["data"]))
+                for row in conn.execute(f"SELECT source, data FROM jobs WHERE {where} ORDER BY source, position",
+                                        list(columns.values()))
+            ]
+        finally:
+            conn.close()
+
+    def counts(self, sources=None):
+        query = "SELECT status, COUNT(*) AS n FROM jobs"
+        params = []
+        if sources:
+            query += f" WHERE source IN ({','.join('?' * len(sources))})"
+            params = list(sources)
+        conn = self.connect()
+        try:
+            return {row["status"]: row["n"] for row in conn.execute(query + " GROUP BY status", params)}
+        finally:
+            conn.close()
+
+    @staticmethod
+    def existing_keys(conn, item_keys, chunk_size=500):
+        """Returns which of the given item keys already have a row."""
+        existing = set()
+        for i in range(0, len(item_keys), chunk_size):
+            chunk = item_keys[i:i + chunk_size]
+            existing.update(row[0] for row in conn.execute(
+                f"SELECT item_key FROM jobs WHERE item_key IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return existing
+
+    @staticmethod
+    def get_meta(conn, key):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def set_meta(conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+job_store = JobStore()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Sync the SQLite job store with the YAML catalogues')
+    parser.add_argument('command', choices=['import', 'export', 'status', 'find', 'requeue'],
+                      help='import changed YAML files, export the store to YAML, show counts, look items up, '
+                           'or put jobs left running by stopped workers back in the queue')
+    parser.add_argument('--failed', action='store_true', help='With requeue, also retry failed jobs')
+    parser.add_argument('--pk', help='Find the item with this pk')
+    parser.add_argument('--diagram-pk', help='Find the item with this diagram pk')
+    parser.add_argument('--package', help='Find the items in this package')
+    args = parser.parse_args()
+    if args.command == 'import':
+        job_store.sync_from_yaml()
+    elif args.command == 'export':
+        job_store.export_yaml()
+    elif args.command == 'status':
+        print(job_store.counts())
+    elif args.command == 'requeue':
+        print(f"Requeued {job_store.requeue(include_failed=args.failed)} jobs")
+    else:
+        filters = {name: value for name, value in
+                   (("pk", args.pk), ("diagram_pk", args.diagram_pk), ("package", args.package)) if value}
+        for source, item in job_store.find(**filters):
+            print(f"{source}: {json.dumps(item, default=str)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import json
+import time
+from src.config import config
+
+class Journal:
+    """
+    Append-only record of items completed during a run. Each line is fsync'd
+    as soon as its item finishes, so after a crash --resume can tell exactly
+    which items were already generated even though the YAML write-back never
+    happened.
+    """
+    def __init__(self, path=None):
+        self.path = path or config.journal_path
+        self.file = None
+
+    def replay(self):
+        """
+        Returns {item key: fingerprint} for every completed item in the
+        journal. A torn last line from a crash is ignored.
+        """
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                completed[entry["key"]] = entry.get("fingerprint")
+        print(f"Replayed {len(completed)} completed items from {self.path}")
+        return completed
+
+    def open(self, resume=False):
+        """Opens the journal, keeping earlier entries only when resuming."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, 'a' if resume else 'w')
+
+    def record(self, key, fingerprint=None):
+        if self.file is None:
+            return
+        self.file.write(json.dumps({"key": key, "fingerprint": fingerprint, "time": time.time()}) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self, clear=False):
+        """
+        Closes the journal. Pass clear=True once the YAML files have been
+        written back, since the journal is then no longer needed.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if clear and os.path.exists(self.path):
+            os.remove(self.path)
+
+journal = Journal()
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from src.config import config
+
+class LLMCache:
+    """
+    On-disk cache of LLM responses stored in SQLite and keyed by a hash of
+    (provider, model, prompt, generation params). Entries older than the
+    maximum age are dropped and, once the cache grows past its size limit,
+    the least recently used entries are evicted.
+    """
+    def __init__(self, path=None, max_bytes=None, max_age=None):
+        self.path = path or config.llm_cache_path
+        self.max_bytes = max_bytes if max_bytes is not None else config.llm_cache_max_bytes
+        self.max_age = max_age if max_age is not None else config.llm_cache_max_age
+        self.enabled = config.llm_cache_enabled
+        self.refresh = False
+        self.hits = 0
+        self.misses = 0
+        self.writes_since_evict = 0
+        self.conn = None
+
+    def configure(self, enabled=None, refresh=None):
+        """
+        Turns the cache off entirely (enabled=False) or makes it skip reads but
+        still store fresh responses (refresh=True).
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if refresh is not None:
+            self.refresh = refresh
+
+    @staticmethod
+    def make_key(provider, model, prompt, params=None):
+        payload = json.dumps(
+            {"provider": provider, "model": model, "prompt": prompt, "params": params or {}},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def connect(self):
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+            self.conn.commit()
+        return self.conn
+
+    def get(self, key):
+        """Returns the cached response for a key, or None on a miss."""
+        if not self.enabled or self.refresh:
+            return None
+        try:
+            conn = self.connect()
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row and self.max_age and row[1] < now - self.max_age:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Error reading LLM cache: {e}")
+            self.misses += 1
+            return None
+
+    def put(self, key, provider, model, response):
+        """Stores a response, evicting old entries every so often."""
+        if not self.enabled or not response:
+            return
+        try:
+            conn = self.connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, len(response.encode("utf-8")), now, now),
+            )
+            conn.commit()
+            self.writes_since_evict += 1
+            if self.writes_since_evict >= 50:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"Error writing LLM cache: {e}")
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until under the size limit."""
+        self.writes_since_evict = 0
+        conn = self.connect()
+        if self.max_age:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+        if self.max_bytes:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                stale = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0
+        return f"LLM cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.evict()
+            except sqlite3.Error as e:
+                print(f"Error evicting LLM cache entries: {e}")
+            self.conn.close()
+            self.conn = None
+
+llm_cache = LLMCache()
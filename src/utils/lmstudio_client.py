@@ -1,6 +1,9 @@
 import os
 from dotenv import load_dotenv
 import httpx
+from src.utils.http_clients import http_clients
+from src.utils.streaming import openai_sse_chunks
+from src.utils.rate_limiter import is_rate_limit_error
 
 load_dotenv()
 
@@ -9,7 +12,11 @@ class LMStudioClient:
         self.api_url = os.environ.get("LMSTUDIO_API_URL")
         if not self.api_url:
             raise Exception("LMSTUDIO_API_URL environment variable not set")
-        self.client = httpx.AsyncClient()
+        self.model = os.environ.get("LMSTUDIO_MODEL")
+
+    @property
+    def client(self):
+        return http_clients.get("lmstudio")
 
     async def generate_text(self, prompt):
         try:
@@ -17,10 +24,27 @@ class LMStudioClient:
                 f"{self.api_url}/v1/chat/completions",
                 json={
                     "messages": [{"role": "user", "content": prompt}],
+                    **({"model": self.model} if self.model else {}),
                 },
             )
             response.raise_for_status()
             return response.json()["choices"][0]["message"]["content"]
         except httpx.HTTPError as e:
+            if is_rate_limit_error(e):
+                raise
             print(f"Error generating text with LM Studio API: {e}")
             return None
+
+    async def stream_text(self, prompt):
+        async with self.client.stream(
+            "POST",
+            f"{self.api_url}/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": True,
+                **({"model": self.model} if self.model else {}),
+            },
+        ) as response:
+            response.raise_for_status()
+            async for chunk in openai_sse_chunks(response):
+                yield chunk
@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+from src.config import config
+from src.utils.file_handler import atomic_write
+
+# file path -> ((size, mtime_ns), sha256) of files hashed so far
+file_hashes = {}
+
+class BuildManifest:
+    """
+    Records a fingerprint of every generated item's inputs: its YAML fields,
+    the existing file it references and its prompt template. An item is
+    rebuilt only when that fingerprint changes or its output is missing, or
+    when its YAML entry explicitly says generated: false.
+    """
+    # Fields that describe build state rather than build inputs
+    IGNORED_FIELDS = {"generated"}
+
+    def __init__(self, path=None):
+        self.path = path or config.manifest_path
+        self.entries = None
+        self.changed = set()
+
+    def load(self):
+        if self.entries is None:
+            self.entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self.entries = json.load(f).get("items", {})
+                except (ValueError, OSError) as e:
+                    print(f"Error reading build manifest {self.path}, rebuilding it: {e}")
+        return self.entries
+
+    def save(self, merge=False):
+        """
+        Writes the manifest. With merge=True only the entries recorded by this
+        process are written over the file's current contents, under a lock,
+        so several workers sharing the manifest do not drop each other's.
+        """
+        if self.entries is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not merge:
+            atomic_write(self.path, json.dumps({"items": self.entries}, indent=2, sort_keys=True))
+            self.changed.clear()
+            return
+        import fcntl
+        with open(self.path + ".lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        entries = json.load(f).get("items", {})
+                except (ValueError, OSError) as e:
+                    print(f"Error reading build manifest {self.path}, rewriting it: {e}")
+            entries.update({key: self.entries[key] for key in self.changed if key in self.entries})
+            atomic_write(self.path, json.dumps({"items": entries}, indent=2, sort_keys=True))
+        self.entries = entries
+        self.changed.clear()
+
+    @staticmethod
+    def item_key(filename, item):
+        return f"{filename}:{item.get('pk') or item.get('new_filename')}"
+
+    @staticmethod
+    def hash_file(file_path):
+        """
+        Hashes a file's contents. Hashes are kept per path and reused while
+        the file's size and mtime are unchanged, so a long-running process
+        only rereads files that changed.
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return "missing"
+        cached = file_hashes.get(file_path)
+        if cached and cached[0] == (stat.st_size, stat.st_mtime_ns):
+            return cached[1]
+        digest = hashlib.sha256()
+        try:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        except FileNotFoundError:
+            return "missing"
+        file_hashes[file_path] = ((stat.st_size, stat.st_mtime_ns), digest.hexdigest())
+        return file_hashes[file_path][1]
+
+    def fingerprint(self, item, template=""):
+        """
+        Hashes an item's YAML fields, its referenced existing file and its
+        prompt template into one fingerprint.
+        """
+        fields = {k: v for k, v in item.items() if k not in self.IGNORED_FIELDS}
+        existing_hash = ""
+        if item.get("existing_filename") and item.get("old_filepath"):
+            existing_hash = self.hash_file(os.path.join(item["old_filepath"], item["existing_filename"]))
+        payload = json.dumps(
+            {
+                "fields": fields,
+                "existing_file": existing_hash,
+                "template": hashlib.sha256(template.encode("utf-8")).hexdigest(),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def output_exists(item):
+        new_filename = item.get("new_filename")
+        new_filepath = item.get("new_filepath")
+        return bool(new_filename and new_filepath and os.path.exists(os.path.join(new_filepath, new_filename)))
+
+    def needs_build(self, filename, item, template=""):
+        """
+        Returns the reason an item must be (re)generated, or None when it is
+        up to date.
+        """
+        entries = self.load()
+        key = self.item_key(filename, item)
+        fingerprint = self.fingerprint(item, template)
+        if str(item.get("generated")).lower() == "false":
+            return "marked generated: false"
+        if not self.output_exists(item):
+            return "output missing"
+        recorded = entries.get(key)
+        if recorded is None:
+            # Generated before the manifest existed: adopt it as up to date
+            entries[key] = fingerprint
+            self.changed.add(key)
+            return None
+        if recorded != fingerprint:
+            return "inputs changed"
+        return None
+
+    def record(self, filename, item, template=""):
+        """
+        Stores an item's fingerprint after a successful build. It is computed
+        again here because the build may have rewritten its own input.
+        """
+        fingerprint = self.fingerprint(item, template)
+        key = self.item_key(filename, item)
+        self.load()[key] = fingerprint
+        self.changed.add(key)
+        return fingerprint
+
+manifest = BuildManifest()
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+from src.config import config
+from src.utils.file_handler import atomic_write
+
+# Label of the job being processed, set per task by the scheduler
+current_item = contextvars.ContextVar("current_item", default=None)
+# The call being measured, so retries and queue waits can be added to it
+current_call = contextvars.ContextVar("current_call", default=None)
+# Queue wait noted before a measured call starts (the scheduler slot is taken first)
+pending_wait = contextvars.ContextVar("pending_wait", default=0.0)
+
+PERCENTILES = (50, 95, 99)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Metrics:
+    """
+    Records one entry per measured call (LLM request, diagram render, image
+    download, file write) with its wall time, queue wait, tokens, bytes,
+    retries and estimated cost. Entries are appended to a JSON-lines file as
+    they finish; a Prometheus textfile and a per-stage summary are written at
+    the end of the run.
+    """
+    def __init__(self):
+        self.enabled = config.metrics_enabled
+        self.jsonl_path = os.path.join(config.metrics_dir, "calls.jsonl")
+        self.prom_path = os.path.join(config.metrics_dir, "goo10burg.prom")
+        self.records = []
+        self.file = None
+        self.run_id = None
+        self.started = None
+
+    def open(self):
+        """Starts a run: later records carry its id and are appended to calls.jsonl."""
+        self.records = []
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        if self.enabled:
+            os.makedirs(os.path.dirname(self.jsonl_path), exist_ok=True)
+            self.file = open(self.jsonl_path, 'a')
+
+    def set_item(self, label):
+        current_item.set(label)
+
+    def note_queue_wait(self, seconds):
+        """Adds time spent waiting for a scheduler slot to the current or next call."""
+        call = current_call.get()
+        if call is not None:
+            call["queue_wait"] += seconds
+        else:
+            pending_wait.set(pending_wait.get() + seconds)
+
+    def add(self, **counts):
+        """Adds counts (e.g. retries=1) to the call being measured, if any."""
+        call = current_call.get()
+        if call is None:
+            return
+        for name, value in counts.items():
+            call[name] = call.get(name, 0) + value
+
+    @contextmanager
+    def measure(self, stage, **fields):
+        """
+        Times the enclosed block as one call of `stage`. The yielded dict can be
+        filled with prompt_tokens, completion_tokens, bytes, cached, ok and so on.
+        """
+        call = {
+            "stage": stage,
+            "item": current_item.get(),
+            "queue_wait": pending_wait.get(),
+            "retries": 0,
+            "ok": True,
+            **fields,
+        }
+        pending_wait.set(0.0)
+        token = current_call.set(call)
+        started = time.monotonic()
+        try:
+            yield call
+        except BaseException:
+            call["ok"] = False
+            raise
+        finally:
+            call["wall"] = round(time.monotonic() - started, 4)
+            current_call.reset(token)
+            self.record(call)
+
+    def cost(self, provider, prompt_tokens, completion_tokens):
+        """Estimated cost in USD from config.token_prices (per million tokens)."""
+        price_in, price_out = config.token_prices.get(provider, (0.0, 0.0))
+        return round((prompt_tokens * price_in + completion_tokens * price_out) / 1000000, 6)
+
+    def record(self, call):
+        if not self.enabled:
+            return
+        if "provider" in call and ("prompt_tokens" in call or "completion_tokens" in call) and not call.get("cached"):
+            call["cost"] = self.cost(call["provider"], call.get("prompt_tokens", 0), call.get("completion_tokens", 0))
+        call["queue_wait"] = round(call["queue_wait"], 4)
+        call["run"] = self.run_id
+        call["ts"] = round(time.time(), 3)
+        self.records.append(call)
+        if self.file:
+            self.file.write(json.dumps(call, default=str) + "\n")
+            self.file.flush()
+
+    def stages(self):
+        grouped = {}
+        for call in self.records:
+            grouped.setdefault(call["stage"], []).append(call)
+        return grouped
+
+    def summary(self):
+        """Per-stage counts, latency percentiles and totals for the run."""
+        lines = [f"Run {self.run_id} metrics:"]
+        for stage, calls in sorted(self.stages().items()):
+            walls = [call["wall"] for call in calls]
+            waits = [call["queue_wait"] for call in calls]
+            line = (
+                f"  {stage}: {len(calls)} calls, {sum(1 for call in calls if not call['ok'])} failed, "
+                + ", ".join(f"p{pct} {percentile(walls, pct):.2f}s" for pct in PERCENTILES)
+                + f", queue p95 {percentile(waits, 95):.2f}s"
+                + f", retries {sum(call.get('retries', 0) for call in calls)}"
+            )
+            tokens = sum(call.get("prompt_tokens", 0) + call.get("completion_tokens", 0) for call in calls)
+            if tokens:
+                line += f", tokens {tokens}"
+            size = sum(call.get("bytes", 0) for call in calls)
+            if size:
+                line += f", {size / 1024:.1f} KiB"
+            cost = sum(call.get("cost", 0.0) for call in calls)
+            if cost:
+                line += f", ${cost:.4f}"
+            lines.append(line)
+        if self.started:
+            lines.append(f"  total wall time {time.time() - self.started:.1f}s")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """Renders the run's metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP goo10burg_call_seconds Wall time of calls per stage.",
+            "# TYPE goo10burg_call_seconds summary",
+        ]
+        stages = sorted(self.stages().items())
+        for stage, calls in stages:
+            walls = [call["wall"] for call in calls]
+            for pct in PERCENTILES:
+                lines.append(f'goo10burg_call_seconds{{stage="{stage}",quantile="{pct / 100}"}} {percentile(walls, pct)}')
+            lines.append(f'goo10burg_call_seconds_sum{{stage="{stage}"}} {sum(walls)}')
+            lines.append(f'goo10burg_call_seconds_count{{stage="{stage}"}} {len(walls)}')
+        counters = [
+            ("queue_wait_seconds_total", "Time spent waiting for a scheduler slot.", "queue_wait"),
+            ("retries_total", "Retried requests.", "retries"),
+            ("prompt_tokens_total", "Prompt tokens sent.", "prompt_tokens"),
+            ("template_tokens_total", "Prompt tokens taken by the item template.", "template_tokens"),
+            ("reference_tokens_total", "Prompt tokens taken by the (condensed) reference file.", "reference_tokens"),
+            ("completion_tokens_total", "Completion tokens received.", "completion_tokens"),
+            ("bytes_total", "Response or written bytes.", "bytes"),
+            ("cost_usd_total", "Estimated cost in USD.", "cost"),
+        ]
+        for name, help_text, field in counters:
+            lines.append(f"# HELP goo10burg_{name} {help_text}")
+            lines.append(f"# TYPE goo10burg_{name} counter")
+            for stage, calls in stages:
+                lines.append(f'goo10burg_{name}{{stage="{stage}"}} {sum(call.get(field, 0) for call in calls)}')
+        lines.append("# HELP goo10burg_call_failures_total Calls that failed.")
+        lines.append("# TYPE goo10burg_call_failures_total counter")
+        for stage, calls in stages:
+            lines.append(f'goo10burg_call_failures_total{{stage="{stage}"}} {sum(1 for call in calls if not call["ok"])}')
+        lines.append("# HELP goo10burg_last_run_timestamp_seconds When the last run finished.")
+        lines.append("# TYPE goo10burg_last_run_timestamp_seconds gauge")
+        lines.append(f"goo10burg_last_run_timestamp_seconds {time.time():.3f}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """Ends the run: writes the Prometheus textfile and prints the summary."""
+        if self.file:
+            self.file.close()
+            self.file = None
+        if not self.enabled or not self.records:
+            return
+        os.makedirs(os.path.dirname(self.prom_path), exist_ok=True)
+        atomic_write(self.prom_path, self.prometheus())
+        print(self.summary())
+
+metrics = Metrics()
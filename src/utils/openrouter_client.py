@@ -1,6 +1,9 @@
 import os
 from dotenv import load_dotenv
 import httpx
+from src.utils.http_clients import http_clients
+from src.utils.streaming import openai_sse_chunks
+from src.utils.rate_limiter import is_rate_limit_error
 
 load_dotenv()
 
@@ -9,8 +12,13 @@ class OpenRouterClient:
         self.api_key = os.environ.get("OPENROUTER_API_KEY")
         if not self.api_key:
             raise Exception("OPENROUTER_API_KEY environment variable not set")
-        self.client = httpx.AsyncClient(
-            headers={"Authorization": f"Bearer {self.api_key}"}
+        self.model = "openai/gpt-3.5-turbo"
+
+    @property
+    def client(self):
+        return http_clients.get(
+            "openrouter",
+            headers={"Authorization": f"Bearer {self.api_key}"},
         )
 
     async def generate_text(self, prompt):
@@ -18,12 +26,28 @@ class OpenRouterClient:
             response = await self.client.post(
                 "https://openrouter.ai/api/v1/chat/completions",
                 json={
-                    "model": "openai/gpt-3.5-turbo",
+                    "model": self.model,
                     "messages": [{"role": "user", "content": prompt}],
                 },
             )
             response.raise_for_status()
             return response.json()["choices"][0]["message"]["content"]
         except httpx.HTTPError as e:
+            if is_rate_limit_error(e):
+                raise
             print(f"Error generating text with OpenRouter API: {e}")
             return None
+
+    async def stream_text(self, prompt):
+        async with self.client.stream(
+            "POST",
+            "https://openrouter.ai/api/v1/chat/completions",
+            json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": True,
+            },
+        ) as response:
+            response.raise_for_status()
+            async for chunk in openai_sse_chunks(response):
+                yield chunk
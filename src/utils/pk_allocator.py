@@ -0,0 +1,141 @@
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+from src.config import config
+from src.utils.file_handler import atomic_write
+from src.utils import yaml_io
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite's own locking still keeps allocation safe
+    fcntl = None
+
+class PKAllocator:
+    """
+    Hands out unused pks from an indexed SQLite free list instead of
+    rescanning and rewriting pk.yaml for every pk. The database is seeded from
+    pk.yaml, which stays available as an exported view. Allocation runs in an
+    IMMEDIATE transaction under a file lock, so several processes can reserve
+    pks at once without handing out the same one twice.
+    """
+    def __init__(self, yaml_path=None, db_path=None):
+        self.yaml_path = yaml_path or config.pk_yaml_path
+        self.db_path = db_path or os.path.splitext(self.yaml_path)[0] + ".sqlite3"
+        self.lock_path = self.yaml_path + ".lock"
+
+    @contextmanager
+    def lock(self):
+        """Exclusive cross-process lock around allocation and YAML import/export."""
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS pks (
+                pk TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                used INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pks_free ON pks (used, position)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return conn
+
+    def sync_from_yaml(self, conn):
+        """
+        Imports pk.yaml when it changed since the last import or export: new pks
+        are added and pks marked used there are marked used here. A pk used in
+        the database is never freed by an older YAML view.
+        """
+        if not os.path.exists(self.yaml_path):
+            return
+        mtime = str(os.path.getmtime(self.yaml_path))
+        row = conn.execute("SELECT value FROM meta WHERE key = 'yaml_mtime'").fetchone()
+        if row and row[0] == mtime:
+            return
+        pk_data = yaml_io.load_file(self.yaml_path) or []
+        if not isinstance(pk_data, list):
+            raise Exception("Invalid PK file format")
+        rows = []
+        for position, item in enumerate(pk_data):
+            if not isinstance(item, dict) or isinstance(item.get('pk'), (list, dict)):
+                continue
+            pk_str = str(item.get('pk', '')).strip('"')
+            used_str = str(item.get('used', '')).lower()
+            if pk_str:
+                rows.append((pk_str, position, 0 if used_str in ('no', 'false') else 1))
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO pks (pk, position, used) VALUES (?, ?, ?) "
+            "ON CONFLICT(pk) DO UPDATE SET used = MAX(used, excluded.used)",
+            rows,
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('yaml_mtime', ?)", (mtime,))
+        conn.execute("COMMIT")
+        print(f"Imported {len(rows)} pks from {self.yaml_path}")
+
+    def reserve(self, n=1):
+        """
+        Marks the next n unused pks as used and returns them in pk.yaml order.
+        Raises if fewer than n are left.
+        """
+        with self.lock():
+            conn = self.connect()
+            try:
+                self.sync_from_yaml(conn)
+                conn.execute("BEGIN IMMEDIATE")
+                pks = [row[0] for row in conn.execute(
+                    "SELECT pk FROM pks WHERE used = 0 ORDER BY position LIMIT ?", (n,)
+                )]
+                if len(pks) < n:
+                    conn.execute("ROLLBACK")
+                    raise Exception("No unused PKs available")
+                conn.executemany("UPDATE pks SET used = 1 WHERE pk = ?", [(pk,) for pk in pks])
+                conn.execute("COMMIT")
+                return pks
+            finally:
+                conn.close()
+
+    def available(self):
+        with self.lock():
+            conn = self.connect()
+            try:
+                self.sync_from_yaml(conn)
+                return conn.execute("SELECT COUNT(*) FROM pks WHERE used = 0").fetchone()[0]
+            finally:
+                conn.close()
+
+    def export_yaml(self):
+        """Rewrites pk.yaml from the database once, after a batch of reservations."""
+        with self.lock():
+            conn = self.connect()
+            try:
+                pk_data = [
+                    {'pk': pk, 'used': 'yes' if used else False}
+                    for pk, used in conn.execute("SELECT pk, used FROM pks ORDER BY position")
+                ]
+                atomic_write(self.yaml_path, '# Available pk\'s\n' + yaml_io.dumps(pk_data, sort_keys=False))
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('yaml_mtime', ?)",
+                    (str(os.path.getmtime(self.yaml_path)),),
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('exported_at', ?)", (str(time.time()),))
+            finally:
+                conn.close()
+
+allocators = {}
+
+def get_allocator(pk_file_path=None):
+    """Returns the allocator for a pk.yaml path, creating it on first use."""
+    pk_file_path = pk_file_path or config.pk_yaml_path
+    if pk_file_path not in allocators:
+        allocators[pk_file_path] = PKAllocator(pk_file_path)
+    return allocators[pk_file_path]
@@ -0,0 +1,177 @@
+import os
+import asyncio
+import hashlib
+from src.config import config
+from src.utils.scheduler import scheduler
+from src.utils.file_handler import atomic_write
+
+# Rough characters per token when no tokenizer is installed for a provider
+CHARS_PER_TOKEN = {
+    "gemini": 4.0,
+    "openai": 4.0,
+    "openrouter": 4.0,
+    "anthropic": 3.5,
+    "lmstudio": 4.0,
+}
+
+encodings = {}
+
+def cl100k_encoding():
+    """tiktoken's cl100k encoding, imported on first use; None when tiktoken is not installed."""
+    if "cl100k" not in encodings:
+        try:
+            import tiktoken
+            encodings["cl100k"] = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            encodings["cl100k"] = None
+    return encodings["cl100k"]
+
+def count_tokens(text, provider=None):
+    """
+    Counts tokens for a provider: exactly with tiktoken for OpenAI models when
+    it is installed, otherwise from the provider's typical characters per token.
+    """
+    if not text:
+        return 0
+    provider = provider or config.llm
+    if provider in ("openai", "openrouter") and cl100k_encoding():
+        return len(encodings["cl100k"].encode(text, disallowed_special=()))
+    return int(len(text) / CHARS_PER_TOKEN.get(provider, 4.0)) + 1
+
+def split_long_line(line, chunk_tokens, provider=None):
+    """Cuts one line (minified code, a long data literal) into pieces of at most chunk_tokens each."""
+    ratio = CHARS_PER_TOKEN.get(provider or config.llm, 4.0)
+    pieces = []
+    while line:
+        size = max(1, int(chunk_tokens * ratio))
+        piece = line[:size]
+        while len(piece) > 1 and count_tokens(piece, provider) > chunk_tokens:
+            size = max(1, int(size * 0.9))
+            piece = line[:size]
+        pieces.append(piece)
+        line = line[len(piece):]
+    return pieces
+
+def split_into_chunks(text, chunk_tokens, provider=None):
+    """
+    Splits text on line boundaries into pieces of at most chunk_tokens each.
+    A line that is longer than that on its own is cut into pieces first.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = count_tokens(line, provider)
+        pieces = [line] if line_tokens <= chunk_tokens else split_long_line(line, chunk_tokens, provider)
+        for piece in pieces:
+            piece_tokens = line_tokens if len(pieces) == 1 else count_tokens(piece, provider)
+            if current and current_tokens + piece_tokens > chunk_tokens:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def truncate_to_budget(text, budget, provider=None):
+    """Hard cut used only when summarising still leaves the text too long."""
+    ratio = CHARS_PER_TOKEN.get(provider or config.llm, 4.0)
+    while count_tokens(text, provider) > budget and text:
+        text = text[:int(budget * ratio * 0.95)]
+        ratio *= 0.9
+    return text
+
+def summary_path(digest, budget):
+    return os.path.join(config.summary_cache_dir, digest[:2], f"{digest}-{budget}.txt")
+
+async def summarize(api, text, target_tokens, part=None):
+    where = f" (part {part[0]} of {part[1]})" if part else ""
+    prompt = f"""Condense the following reference file{where} so it can be used as context for rewriting it.
+Keep structure, section headings, function and parameter names, key facts and code that defines behaviour.
+Drop repetition, boilerplate and long examples. Use at most about {target_tokens} tokens.
+
+{text}
+"""
+    async with scheduler.limit("llm"):
+        # Condensing blocks the item's prompt, so it never waits for a batch round-trip
+        return await api.generate_text(prompt, batch=False)
+
+async def condense(api, text, budget, provider=None):
+    """
+    Map-reduce summarisation: summarises the chunks of an oversized text
+    concurrently, joins the summaries, and repeats on the joined text while it is still
+    over budget.
+    """
+    for round_number in range(config.condense_max_rounds):
+        if count_tokens(text, provider) <= budget:
+            return text
+        chunks = split_into_chunks(text, config.condense_chunk_tokens, provider)
+        target = max(64, budget // max(1, len(chunks)))
+        print(f"Condensing reference content: round {round_number + 1}, {len(chunks)} chunks")
+        # Chunks are summarised concurrently, each within the llm concurrency limit
+        summaries = await asyncio.gather(*(
+            summarize(api, chunk, target, (index, len(chunks)) if len(chunks) > 1 else None)
+            for index, chunk in enumerate(chunks, start=1)
+        ))
+        text = "\n\n".join(summary if summary else truncate_to_budget(chunk, target, provider)
+                           for chunk, summary in zip(chunks, summaries))
+    return truncate_to_budget(text, budget, provider)
+
+async def fit_reference(api, file_path, budget):
+    """
+    Returns the content of a reference file condensed to at most `budget`
+    tokens. Condensed versions are cached on disk by file hash and budget,
+    so an unchanged file is only summarised once.
+    """
+    with open(file_path, 'r') as f:
+        content = f.read()
+    provider = api.llm
+    if budget <= 0:
+        return ""
+    if count_tokens(content, provider) <= budget:
+        return content
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    cached_path = summary_path(digest, budget)
+    if os.path.exists(cached_path):
+        with open(cached_path, 'r') as f:
+            return f.read()
+    print(f"{file_path} is {count_tokens(content, provider)} tokens, condensing to {budget}")
+    condensed = await condense(api, content, budget, provider)
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+    atomic_write(cached_path, condensed)
+    return condensed
+
+def section_tokens(sections):
+    """Metrics fields for the per-section counts of build_prompt, e.g. {'reference_tokens': 812}."""
+    return {f"{name}_tokens": tokens for name, tokens in (sections or {}).items() if name != "total"}
+
+async def build_prompt(api, build, item, label=""):
+    """
+    Assembles a prompt within config.prompt_token_budget. `build(item,
+    existing_content)` renders the template; the reference file at
+    old_filepath/existing_filename gets whatever budget the template leaves
+    and is condensed to fit.
+
+    Returns:
+        tuple: (prompt, {section: tokens})
+    """
+    provider = api.llm
+    template_tokens = count_tokens(build(item, ""), provider)
+    existing_content = ""
+    old_filepath = item.get("old_filepath")
+    existing_filename = item.get("existing_filename")
+    if existing_filename and old_filepath:
+        file_path = os.path.join(old_filepath, existing_filename)
+        if os.path.exists(file_path):
+            existing_content = await fit_reference(api, file_path, config.prompt_token_budget - template_tokens)
+            print(f"Found existing content in {existing_filename}")
+        else:
+            print(f"No existing file found at {old_filepath}/{existing_filename}")
+    sections = {
+        "template": template_tokens,
+        "reference": count_tokens(existing_content, provider),
+    }
+    prompt = build(item, existing_content)
+    sections["total"] = count_tokens(prompt, provider)
+    print(f"Prompt tokens for {label}: " + ", ".join(f"{name}={tokens}" for name, tokens in sections.items())
+          + f" (budget {config.prompt_token_budget})")
+    return prompt, sections
@@ -0,0 +1,162 @@
+import time
+import asyncio
+from collections import deque
+from src.config import config
+
+class LatencyStats:
+    """Sliding window of recent call latencies and outcomes for one provider."""
+    def __init__(self, window=100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, latency, ok):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+class CircuitBreaker:
+    """
+    Opens when a provider's recent error rate or p95 latency passes its
+    threshold, rejects calls for a cooldown, then lets one trial call through
+    (half-open) and closes again if it succeeds.
+    """
+    def __init__(self, name, stats):
+        self.name = name
+        self.stats = stats
+        self.state = "closed"
+        self.opened_at = 0.0
+
+    def available(self):
+        """Whether a call would be let through now, without claiming the trial call."""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= config.breaker_cooldown
+        return self.state == "closed"
+
+    def allow(self):
+        """Lets a call through, moving an open circuit whose cooldown is over to half-open."""
+        if self.state == "open" and time.monotonic() - self.opened_at >= config.breaker_cooldown:
+            self.state = "half_open"
+            print(f"Circuit for {self.name} half-open, sending a trial request")
+            return True
+        return self.state == "closed"
+
+    def cancel(self):
+        """
+        Called when a call was cancelled before it finished, e.g. as the losing
+        hedge. A cancelled trial tells nothing about the provider, so the
+        circuit opens again for a fresh cooldown and a later call tries again.
+        """
+        if self.state == "half_open":
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def record(self, latency, ok):
+        self.stats.record(latency, ok)
+        if self.state == "half_open":
+            if ok:
+                self.state = "closed"
+                print(f"Circuit for {self.name} closed")
+            else:
+                self.trip("trial request failed")
+            return
+        if len(self.stats.outcomes) < config.breaker_min_calls:
+            return
+        p95 = self.stats.percentile(95)
+        if self.stats.error_rate() > config.breaker_error_rate:
+            self.trip(f"error rate {self.stats.error_rate():.0%}")
+        elif p95 is not None and config.breaker_max_p95 and p95 > config.breaker_max_p95:
+            self.trip(f"p95 latency {p95:.1f}s")
+
+    def trip(self, reason):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.stats.outcomes.clear()
+        print(f"Circuit for {self.name} opened: {reason}")
+
+class ProviderChain:
+    """
+    Sends a prompt to an ordered list of providers. The first provider gets
+    the request; if it has not answered within its hedge delay (a multiple of
+    its recent p95 latency) or it fails, the same prompt goes to the next
+    provider. The first good answer wins and the other calls are cancelled.
+    """
+    def __init__(self, apis):
+        self.apis = apis
+        self.stats = {api.llm: LatencyStats() for api in apis}
+        self.breakers = {api.llm: CircuitBreaker(api.llm, self.stats[api.llm]) for api in apis}
+
+    def hedge_delay(self, api):
+        p95 = self.stats[api.llm].percentile(95)
+        if p95 is None or len(self.stats[api.llm].latencies) < config.breaker_min_calls:
+            return config.hedge_default_delay
+        return max(config.hedge_min_delay, p95 * config.hedge_p95_multiplier)
+
+    async def attempt(self, api, prompt):
+        started = time.monotonic()
+        try:
+            text = await asyncio.wait_for(api.call_with_rate_limit(prompt), timeout=config.llm_call_deadline)
+        except asyncio.TimeoutError:
+            print(f"{api.llm} missed its {config.llm_call_deadline:.0f}s deadline")
+            text = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error generating text with {api.llm}: {e}")
+            text = None
+        self.breakers[api.llm].record(time.monotonic() - started, bool(text))
+        return text
+
+    async def generate_text(self, prompt):
+        candidates = [api for api in self.apis if self.breakers[api.llm].available()]
+        forced = not candidates
+        if forced:
+            print("Every provider circuit is open, trying the primary provider anyway")
+            candidates = self.apis[:1]
+        waiting = list(candidates)
+        running = {}
+        try:
+            while waiting or running:
+                # Each pass follows either the hedge delay expiring or a failed
+                # call, so the next provider in line is started. The breaker is
+                # asked only then, so a hedge never started never takes a trial
+                if waiting:
+                    api = waiting.pop(0)
+                    if not forced and not self.breakers[api.llm].allow():
+                        continue
+                    if running:
+                        print(f"Hedging request to {api.llm}")
+                    task = asyncio.create_task(self.attempt(api, prompt))
+                    # Also covers a task cancelled before it started running
+                    task.add_done_callback(lambda t, api=api: t.cancelled() and self.breakers[api.llm].cancel())
+                    running[task] = api
+                if not running:
+                    continue
+                newest = list(running.values())[-1]
+                done, _ = await asyncio.wait(
+                    running.keys(),
+                    timeout=self.hedge_delay(newest) if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    api = running.pop(task)
+                    text = task.result()
+                    if text:
+                        if api is not candidates[0]:
+                            print(f"Answer served by {api.llm}")
+                        return text
+            return None
+        finally:
+            for task in running:
+                task.cancel()
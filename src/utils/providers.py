@@ -0,0 +1,53 @@
+from src.config import config
+
+# Each provider's SDK is imported inside its loader, so a run only pays for
+# the backend it uses, and a missing key only fails when that backend is called
+
+def load_gemini():
+    import google.generativeai as genai
+    if not config.gemini_api_key:
+        raise Exception("GEMINI_API_KEY environment variable not set")
+    genai.configure(api_key=config.gemini_api_key)
+    model = 'gemini-pro'
+    return genai.GenerativeModel(model), model
+
+def load_anthropic():
+    from src.utils.anthropic_client import AnthropicClient
+    client = AnthropicClient()
+    return client, client.model
+
+def load_openai():
+    from openai import OpenAI
+    if not config.openai_api_key:
+        raise Exception("OPENAI_API_KEY environment variable not set")
+    return OpenAI(api_key=config.openai_api_key), "gpt-3.5-turbo"
+
+def load_openrouter():
+    from src.utils.openrouter_client import OpenRouterClient
+    client = OpenRouterClient()
+    return client, client.model
+
+def load_lmstudio():
+    from src.utils.lmstudio_client import LMStudioClient
+    client = LMStudioClient()
+    return client, client.model
+
+PROVIDERS = {
+    "gemini": load_gemini,
+    "anthropic": load_anthropic,
+    "openai": load_openai,
+    "openrouter": load_openrouter,
+    "lmstudio": load_lmstudio,
+}
+
+def create_client(name):
+    """
+    Imports and constructs the client for a provider.
+
+    Returns:
+        tuple: (client, model name)
+    """
+    loader = PROVIDERS.get(name)
+    if loader is None:
+        raise Exception(f"Invalid LLM specified in config: {name}")
+    return loader()
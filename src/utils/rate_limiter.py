@@ -0,0 +1,147 @@
+import time
+import asyncio
+from src.config import config
+from src.utils.retry import backoff_delay, retry_after_seconds
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for quota accounting."""
+    return max(1, len(text) // 4)
+
+def is_rate_limit_error(e):
+    """
+    Tells whether an exception from any provider SDK or httpx is a 429.
+    """
+    for attr in ("status_code", "code"):
+        try:
+            if int(getattr(e, attr, None)) == 429:
+                return True
+        except (TypeError, ValueError):
+            pass
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+class TokenBucket:
+    """
+    Allows up to `per_minute` units per minute, refilled continuously, with
+    bursts of up to one minute's worth.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        while True:
+            self.refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def drain(self):
+        self.refill()
+        self.tokens = 0.0
+
+class AdaptiveLimiter:
+    """
+    Per-provider limiter combining requests/min and tokens/min buckets with
+    AIMD concurrency control: the number of calls in flight grows by one
+    after a window of successes and is halved whenever the provider answers
+    429, so throughput settles just under the provider's quota.
+    """
+    def __init__(self, name, rpm=0, tpm=0, max_concurrency=4):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.cooldown_until = 0.0
+        self.waiters = []
+
+    async def acquire(self, tokens=1):
+        """Waits for a concurrency slot, any 429 cooldown and quota headroom."""
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        self.in_flight += 1
+        try:
+            delay = self.cooldown_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.requests:
+                await self.requests.acquire(1)
+            if self.tokens:
+                await self.tokens.acquire(tokens)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self, rate_limited=False, retry_after=None):
+        """
+        Frees a slot and adjusts concurrency: additive increase on success,
+        multiplicative decrease on a 429.
+        """
+        self.in_flight -= 1
+        if rate_limited:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+            if retry_after:
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + retry_after)
+            if self.requests:
+                self.requests.drain()
+            print(f"{self.name} rate limited, concurrency lowered to {self.limit}")
+        else:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self.successes = 0
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def retry_delay(self, e, attempt):
+        """Seconds to wait before retrying after a 429: Retry-After if given, else backoff."""
+        delay = retry_after_seconds(getattr(getattr(e, "response", None), "headers", None))
+        if delay is None:
+            delay = backoff_delay(attempt, config.retry_backoff_base, config.retry_backoff_cap)
+        return delay
+
+class RateLimiters:
+    """One AdaptiveLimiter per provider, built from config.rate_limits."""
+    def __init__(self):
+        self.limiters = {}
+        self.max_concurrency = config.llm_concurrency
+
+    def configure(self, max_concurrency):
+        """Sets the concurrency ceiling (the scheduler's LLM limit) for every provider."""
+        self.max_concurrency = max(1, int(max_concurrency))
+        for limiter in self.limiters.values():
+            limiter.max_concurrency = self.max_concurrency
+            limiter.limit = min(limiter.limit, self.max_concurrency)
+
+    def get(self, provider):
+        if provider not in self.limiters:
+            quota = config.rate_limits.get(provider, {})
+            self.limiters[provider] = AdaptiveLimiter(
+                provider,
+                rpm=quota.get("rpm", 0),
+                tpm=quota.get("tpm", 0),
+                max_concurrency=self.max_concurrency,
+            )
+        return self.limiters[provider]
+
+rate_limiters = RateLimiters()
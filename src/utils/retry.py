@@ -0,0 +1,30 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """
+    Returns a "full jitter" exponential backoff delay in seconds for a
+    zero-based retry attempt.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def retry_after_seconds(headers):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP date) into seconds,
+    or returns None when it is missing or malformed.
+    """
+    value = headers.get("retry-after") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
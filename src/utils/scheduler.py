@@ -0,0 +1,93 @@
+import time
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+from src.config import config
+from src.utils.metrics import metrics
+
+class Scheduler:
+    """
+    Fans generation jobs out as asyncio tasks and caps how many calls run
+    at once against each provider (the LLM and Eraser).
+    """
+    def __init__(self):
+        self.concurrency = {
+            "llm": config.llm_concurrency,
+            "diagram": config.diagram_concurrency,
+        }
+        self.limits = {}
+
+    def configure(self, llm_concurrency=None, diagram_concurrency=None):
+        """
+        Sets the per-provider limits. Call this from inside the running event
+        loop so the semaphores bind to it.
+        """
+        if llm_concurrency:
+            self.concurrency["llm"] = llm_concurrency
+        if diagram_concurrency:
+            self.concurrency["diagram"] = diagram_concurrency
+        self.limits = {
+            provider: asyncio.Semaphore(max(1, int(limit)))
+            for provider, limit in self.concurrency.items()
+        }
+
+    def semaphore(self, provider):
+        """
+        Returns the semaphore guarding calls to a provider ("llm" or "diagram").
+        """
+        if provider not in self.limits:
+            self.limits[provider] = asyncio.Semaphore(max(1, int(self.concurrency.get(provider, 1))))
+        return self.limits[provider]
+
+    @asynccontextmanager
+    async def limit(self, provider):
+        """
+        Holds a slot for a provider call, recording the time spent waiting
+        for it as queue wait.
+        """
+        semaphore = self.semaphore(provider)
+        queued = time.monotonic()
+        async with semaphore:
+            metrics.note_queue_wait(time.monotonic() - queued)
+            yield
+
+    async def run(self, jobs):
+        """
+        Runs every job concurrently and returns a list of booleans, one per job,
+        telling whether it finished without raising.
+
+        Args:
+            jobs (list): (label, job, on_success) tuples, where job is a
+                coroutine function taking no arguments and on_success is an
+                optional callback invoked as soon as that job completes.
+        """
+        total = len(jobs)
+        completed = 0
+
+        async def run_job(label, job, on_success):
+            nonlocal completed
+            metrics.set_item(label)
+            try:
+                result = await job()
+            except Exception as e:
+                print(f"Error processing {label}: {e}")
+                print(traceback.format_exc())
+                return False
+            if result is False:
+                print(f"Nothing generated for {label}")
+                return False
+            if on_success:
+                on_success()
+            completed += 1
+            print(f"Progress: {completed}/{total} items processed")
+            return True
+
+        tasks = [asyncio.create_task(run_job(label, job, on_success)) for label, job, on_success in jobs]
+        try:
+            return await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+scheduler = Scheduler()
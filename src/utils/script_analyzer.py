@@ -0,0 +1,297 @@
+import ast
+import re
+
+# Metadata fields script_to_yaml needs for every script
+METADATA_FIELDS = ['description', 'objective', 'input', 'output', 'labels']
+
+# Top-level import names (or dotted prefixes) and the labels they imply
+IMPORT_LABELS = {
+    'google.cloud.bigquery': ['#bigquery', '#gcp'],
+    'google.cloud': ['#gcp', '#cloud'],
+    'google.auth': ['#gcp', '#security'],
+    'googleapiclient': ['#gcp', '#api'],
+    'looker_sdk': ['#looker', '#api'],
+    'lkml': ['#lookml', '#looker'],
+    'requests': ['#api'],
+    'httpx': ['#api'],
+    'aiohttp': ['#api'],
+    'urllib.request': ['#api'],
+    'github': ['#github', '#version_control'],
+    'git': ['#version_control'],
+    'pandas': ['#data_engineering'],
+    'pyarrow': ['#data_engineering'],
+    'airflow': ['#etl', '#automation'],
+    'numpy': ['#data_science'],
+    'scipy': ['#data_science'],
+    'sklearn': ['#data_science'],
+    'matplotlib': ['#visualization'],
+    'seaborn': ['#visualization'],
+    'plotly': ['#visualization'],
+    'sqlalchemy': ['#sql'],
+    'sqlite3': ['#sql'],
+    'psycopg2': ['#sql'],
+    'pymysql': ['#sql'],
+    'pytest': ['#testing'],
+    'unittest': ['#testing'],
+    'boto3': ['#cloud'],
+    'docker': ['#devops'],
+    'kubernetes': ['#devops'],
+    'prometheus_client': ['#monitoring'],
+    'jwt': ['#security'],
+    'jose': ['#security'],
+    'cryptography': ['#security'],
+    'schedule': ['#automation'],
+}
+
+HTTP_READ_METHODS = {'get', 'head'}
+HTTP_WRITE_METHODS = {'post', 'put', 'patch', 'delete'}
+HTTP_MODULES = {'requests', 'httpx'}
+HTTP_CLIENT_FACTORIES = {'requests.Session', 'requests.session', 'httpx.Client', 'httpx.AsyncClient',
+                         'aiohttp.ClientSession'}
+DATAFRAME_WRITERS = {'to_csv', 'to_json', 'to_parquet', 'to_excel', 'to_sql', 'to_gbq'}
+DATAFRAME_READERS = {'read_csv', 'read_json', 'read_parquet', 'read_excel', 'read_sql', 'read_gbq'}
+
+def dotted_name(node):
+    """Returns 'a.b.c' for a Name/Attribute chain, or None."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return '.'.join(reversed(parts))
+    return None
+
+def literal(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+def keyword(call, name):
+    for kw in call.keywords:
+        if kw.arg == name:
+            return kw.value
+    return None
+
+def first_sentence(text):
+    text = ' '.join(text.split())
+    match = re.match(r'(.+?[.!?])(\s|$)', text)
+    return match.group(1) if match else text
+
+def join_items(items, limit=6):
+    items = list(dict.fromkeys(items))
+    shown = ', '.join(items[:limit])
+    return shown + (f' and {len(items) - limit} more' if len(items) > limit else '')
+
+def import_aliases(tree):
+    """Maps each name bound by an import to what it refers to, e.g. {'rq': 'requests', 'get': 'requests.get'}."""
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+                else:
+                    head = alias.name.split('.')[0]
+                    aliases[head] = head
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+def resolve(name, aliases):
+    """Replaces the first part of a dotted name with what its import refers to."""
+    head, _, rest = name.partition('.')
+    full = aliases.get(head, head)
+    return f"{full}.{rest}" if rest else full
+
+def http_clients(tree, aliases):
+    """
+    Returns the names (variables or attributes like self.session) bound to
+    a requests/httpx/aiohttp session or client, by assignment or `with`.
+    """
+    clients = set()
+
+    def is_client(value):
+        return isinstance(value, ast.Call) and resolve(dotted_name(value.func) or '', aliases) in HTTP_CLIENT_FACTORIES
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and is_client(node.value):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None and is_client(node.value):
+            targets = [node.target]
+        elif isinstance(node, (ast.With, ast.AsyncWith)):
+            targets = [item.optional_vars for item in node.items
+                       if item.optional_vars is not None and is_client(item.context_expr)]
+        else:
+            continue
+        clients.update(name for name in map(dotted_name, targets) if name)
+    return clients
+
+class ScriptVisitor(ast.NodeVisitor):
+    """Collects imports, CLI parameters and file/HTTP I/O from a module."""
+    def __init__(self, aliases=None, clients=None):
+        self.aliases = aliases or {}
+        self.clients = clients or set()
+        self.imports = set()
+        self.cli_params = []
+        self.env_vars = []
+        self.reads = []
+        self.writes = []
+        self.http_reads = False
+        self.http_writes = False
+        self.uses_stdin = False
+        self.prints = False
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.add(alias.name)
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.imports.add(node.module)
+            for alias in node.names:
+                self.imports.add(f"{node.module}.{alias.name}")
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        # typer: def main(name: str = typer.Option(...))
+        defaults = node.args.defaults + [d for d in node.args.kw_defaults if d is not None]
+        params = node.args.args[-len(node.args.defaults):] if node.args.defaults else []
+        params += [a for a, d in zip(node.args.kwonlyargs, node.args.kw_defaults) if d is not None]
+        for param, default in zip(params, defaults):
+            if isinstance(default, ast.Call) and (dotted_name(default.func) or '').split('.')[-1] in ('Option', 'Argument'):
+                self.cli_params.append(param.arg)
+        # click: @click.option('--name') / @click.argument('name')
+        for decorator in node.decorator_list:
+            if isinstance(decorator, ast.Call) and (dotted_name(decorator.func) or '') in ('click.option', 'click.argument'):
+                names = [literal(arg) for arg in decorator.args if literal(arg)]
+                if names:
+                    self.cli_params.append(max(names, key=len))
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node):
+        name = dotted_name(node.func) or ''
+        attr = name.split('.')[-1]
+        if attr == 'add_argument':
+            names = [literal(arg) for arg in node.args if literal(arg)]
+            if names:
+                self.cli_params.append(max(names, key=len))
+        elif name in ('os.getenv', 'os.environ.get', 'getenv'):
+            if node.args and literal(node.args[0]):
+                self.env_vars.append(literal(node.args[0]))
+        elif name == 'input':
+            self.uses_stdin = True
+        elif name == 'print':
+            self.prints = True
+        elif name == 'open':
+            self.visit_open(node)
+        elif attr in DATAFRAME_WRITERS:
+            target = literal(node.args[0]) if node.args else None
+            self.writes.append(target or attr.replace('to_', '').upper() + ' file')
+        elif attr in DATAFRAME_READERS:
+            source = literal(node.args[0]) if node.args else None
+            self.reads.append(source or attr.replace('read_', '').upper() + ' file')
+        elif attr in ('dump',) and name.split('.')[0] in ('json', 'yaml', 'pickle'):
+            self.writes.append(name.split('.')[0].upper() + ' file')
+        elif attr in ('write_text', 'write_bytes'):
+            self.writes.append('files')
+        elif attr in ('read_text', 'read_bytes'):
+            self.reads.append('files')
+        elif self.http_method(name) in HTTP_WRITE_METHODS:
+            self.http_writes = True
+        elif self.http_method(name) in HTTP_READ_METHODS:
+            self.http_reads = True
+        self.generic_visit(node)
+
+    def http_method(self, name):
+        """The method of a call like requests.get, post (from requests) or session.post, or None if not HTTP."""
+        receiver, _, method = name.rpartition('.')
+        if not receiver:
+            receiver, _, method = resolve(name, self.aliases).rpartition('.')
+        elif receiver in self.clients:
+            return method
+        return method if resolve(receiver, self.aliases).split('.')[0] in HTTP_MODULES else None
+
+    def visit_Subscript(self, node):
+        # os.environ['NAME']
+        if dotted_name(node.value) == 'os.environ' and literal(node.slice):
+            self.env_vars.append(literal(node.slice))
+        self.generic_visit(node)
+
+    def visit_open(self, node):
+        path = literal(node.args[0]) if node.args else None
+        mode_node = node.args[1] if len(node.args) > 1 else keyword(node, 'mode')
+        mode = literal(mode_node) if mode_node is not None else 'r'
+        if mode and any(flag in mode for flag in 'wax+'):
+            self.writes.append(path or 'files')
+        else:
+            self.reads.append(path or 'files')
+
+def analyze_script(script_content, available_labels=None):
+    """
+    Extracts script metadata statically with `ast`: the description and
+    objective from the module docstring, inputs from argparse/click/typer
+    parameters, environment variables and reads, outputs from file writes
+    and HTTP calls, and labels from imports. Returns only the fields it
+    could determine, so the caller can ask the LLM for the rest.
+    """
+    try:
+        tree = ast.parse(script_content)
+    except (SyntaxError, ValueError):
+        return {}
+
+    aliases = import_aliases(tree)
+    visitor = ScriptVisitor(aliases, http_clients(tree, aliases))
+    visitor.visit(tree)
+    metadata = {}
+
+    docstring = ast.get_docstring(tree)
+    if docstring:
+        paragraphs = [p.strip() for p in docstring.split('\n\n') if p.strip()]
+        objective_match = re.search(r'^\s*(?:objective|purpose)\s*:\s*(.+)$', docstring, re.IGNORECASE | re.MULTILINE)
+        if paragraphs:
+            metadata['description'] = first_sentence(paragraphs[0])
+        if objective_match:
+            metadata['objective'] = first_sentence(objective_match.group(1))
+
+    inputs = []
+    if visitor.cli_params:
+        inputs.append(f"command-line arguments {join_items(visitor.cli_params)}")
+    if visitor.env_vars:
+        inputs.append(f"environment variables {join_items(visitor.env_vars)}")
+    if visitor.reads:
+        inputs.append(f"reads {join_items(visitor.reads)}")
+    if visitor.http_reads:
+        inputs.append("data fetched over HTTP")
+    if visitor.uses_stdin:
+        inputs.append("interactive input")
+    if inputs:
+        metadata['input'] = f"Takes {'; '.join(inputs)}."
+
+    outputs = []
+    if visitor.writes:
+        outputs.append(f"writes {join_items(visitor.writes)}")
+    if visitor.http_writes:
+        outputs.append("sends data over HTTP")
+    if outputs:
+        sentence = '; '.join(outputs)
+        metadata['output'] = f"{sentence[0].upper()}{sentence[1:]}."
+
+    labels = []
+    for module in sorted(visitor.imports):
+        for prefix, mapped in IMPORT_LABELS.items():
+            if module == prefix or module.startswith(prefix + '.'):
+                labels.extend(mapped)
+    if labels:
+        labels.append('#script')
+    if available_labels is not None:
+        labels = [label for label in labels if label in available_labels]
+    labels = list(dict.fromkeys(labels))[:5]
+    if labels:
+        metadata['labels'] = labels
+
+    return metadata
@@ -1,91 +1,94 @@
 import os
 import re
-import yaml
+import asyncio
 from datetime import datetime
+from src.config import config
 from src.utils.gemini_api import GeminiAPI
+from src.utils.pk_allocator import get_allocator
+from src.utils.scheduler import scheduler
+from src.utils.rate_limiter import rate_limiters
+from src.utils.http_clients import http_clients
+from src.utils.metrics import metrics
+from src.utils import yaml_io
+from src.utils.script_analyzer import analyze_script, METADATA_FIELDS
 
 gemini_api = GeminiAPI()
 
-async def get_next_unused_pk(pk_file_path):
-    """Get the first unused PK from pk.yaml and mark it as used."""
-    try:
-        with open(pk_file_path, 'r') as f:
-            content = f.read()
-            pk_data = yaml.safe_load(content)
-            print(f"Loaded PK data type: {type(pk_data)}")
-            print(f"First few items: {pk_data[:3] if isinstance(pk_data, list) else 'Not a list'}")
-            
-        if not isinstance(pk_data, list):
-            raise Exception("Invalid PK file format")
-            
-        for item in pk_data:
-            if not isinstance(item, dict):
-                print(f"Skipping non-dict item: {item}")
-                continue
-                
-            # Skip items with nested pk structure
-            if isinstance(item.get('pk'), (list, dict)):
-                print(f"Skipping nested pk structure: {item}")
-                continue
-                
-            # Get pk and used values
-            pk_str = str(item.get('pk', '')).strip('"')
-            used_str = str(item.get('used', '')).lower()
-            print(f"Found PK: {pk_str}, used: {used_str}")
-            
-            if pk_str and (used_str == 'no' or used_str == 'false'):
-                # Update the used status
-                item['used'] = 'yes'
-                
-                # Write back to file preserving format
-                with open(pk_file_path, 'w') as f:
-                    f.write('# Available pk\'s\n')  # Preserve header
-                    yaml.dump(pk_data, f, sort_keys=False, indent=2)
-                    
-                return pk_str
-                
-        raise Exception("No unused PKs available")
-    except Exception as e:
-        print(f"Error getting next unused PK: {e}")
-        raise
+def load_labels(labels_file_path):
+    """Load the list of available labels once for a whole run."""
+    with open(labels_file_path, 'r') as f:
+        labels_data = yaml_io.loads(f.read())
+        return labels_data.get('labels', [])
+
+def read_script(script_path):
+    with open(script_path, 'r') as f:
+        return f.read()
 
-async def analyze_script_with_llm(script_content, labels_file_path):
-    """Use LLM to analyze script and generate metadata."""
+# What to ask the LLM for each metadata field it has to fill in
+FIELD_REQUESTS = {
+    'description': 'A one-sentence description of what the script does',
+    'objective': 'A one-sentence objective/purpose',
+    'input': 'A one-sentence description of input parameters',
+    'output': 'A one-sentence description of output parameters',
+    'labels': 'Select between 1 to 5 most relevant labels from this list. Only use labels from this list and include the # symbol:\n{labels_str}',
+}
+
+FIELD_EXAMPLES = {
+    'description': 'description: A description here',
+    'objective': 'objective: An objective here',
+    'input': 'input: Input description here',
+    'output': 'output: Output description here',
+    'labels': 'labels:\n  - #label1\n  - #label2',
+}
+
+async def analyze_script_with_llm(script_content, labels_file_path, available_labels=None):
+    """
+    Use static analysis, then the LLM, to generate script metadata. The LLM is
+    only asked for the fields the AST analysis could not determine, and is not
+    called at all when every field was found locally. With
+    SCRIPT_LLM_TOPIC_LABELS set, the labels implied by imports only seed the
+    topic labels the LLM is asked for.
+    """
     try:
-        # Load available labels
-        with open(labels_file_path, 'r') as f:
-            labels_data = yaml.safe_load(f)
-            available_labels = labels_data.get('labels', [])
-            labels_str = '\n'.join(available_labels)
+        # Load available labels unless the caller already did
+        if available_labels is None:
+            available_labels = load_labels(labels_file_path)
+        labels_str = '\n'.join(available_labels)
+
+        local_metadata = analyze_script(script_content, available_labels)
+        seed_labels = local_metadata.pop('labels', []) if config.script_llm_topic_labels else []
+        missing = [field for field in METADATA_FIELDS if not local_metadata.get(field)]
+        if not missing:
+            print("All metadata determined by static analysis, skipping the LLM")
+            return local_metadata
+        if local_metadata:
+            print(f"Static analysis found {', '.join(local_metadata)}; asking the LLM for {', '.join(missing)}")
+
+        requests_str = '\n'.join(
+            f"{number}. {FIELD_REQUESTS[field].format(labels_str=labels_str)}"
+            for number, field in enumerate(missing, start=1)
+        )
+        example_str = '\n'.join(FIELD_EXAMPLES[field] for field in missing)
+        labels_note = "\nImportant: Choose between 1 to 5 labels that are most relevant to the script's purpose. Only use labels from the provided list.\n" if 'labels' in missing else ''
+        if seed_labels:
+            labels_note += f"The script's imports already give it {', '.join(seed_labels)}; choose labels for what it is about.\n"
 
         prompt = f"""Analyze this Python script and provide the following details in a concise way:
 
-1. A one-sentence description of what the script does
-2. A one-sentence objective/purpose
-3. A one-sentence description of input parameters
-4. A one-sentence description of output parameters
-5. Select between 1 to 5 most relevant labels from this list. Only use labels from this list and include the # symbol:
-{labels_str}
+{requests_str}
 
 Script content:
 {script_content}
-
-Important: Choose between 1 to 5 labels that are most relevant to the script's purpose. Only use labels from the provided list.
-
+{labels_note}
 Format your response as raw YAML without any markdown formatting. Start with --- and use proper YAML formatting. Example format:
 
 ---
-description: A description here
-objective: An objective here
-input: Input description here
-output: Output description here
-labels:
-  - #label1
-  - #label2
+{example_str}
 
 Your response:"""
 
-        response = await gemini_api.generate_text(prompt)
+        async with scheduler.limit("llm"):
+            response = await gemini_api.generate_text(prompt)
         
         try:
             # Extract just the YAML part starting from --- and remove any markdown formatting
@@ -94,22 +97,25 @@ Your response:"""
             yaml_content = yaml_content.replace('```yaml', '').replace('```', '')
             # Remove any leading/trailing whitespace
             yaml_content = yaml_content.strip()
-            metadata = yaml.safe_load(yaml_content)
+            metadata = yaml_io.loads(yaml_content) or {}
+            metadata = {field: metadata.get(field) for field in missing}
             
             # Validate and clean up labels
-            if 'labels' in metadata:
-                if not isinstance(metadata['labels'], list):
-                    metadata['labels'] = []
+            if 'labels' in missing:
+                labels = metadata.get('labels')
+                if not isinstance(labels, list):
+                    labels = []
                 # Remove any null values and ensure we have valid labels
-                metadata['labels'] = [label for label in metadata['labels'] if label and isinstance(label, str) and label.startswith('#')]
+                labels = [label for label in labels if label and isinstance(label, str) and label.startswith('#')]
+                # Topic labels first, then the ones implied by imports, at most five
+                metadata['labels'] = list(dict.fromkeys(labels + seed_labels))[:5]
                 # Ensure we have at least one label
                 if not metadata['labels']:
                     metadata['labels'] = ['#script']  # Default label
-            else:
-                metadata['labels'] = ['#script']  # Default label
-                
+
+            metadata.update(local_metadata)
             return metadata
-        except yaml.YAMLError:
+        except yaml_io.YAMLError:
             print(f"Error parsing LLM response as YAML: {response}")
             raise
             
@@ -117,8 +123,39 @@ Your response:"""
         print(f"Error analyzing script with LLM: {e}")
         raise
 
-async def generate_yaml_from_scripts(scripts_dir, output_yaml_path):
-    """Generate YAML entries from script files in the specified directory."""
+def build_metadata(filename, script_pk, diagram_pk, llm_metadata):
+    """Combine the fixed fields for a new script entry with the LLM analysis."""
+    metadata = {
+        'author': 'dion@wrench.chat',
+        'tagline_required': '1',
+        'update_date': datetime.now().strftime('%-m/%-d/%Y'),
+        'version': '1',
+        'existing_filename': filename,
+        'new_filename': filename,
+        'new_filepath': 'source_files/scripts',
+        'old_filepath': 'source_files/scripts',
+        'generated': 'false',
+        'type': 'script',
+        'pk': script_pk,
+        'number_of_diagrams': '1',
+        'diagram_1_pk': diagram_pk,
+        'language': 'python'
+    }
+    metadata.update(llm_metadata)
+    return metadata
+
+def append_entries(output_yaml_path, entries):
+    """Append entries to a YAML catalogue without rewriting what is already there."""
+    yaml_io.append_items(output_yaml_path, entries, sort_keys=False)
+
+async def generate_yaml_from_scripts(scripts_dir, output_yaml_path, concurrency=None):
+    """
+    Generate YAML entries from script files in the specified directory.
+
+    Scripts are read in a thread pool and analysed concurrently (at most
+    `concurrency` LLM calls at once). Entries are appended to the output file
+    in filename order as soon as every earlier script has finished.
+    """
     try:
         print("Starting script to YAML conversion...")
         
@@ -126,13 +163,12 @@ async def generate_yaml_from_scripts(scripts_dir, output_yaml_path):
             raise Exception(f"Scripts directory not found: {scripts_dir}")
             
         # Get all Python files in the scripts directory
-        script_files = [f for f in os.listdir(scripts_dir) if f.endswith('.py')]
+        script_files = sorted(f for f in os.listdir(scripts_dir) if f.endswith('.py'))
         
         # Load existing YAML entries if the file exists
         existing_entries = []
         if os.path.exists(output_yaml_path):
-            with open(output_yaml_path, 'r') as f:
-                existing_entries = yaml.safe_load(f) or []
+            existing_entries = list(yaml_io.iter_items(output_yaml_path))
                 
         # Get list of scripts that already have entries
         processed_scripts = {entry.get('existing_filename') for entry in existing_entries}
@@ -141,66 +177,76 @@ async def generate_yaml_from_scripts(scripts_dir, output_yaml_path):
         new_script_files = [f for f in script_files if f not in processed_scripts]
         total_new = len(new_script_files)
         print(f"Found {len(script_files)} Python files, {total_new} new to process")
-        
-        # Start with existing entries
-        yaml_entries = existing_entries
-        processed_count = 0
-        
-        for filename in new_script_files:
+        if not total_new:
+            return existing_entries
+
+        # Start with existing entries; an empty file is started fresh so appends stay a valid list
+        yaml_entries = list(existing_entries)
+        if not existing_entries:
+            open(output_yaml_path, 'w').close()
+
+        # Shared context, loaded once for every script
+        available_labels = load_labels('src/templates/labels.yaml')
+        pk_allocator = get_allocator(config.pk_yaml_path)
+        # Checked up front so a shortage fails before any LLM call; the pks
+        # themselves are reserved as entries are written, so failed scripts use none
+        if pk_allocator.available() < 2 * total_new:
+            raise Exception("No unused PKs available")
+
+        scheduler.configure(llm_concurrency=concurrency or config.llm_concurrency)
+        rate_limiters.configure(scheduler.concurrency["llm"])
+        print(f"Analysing with up to {scheduler.concurrency['llm']} concurrent LLM calls")
+
+        async def analyze(index, filename):
             try:
+                metrics.set_item(filename)
                 print(f"Processing {filename}...")
-                script_path = os.path.join(scripts_dir, filename)
-                
-                # Read script content
-                with open(script_path, 'r') as f:
-                    script_content = f.read()
-                
-                # Get PKs for script and diagram
-                script_pk = await get_next_unused_pk('src/templates/pk.yaml')
-                diagram_pk = await get_next_unused_pk('src/templates/pk.yaml')
-                
-                # Get LLM analysis
+                script_content = await asyncio.to_thread(read_script, os.path.join(scripts_dir, filename))
                 llm_metadata = await analyze_script_with_llm(
                     script_content,
-                    'src/templates/labels.yaml'
+                    'src/templates/labels.yaml',
+                    available_labels,
                 )
-                
-                # Construct metadata
-                metadata = {
-                    'author': 'dion@wrench.chat',
-                    'tagline_required': '1',
-                    'update_date': datetime.now().strftime('%-m/%-d/%Y'),
-                    'version': '1',
-                    'existing_filename': filename,
-                    'new_filename': filename,
-                    'new_filepath': 'source_files/scripts',
-                    'old_filepath': 'source_files/scripts',
-                    'generated': 'false',
-                    'type': 'script',
-                    'pk': script_pk,
-                    'number_of_diagrams': '1',
-                    'diagram_1_pk': diagram_pk,
-                    'language': 'python'
-                }
-                
-                # Add LLM-generated metadata
-                metadata.update(llm_metadata)
-                
-                yaml_entries.append(metadata)
-                processed_count += 1
-                print(f"Progress: {processed_count}/{total_new} new files processed")
-                
+                return index, (filename, llm_metadata)
             except Exception as e:
                 print(f"Error processing file {filename}: {e}")
                 import traceback
                 print(traceback.format_exc())
-                continue
-        
-        # Write YAML entries
-        print("Writing YAML output...")
-        with open(output_yaml_path, 'w') as f:
-            yaml.dump(yaml_entries, f, sort_keys=False, indent=2)
-        
+                return index, None
+
+        results = {}
+        next_to_write = 0
+        processed_count = 0
+        reserved_count = 0
+        metrics.open()
+        try:
+            async with http_clients.lifetime():
+                tasks = [analyze(index, filename) for index, filename in enumerate(new_script_files)]
+                for finished in asyncio.as_completed(tasks):
+                    index, metadata = await finished
+                    processed_count += 1
+                    print(f"Progress: {processed_count}/{total_new} new files processed")
+                    results[index] = metadata
+                    # Append the finished prefix so the file order never depends on timing
+                    analysed = []
+                    while next_to_write in results:
+                        result = results.pop(next_to_write)
+                        if result is not None:
+                            analysed.append(result)
+                        next_to_write += 1
+                    if analysed:
+                        # One reservation per write, in file order
+                        pks = pk_allocator.reserve(2 * len(analysed))
+                        reserved_count += len(pks)
+                        ready = [build_metadata(filename, pks[2 * i], pks[2 * i + 1], llm_metadata)
+                                 for i, (filename, llm_metadata) in enumerate(analysed)]
+                        append_entries(output_yaml_path, ready)
+                        yaml_entries.extend(ready)
+        finally:
+            metrics.close()
+            if reserved_count:
+                pk_allocator.export_yaml()
+
         print(f"Successfully generated YAML at {output_yaml_path}")
         return yaml_entries
         
@@ -218,12 +264,13 @@ def main():
                       help='Directory containing Python scripts (default: source_files/scripts)')
     parser.add_argument('--output', default='source_files/yaml/script.yaml',
                       help='Output YAML file path (default: source_files/yaml/script.yaml)')
+    parser.add_argument('--concurrency', type=int, default=config.llm_concurrency,
+                      help=f'Maximum concurrent LLM calls (default: {config.llm_concurrency})')
     args = parser.parse_args()
 
     try:
         print("Starting script to YAML conversion...")
-        import asyncio
-        asyncio.run(generate_yaml_from_scripts(args.scripts_dir, args.output))
+        asyncio.run(generate_yaml_from_scripts(args.scripts_dir, args.output, args.concurrency))
         print("Conversion completed successfully")
     except Exception as e:
         print(f"Error: {e}")
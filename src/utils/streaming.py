@@ -0,0 +1,51 @@
+import json
+import asyncio
+
+async def iterate_in_thread(make_iterator):
+    """
+    Runs a blocking SDK iterator in a worker thread and yields its items as
+    an async iterator, so streaming SDK calls do not block the event loop.
+
+    Args:
+        make_iterator (callable): Returns the blocking iterator when called.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for item in make_iterator():
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(None, produce)
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        if isinstance(item, Exception):
+            raise item
+        yield item
+    await producer
+
+async def openai_sse_chunks(response):
+    """
+    Yields the content deltas of an OpenAI-compatible chat completion
+    streamed as server-sent events.
+    """
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+        except (ValueError, KeyError, IndexError, AttributeError):
+            continue
+        if delta:
+            yield delta
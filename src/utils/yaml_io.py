@@ -0,0 +1,196 @@
+import os
+import yaml
+from src.config import config
+from src.utils.file_handler import atomic_write
+
+# libyaml's C loader and dumper are several times faster than the pure-Python ones
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    LIBYAML = False
+
+YAMLError = yaml.YAMLError
+
+def loads(text):
+    return yaml.load(text, Loader=Loader)
+
+def load_file(file_path):
+    """Parses a single-document YAML file."""
+    with open(file_path, 'r') as f:
+        return yaml.load(f, Loader=Loader)
+
+def dumps(data, sort_keys=True, indent=2, **kwargs):
+    return yaml.dump(data, Dumper=Dumper, sort_keys=sort_keys, indent=indent, allow_unicode=True, **kwargs)
+
+def dump(data, stream, sort_keys=True, indent=2, **kwargs):
+    yaml.dump(data, stream, Dumper=Dumper, sort_keys=sort_keys, indent=indent, allow_unicode=True, **kwargs)
+
+def dumps_document(item, sort_keys=True):
+    """One item as a `---`-started document of a multi-document catalogue."""
+    return dumps(item, sort_keys=sort_keys, explicit_start=True)
+
+def is_multi_document(file_path):
+    """
+    Tells whether a catalogue stores one item per `---` document rather than
+    a single list. Only the first lines are read.
+    """
+    if not os.path.exists(file_path):
+        return False
+    seen_start = False
+    with open(file_path, 'r') as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            if not seen_start:
+                if stripped == '---' or stripped.startswith('--- '):
+                    seen_start = True
+                    continue
+                return False
+            return not stripped.startswith('-')
+    return seen_start
+
+def iter_documents(file_path):
+    """Yields the documents of a multi-document file one at a time, without loading the rest."""
+    with open(file_path, 'r') as f:
+        for document in yaml.load_all(f, Loader=Loader):
+            yield document
+
+def iter_items(file_path):
+    """
+    Yields catalogue items one at a time: lazily from a multi-document file,
+    or from the parsed list of a single-document one.
+    """
+    if is_multi_document(file_path):
+        for document in iter_documents(file_path):
+            if document is not None:
+                yield document
+        return
+    data = load_file(file_path)
+    if isinstance(data, list):
+        yield from data
+    elif data is not None:
+        yield data
+
+def split_documents(text):
+    """
+    Splits multi-document YAML text on its `---` lines without parsing it.
+
+    Returns:
+        tuple: (text before the first document, [document text, ...])
+    """
+    preamble, documents, current = [], [], None
+    for line in text.splitlines(keepends=True):
+        if line.rstrip() == '---' or line.startswith('--- '):
+            if current is not None:
+                documents.append("".join(current))
+            current = [line]
+        elif current is None:
+            preamble.append(line)
+        else:
+            current.append(line)
+    if current is not None:
+        documents.append("".join(current))
+    return "".join(preamble), documents
+
+def patch_documents(file_path, updates, sort_keys=True):
+    """
+    Rewrites only the given documents of a multi-document file; every other
+    document is copied through as text.
+
+    Args:
+        updates (dict): {document index: new item}
+    """
+    with open(file_path, 'r') as f:
+        preamble, documents = split_documents(f.read())
+    for index, item in updates.items():
+        if index >= len(documents):
+            raise Exception(f"{file_path} has no document {index}")
+        documents[index] = dumps_document(item, sort_keys=sort_keys)
+    atomic_write(file_path, preamble + "".join(documents))
+
+def append_items(file_path, items, sort_keys=True):
+    """
+    Appends items to a catalogue without rewriting it: as new documents when
+    it is multi-document, else as more entries of its top-level list. New
+    files use the format set by YAML_MULTI_DOCUMENT.
+    """
+    exists = os.path.exists(file_path) and os.path.getsize(file_path) > 0
+    multi_document = is_multi_document(file_path) if exists else config.yaml_multi_document
+    with open(file_path, 'a') as f:
+        if multi_document:
+            f.write("".join(dumps_document(item, sort_keys=sort_keys) for item in items))
+        else:
+            f.write(dumps(list(items), sort_keys=sort_keys))
+        f.flush()
+        os.fsync(f.fileno())
+
+class Catalogue:
+    """
+    A loaded YAML catalogue that remembers which items changed. Saving a
+    multi-document catalogue patches just those documents; a single-document
+    one is dumped whole, as before.
+    """
+    def __init__(self, file_path, data, multi_document=False, sort_keys=True):
+        self.file_path = file_path
+        self.data = data
+        self.multi_document = multi_document
+        self.sort_keys = sort_keys
+        self.dirty = set()
+        self.stat = self.file_stat()
+
+    @classmethod
+    def load(cls, file_path, sort_keys=True):
+        if is_multi_document(file_path):
+            return cls(file_path, list(iter_documents(file_path)), multi_document=True, sort_keys=sort_keys)
+        return cls(file_path, load_file(file_path), sort_keys=sort_keys)
+
+    def file_stat(self):
+        try:
+            stat = os.stat(self.file_path)
+            return (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def mark_dirty(self, item):
+        self.dirty.add(id(item))
+
+    def save(self):
+        """Writes changed items back. Does nothing when none changed."""
+        if not self.dirty:
+            return
+        if self.multi_document and self.file_stat() == self.stat:
+            updates = {index: item for index, item in enumerate(self.data) if id(item) in self.dirty}
+            patch_documents(self.file_path, updates, sort_keys=self.sort_keys)
+        elif self.multi_document:
+            # Edited since it was loaded, so document positions cannot be trusted
+            atomic_write(self.file_path, "".join(dumps_document(item, self.sort_keys) for item in self.data))
+        else:
+            atomic_write(self.file_path, dumps(self.data, sort_keys=self.sort_keys))
+        self.dirty.clear()
+        self.stat = self.file_stat()
+
+def convert(file_path, multi_document=True):
+    """Rewrites a list catalogue as one document per item, or back."""
+    items = list(iter_items(file_path))
+    if multi_document:
+        atomic_write(file_path, "".join(dumps_document(item) for item in items))
+    else:
+        atomic_write(file_path, dumps(items))
+    print(f"Converted {file_path} to {'multi-document' if multi_document else 'single list'} format "
+          f"({len(items)} items)")
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert YAML catalogues between list and multi-document format')
+    parser.add_argument('files', nargs='+', help='Catalogue files to convert')
+    parser.add_argument('--to-list', action='store_true',
+                      help='Convert back to a single top-level list')
+    args = parser.parse_args()
+    for file_path in args.files:
+        convert(file_path, multi_document=not args.to_list)
+
+if __name__ == "__main__":
+    main()
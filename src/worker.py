@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import traceback
+import subprocess
+from src.generator import (
+    GENERATED_SOURCES, generator_for, prompt_template, mark_generated, export_store, finish_images,
+)
+from src.utils.scheduler import scheduler
+from src.utils.http_clients import http_clients
+from src.utils.llm_cache import llm_cache
+from src.utils.manifest import manifest
+from src.utils.rate_limiter import rate_limiters
+from src.utils.metrics import metrics
+from src.utils.image_processing import image_processor
+from src.utils.job_store import job_store
+from src.config import config
+
+class Worker:
+    """
+    Drains the SQLite job store together with other workers. Jobs are
+    claimed atomically with a lease that a heartbeat keeps renewing while
+    they run; when a worker dies its leases run out and the jobs go back to
+    the queue for the others. Any number of workers can run, in one process
+    each, on every host that can open the store.
+    """
+    def __init__(self, worker_id=None, jobs=None, lease_seconds=None, poll_interval=None,
+                 exit_when_empty=True, sources=None):
+        self.id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.jobs = max(1, jobs or config.llm_concurrency)
+        self.lease_seconds = lease_seconds or config.worker_lease_seconds
+        self.poll_interval = poll_interval or config.worker_poll_interval
+        self.exit_when_empty = exit_when_empty
+        self.sources = list(sources or GENERATED_SOURCES)
+        self.templates = {}
+        self.running = {}
+        self.completed = 0
+        self.failed = 0
+
+    def template(self, source):
+        if source not in self.templates:
+            self.templates[source] = prompt_template(source)
+        return self.templates[source]
+
+    async def run(self, llm_concurrency=None, diagram_concurrency=None):
+        print(f"Worker {self.id} starting ({self.jobs} jobs at a time, lease {self.lease_seconds:.0f}s)")
+        scheduler.configure(llm_concurrency or self.jobs, diagram_concurrency)
+        rate_limiters.configure(scheduler.concurrency["llm"])
+        await asyncio.to_thread(job_store.sync_from_yaml)
+        metrics.open()
+        try:
+            async with http_clients.lifetime():
+                heartbeat = asyncio.create_task(self.heartbeat())
+                try:
+                    await self.drain()
+                finally:
+                    heartbeat.cancel()
+                    await self.release_unfinished()
+        finally:
+            finish_images()
+            export_store()
+            manifest.save(merge=True)
+            metrics.close()
+            print(f"Worker {self.id} done: {self.completed} completed, {self.failed} failed")
+
+    async def drain(self):
+        """Claims jobs whenever a slot is free, until the queue is empty (or forever)."""
+        while True:
+            free = self.jobs - len(self.running)
+            claimed = []
+            if free:
+                claimed = await asyncio.to_thread(job_store.claim, self.id, free, self.lease_seconds, self.sources)
+            for source, key, item in claimed:
+                self.running[key] = asyncio.create_task(self.process(source, key, item))
+            if self.running:
+                done, _ = await asyncio.wait(list(self.running.values()), timeout=self.poll_interval,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for key in [key for key, task in self.running.items() if task in done]:
+                    del self.running[key]
+                continue
+            if self.exit_when_empty:
+                # Jobs another worker holds may still come back if it dies,
+                # so only stop once nothing is pending or running anywhere
+                counts = await asyncio.to_thread(job_store.counts, self.sources)
+                if not counts.get("pending") and not counts.get("running"):
+                    return
+            await asyncio.sleep(self.poll_interval)
+
+    async def process(self, source, key, item):
+        label = f"{source}: {item.get('new_filename')}"
+        metrics.set_item(label)
+        if not manifest.needs_build(source, item, self.template(source)):
+            print(f"{label} is up to date, marking it generated")
+            await asyncio.to_thread(job_store.mark_generated, key)
+            return
+        try:
+            result = await generator_for(source)(item)
+        except Exception as e:
+            print(f"Error processing {label}: {e}")
+            print(traceback.format_exc())
+            result = False
+        if result is False:
+            self.failed += 1
+            print(f"Nothing generated for {label}, releasing it")
+            await asyncio.to_thread(job_store.release, self.id, key)
+            return
+        mark_generated(source, item, self.template(source), store_key=key)
+        self.completed += 1
+        print(f"Worker {self.id}: {self.completed} items completed")
+
+    async def heartbeat(self):
+        """Renews the leases of running jobs every third of the lease."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if self.running:
+                try:
+                    await asyncio.to_thread(job_store.heartbeat, self.id, list(self.running), self.lease_seconds)
+                except Exception as e:
+                    print(f"Error renewing leases: {e}")
+
+    async def release_unfinished(self):
+        """Cancels jobs still running (e.g. on Ctrl-C) and gives them back without using an attempt."""
+        for task in self.running.values():
+            task.cancel()
+        await asyncio.gather(*self.running.values(), return_exceptions=True)
+        for key in list(self.running):
+            job_store.release(self.id, key, failed=False)
+        self.running.clear()
+
+def spawn(processes, argv):
+    """Runs `processes` workers as child processes of this one and waits for them."""
+    children = [
+        subprocess.Popen([sys.executable, "-m", "src.worker"] + argv)
+        for _ in range(processes)
+    ]
+    print(f"Started {processes} workers: {', '.join(str(child.pid) for child in children)}")
+    try:
+        return max(child.wait() for child in children)
+    except KeyboardInterrupt:
+        # The children got the same Ctrl-C; give them time to release their jobs
+        for child in children:
+            child.wait()
+        raise
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Claim and generate pending items from the shared job store')
+    parser.add_argument('--processes', type=int, default=1,
+                      help='Worker processes to start on this host (default: 1)')
+    parser.add_argument('--jobs', type=int, default=config.llm_concurrency,
+                      help=f'Items each worker builds at once (default: {config.llm_concurrency})')
+    parser.add_argument('--diagram-concurrency', type=int, default=config.diagram_concurrency,
+                      help=f'Maximum concurrent Eraser calls per worker (default: {config.diagram_concurrency})')
+    parser.add_argument('--lease', type=float, default=config.worker_lease_seconds,
+                      help=f'Seconds a claimed job is leased between heartbeats (default: {config.worker_lease_seconds:.0f})')
+    parser.add_argument('--poll-interval', type=float, default=config.worker_poll_interval,
+                      help=f'Seconds between claims when idle (default: {config.worker_poll_interval:g})')
+    parser.add_argument('--forever', action='store_true',
+                      help='Keep polling for new jobs instead of exiting when the queue is empty')
+    parser.add_argument('--id', help='Worker id in the store (default: host:pid, ignored with --processes)')
+    parser.add_argument('--stream', action='store_true', default=config.stream,
+                      help='Stream completions straight into the output files')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Do not read or write the LLM response cache')
+    parser.add_argument('--images', action='store_true', default=config.image_processing,
+                      help='Optimise diagrams and make WebP/AVIF variants, thumbnails and metadata (needs Pillow)')
+    args = parser.parse_args()
+
+    if args.processes > 1:
+        # Each child gets its own host:pid id
+        argv = ['--jobs', str(args.jobs), '--diagram-concurrency', str(args.diagram_concurrency),
+                '--lease', str(args.lease), '--poll-interval', str(args.poll_interval)]
+        argv += [flag for flag, on in (('--forever', args.forever), ('--stream', args.stream),
+                                       ('--no-cache', args.no_cache), ('--images', args.images)) if on]
+        # Import once here, so the children do not all parse the same YAML
+        job_store.sync_from_yaml()
+        started = time.time()
+        try:
+            code = spawn(args.processes, argv)
+        except KeyboardInterrupt:
+            code = 130
+        print(f"Workers finished in {time.time() - started:.1f}s: {job_store.counts(GENERATED_SOURCES)}")
+        sys.exit(code)
+
+    config.stream = args.stream
+    llm_cache.configure(enabled=not args.no_cache and config.llm_cache_enabled)
+    image_processor.configure(enabled=args.images)
+    worker = Worker(worker_id=args.id, jobs=args.jobs, lease_seconds=args.lease,
+                    poll_interval=args.poll_interval, exit_when_empty=not args.forever)
+    try:
+        asyncio.run(worker.run(diagram_concurrency=args.diagram_concurrency))
+    except KeyboardInterrupt:
+        print(f"Worker {worker.id} interrupted")
+    finally:
+        llm_cache.close()
+
+if __name__ == "__main__":
+    main()
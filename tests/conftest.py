@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+# Make `src` importable when pytest is run as plain `pytest` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import yaml_io
+
+@pytest.fixture
+def write_yaml():
+    """Returns a function that writes data to a YAML file."""
+    def write(path, data):
+        with open(path, 'w') as f:
+            f.write(yaml_io.dumps(data))
+        # Step the mtime, so a rewrite within the clock's resolution still counts as a change
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    return write
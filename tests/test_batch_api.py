@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from src.config import config
+from src.utils import batch_api
+from src.utils import prompt_builder
+from src.utils.http_clients import http_clients
+from benchmarks.mock_servers import Profile, start_batch_server
+
+@pytest.fixture
+def batch_server(monkeypatch):
+    server = start_batch_server(Profile(latency=0.2, completion_words=5))
+    monkeypatch.setattr(config, "openai_base_url", f"{server.url}/v1")
+    monkeypatch.setattr(config, "anthropic_base_url", f"{server.url}/v1")
+    monkeypatch.setattr(config, "gemini_base_url", f"{server.url}/v1beta")
+    monkeypatch.setattr(config, "batch_poll_interval", 0.05)
+    yield server
+    server.stop()
+
+async def run_backend(provider, requests):
+    async with http_clients.lifetime():
+        return await batch_api.BATCH_BACKENDS[provider]("model").run(requests)
+
+@pytest.mark.parametrize("provider", ["openai", "anthropic", "gemini"])
+def test_backend_round_trip(batch_server, provider):
+    requests = [(f"request-{i}", f"prompt {i}") for i in range(3)]
+    results = asyncio.run(run_backend(provider, requests))
+    assert sorted(results) == ["request-0", "request-1", "request-2"]
+    assert all(results.values())
+
+def test_collector_answers_each_caller(batch_server):
+    collector = batch_api.BatchCollector()
+    collector.configure(enabled=True)
+    collector.window = 0.05
+
+    async def run():
+        async with http_clients.lifetime():
+            return await asyncio.gather(*(collector.submit("openai", "model", f"prompt {i}") for i in range(5)))
+
+    texts = asyncio.run(run())
+    assert len(texts) == 5 and all(texts)
+    assert collector.counter == 5
+
+def test_condensing_skips_the_batch():
+    class RecordingAPI:
+        llm = "openai"
+
+        def __init__(self):
+            self.batch_flags = []
+
+        async def generate_text(self, prompt, batch=True):
+            self.batch_flags.append(batch)
+            return "summary"
+
+    api = RecordingAPI()
+    assert asyncio.run(prompt_builder.summarize(api, "long text", 100)) == "summary"
+    assert api.batch_flags == [False]
+
+def test_backend_missing_a_method_fails_when_created():
+    class Incomplete(batch_api.BatchBackend):
+        async def create(self, requests):
+            return "batch"
+
+    with pytest.raises(TypeError):
+        Incomplete("model")
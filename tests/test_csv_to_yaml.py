@@ -0,0 +1,59 @@
+import csv
+import pytest
+from src.utils import yaml_io
+from src.utils import csv_to_yaml as converter
+from src.utils.job_store import job_store
+
+def write_csv(path, rows, fieldnames=("pk", "type", "description")):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    yaml_dir = tmp_path / "yaml"
+    yaml_dir.mkdir()
+    monkeypatch.setattr(job_store, "path", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(job_store, "yaml_dir", str(yaml_dir))
+    return yaml_dir
+
+def test_validated_rows_skips_bad_pks(tmp_path):
+    path = tmp_path / "markdown.csv"
+    write_csv(path, [{"pk": "aaaaa"}, {"pk": ""}, {"pk": "BAD"}, {"pk": "aaaaa"}, {"pk": "bbbbb"}])
+    assert [row["pk"] for row in converter.validated_rows(str(path), "markdown")] == ["aaaaa", "bbbbb"]
+
+def test_unknown_kind_raises(tmp_path):
+    path = tmp_path / "other.csv"
+    write_csv(path, [{"pk": "aaaaa"}])
+    with pytest.raises(Exception, match="Unknown config type"):
+        list(converter.validated_rows(str(path), "other"))
+
+def test_writes_yaml_in_chunks(tmp_path):
+    path = tmp_path / "markdown.csv"
+    write_csv(path, [{"pk": f"a{i:04d}", "description": str(i)} for i in range(25)])
+    assert converter.csv_to_yaml(str(path), chunk_size=10) == 25
+    items = yaml_io.Catalogue.load(str(tmp_path / "markdown.yaml")).data
+    assert [item["pk"] for item in items] == [f"a{i:04d}" for i in range(25)]
+
+def test_store_keeps_existing_yaml_items(tmp_path, store, write_yaml):
+    write_yaml(str(store / "markdown.yaml"),
+               [{"pk": "aaaaa", "generated": "yes"}, {"pk": "bbbbb", "generated": "false"}])
+    path = tmp_path / "markdown.csv"
+    write_csv(path, [{"pk": "ccccc", "description": "new"}])
+    assert converter.csv_to_yaml(str(path), store=True) == 1
+    items = yaml_io.Catalogue.load(str(store / "markdown.yaml")).data
+    assert [(item["pk"], item["generated"]) for item in items] == [
+        ("aaaaa", "yes"), ("bbbbb", "false"), ("ccccc", "false"),
+    ]
+
+def test_store_picks_up_yaml_edited_after_sync(tmp_path, store, write_yaml):
+    yaml_path = str(store / "markdown.yaml")
+    write_yaml(yaml_path, [{"pk": "aaaaa"}])
+    job_store.sync_from_yaml()
+    write_yaml(yaml_path, [{"pk": "aaaaa"}, {"pk": "bbbbb"}])
+    path = tmp_path / "markdown.csv"
+    write_csv(path, [{"pk": "ccccc"}])
+    converter.csv_to_yaml(str(path), store=True)
+    items = yaml_io.Catalogue.load(yaml_path).data
+    assert [item["pk"] for item in items] == ["aaaaa", "bbbbb", "ccccc"]
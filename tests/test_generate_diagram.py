@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from src import generator
+from src.utils.diagram_store import DiagramStore
+from src.utils.image_processing import image_processor
+
+PNG = b"\x89PNG\r\n\x1a\n not really an image"
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    """Puts the generator on a fresh diagram store and records the diagrams sent to Eraser."""
+    store = DiagramStore(str(tmp_path / "by_hash"))
+    store.enabled = True
+    monkeypatch.setattr(generator, "diagram_store", store)
+    renders = []
+
+    async def render_diagram(text, new_filename):
+        renders.append(text)
+        return PNG
+
+    monkeypatch.setattr(generator, "render_diagram", render_diagram)
+    monkeypatch.setattr(image_processor, "enabled", False)
+    return renders
+
+def item(tmp_path, name="d.png"):
+    return {"new_filename": name, "new_filepath": str(tmp_path / "images"), "text": "a -> b"}
+
+def test_failed_optimisation_keeps_the_rendered_image(tmp_path, renders, monkeypatch):
+    async def broken(content):
+        raise Exception("cannot identify image file")
+
+    monkeypatch.setattr(image_processor, "enabled", True)
+    monkeypatch.setattr(image_processor, "optimize", broken)
+    monkeypatch.setattr(image_processor, "process", lambda file_path: asyncio.sleep(0))
+    assert asyncio.run(generator.generate_diagram(item(tmp_path)))
+    assert (tmp_path / "images" / "d.png").read_bytes() == PNG
+
+def test_processing_uses_its_own_store_key(tmp_path, renders, monkeypatch):
+    assert asyncio.run(generator.generate_diagram(item(tmp_path, "before.png")))
+
+    async def optimize(content):
+        return content + b" optimised"
+
+    monkeypatch.setattr(image_processor, "enabled", True)
+    monkeypatch.setattr(image_processor, "optimize", optimize)
+    monkeypatch.setattr(image_processor, "process", lambda file_path: asyncio.sleep(0))
+    assert asyncio.run(generator.generate_diagram(item(tmp_path, "after.png")))
+    assert (tmp_path / "images" / "before.png").read_bytes() == PNG
+    assert (tmp_path / "images" / "after.png").read_bytes() == PNG + b" optimised"
+    # The copy stored before processing was on is reused rather than rendered again
+    assert renders == ["a -> b"]
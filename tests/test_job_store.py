@@ -0,0 +1,121 @@
+import os
+import time
+import pytest
+from src.config import config
+from src.utils import yaml_io
+from src.utils.job_store import JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    yaml_dir = tmp_path / "yaml"
+    yaml_dir.mkdir()
+    return JobStore(str(tmp_path / "jobs.sqlite"), str(yaml_dir))
+
+def test_import_and_export_keep_the_catalogue(store, write_yaml):
+    path = os.path.join(store.yaml_dir, "markdown.yaml")
+    write_yaml(path, {"articles": [{"pk": "aaaaa", "generated": "yes"}, {"pk": "bbbbb", "generated": "false"}]})
+    store.sync_from_yaml()
+    assert [key for _, key, _ in store.pending()] == ["markdown.yaml:bbbbb"]
+    assert store.find(pk="aaaaa") == [("markdown.yaml", {"pk": "aaaaa"})]
+    store.mark_generated("markdown.yaml:bbbbb")
+    store.export_yaml(["markdown.yaml"])
+    assert yaml_io.Catalogue.load(path).data == {
+        "articles": [{"pk": "aaaaa", "generated": "yes"}, {"pk": "bbbbb", "generated": "yes"}],
+    }
+
+def test_changed_item_goes_back_to_pending(store, write_yaml):
+    path = os.path.join(store.yaml_dir, "script.yaml")
+    write_yaml(path, [{"pk": "aaaaa", "description": "old", "generated": "yes"}])
+    store.sync_from_yaml()
+    assert store.pending() == []
+    write_yaml(path, [{"pk": "aaaaa", "description": "new", "generated": "yes"}])
+    store.sync_from_yaml()
+    assert [key for _, key, _ in store.pending()] == ["script.yaml:aaaaa"]
+
+def test_items_removed_from_yaml_are_dropped(store, write_yaml):
+    path = os.path.join(store.yaml_dir, "script.yaml")
+    write_yaml(path, [{"pk": "aaaaa"}, {"pk": "bbbbb"}])
+    store.sync_from_yaml()
+    write_yaml(path, [{"pk": "bbbbb"}])
+    store.sync_from_yaml()
+    assert [key for _, key, _ in store.pending()] == ["script.yaml:bbbbb"]
+
+def test_repeated_keys_in_one_file_are_kept_apart(store, write_yaml):
+    path = os.path.join(store.yaml_dir, "script.yaml")
+    write_yaml(path, [{"pk": "aaaaa", "n": 1}, {"pk": "aaaaa", "n": 2}])
+    store.sync_from_yaml()
+    assert [key for _, key, _ in store.pending()] == ["script.yaml:aaaaa", "script.yaml:aaaaa#1"]
+
+def test_add_items_skips_keys_already_stored(store, capsys):
+    assert store.add_items("markdown.yaml", [{"pk": "aaaaa"}, {"pk": "bbbbb"}]) == [
+        "markdown.yaml:aaaaa", "markdown.yaml:bbbbb",
+    ]
+    assert store.add_items("markdown.yaml", [{"pk": "bbbbb", "description": "again"}, {"pk": "ccccc"},
+                                             {"pk": "ccccc"}]) == ["markdown.yaml:ccccc"]
+    assert "skipping markdown.yaml:bbbbb" in capsys.readouterr().out
+    assert store.find(pk="bbbbb") == [("markdown.yaml", {"pk": "bbbbb"})]
+    assert [key for _, key, _ in store.pending()] == [
+        "markdown.yaml:aaaaa", "markdown.yaml:bbbbb", "markdown.yaml:ccccc",
+    ]
+
+def test_claims_are_exclusive_and_expired_leases_requeue(store, monkeypatch):
+    monkeypatch.setattr(config, "worker_max_attempts", 2)
+    store.add_items("script.yaml", [{"pk": "aaaaa"}, {"pk": "bbbbb"}])
+    first = store.claim("w1", limit=1, lease_seconds=60)
+    second = store.claim("w2", limit=5, lease_seconds=0.01)
+    assert [key for _, key, _ in first] == ["script.yaml:aaaaa"]
+    assert [key for _, key, _ in second] == ["script.yaml:bbbbb"]
+    assert store.counts() == {"running": 2}
+    time.sleep(0.02)
+    # w2 stopped renewing its lease, so the next claim takes its job over
+    assert [key for _, key, _ in store.claim("w3", lease_seconds=0.01)] == ["script.yaml:bbbbb"]
+    time.sleep(0.02)
+    # The second expiry uses up the last attempt
+    assert store.claim("w4") == []
+    assert store.counts() == {"running": 1, "failed": 1}
+    assert store.requeue(include_failed=True) == 2
+    assert store.counts() == {"pending": 2}
+
+def test_release_and_heartbeat(store):
+    store.add_items("script.yaml", [{"pk": "aaaaa"}])
+    [(_, key, _)] = store.claim("w1", lease_seconds=60)
+    assert store.heartbeat("w1", [key]) == 1
+    assert store.heartbeat("w2", [key]) == 0
+    store.release("w1", key, failed=False)
+    assert store.counts() == {"pending": 1}
+    [(_, key, _)] = store.claim("w2")
+    store.mark_generated(key)
+    assert store.counts() == {"done": 1}
+
+def test_export_keeps_the_other_top_level_keys(store, write_yaml):
+    path = os.path.join(store.yaml_dir, "diagram.yaml")
+    write_yaml(path, {"defaults": {"theme": "dark"}, "diagrams": [{"pk": "aaaaa"}], "notes": ["keep me"]})
+    store.sync_from_yaml()
+    store.mark_generated("diagram.yaml:aaaaa")
+    store.export_yaml(["diagram.yaml"])
+    assert yaml_io.Catalogue.load(path).data == {
+        "defaults": {"theme": "dark"}, "diagrams": [{"pk": "aaaaa", "generated": "yes"}], "notes": ["keep me"],
+    }
+
+def test_store_mode_skips_items_the_manifest_shows_up_to_date(tmp_path, monkeypatch, write_yaml):
+    from src import generator
+    from src.utils.job_store import job_store
+    from src.utils.manifest import BuildManifest
+
+    yaml_dir = tmp_path / "yaml"
+    yaml_dir.mkdir()
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    monkeypatch.setattr(job_store, "path", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(job_store, "yaml_dir", str(yaml_dir))
+    monkeypatch.setattr(generator, "manifest", BuildManifest(str(tmp_path / "manifest.json")))
+    items = [{"pk": f"{name * 5}", "new_filename": f"{name}.md", "new_filepath": str(out_dir)} for name in "ab"]
+    for item in items:
+        (out_dir / item["new_filename"]).write_text("built")
+        generator.manifest.record("markdown.yaml", item, generator.prompt_template("markdown.yaml"))
+    items[1]["description"] = "changed since the last build"
+    write_yaml(str(yaml_dir / "markdown.yaml"), items)
+
+    jobs = generator.store_jobs({})
+    assert [label for label, _, _ in jobs] == ["markdown.yaml: b.md"]
+    assert job_store.counts() == {"done": 1, "pending": 1}
@@ -0,0 +1,33 @@
+from src.utils.journal import Journal
+
+def test_replay_after_resume(tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    journal.open()
+    journal.record("markdown.yaml:aaaaa", "f1")
+    journal.close()
+    journal.open(resume=True)
+    journal.record("script.yaml:bbbbb", "f2")
+    journal.close()
+    assert journal.replay() == {"markdown.yaml:aaaaa": "f1", "script.yaml:bbbbb": "f2"}
+
+def test_new_run_starts_empty_and_clear_removes_it(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path))
+    journal.open()
+    journal.record("markdown.yaml:aaaaa")
+    journal.close()
+    journal.open()
+    journal.close()
+    assert journal.replay() == {}
+    journal.close(clear=True)
+    assert not path.exists()
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"key": "markdown.yaml:aaaaa", "fingerprint": "f1"}\n{"key": "script.yaml:bb')
+    assert Journal(str(path)).replay() == {"markdown.yaml:aaaaa": "f1"}
+
+def test_record_without_open_is_a_no_op(tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    journal.record("markdown.yaml:aaaaa")
+    assert not (tmp_path / "journal.jsonl").exists()
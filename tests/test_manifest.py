@@ -0,0 +1,46 @@
+import os
+import json
+from src.utils.manifest import BuildManifest
+
+def article(tmp_path, **fields):
+    item = {"pk": "aaaaa", "new_filename": "a.md", "new_filepath": str(tmp_path / "out"), "generated": "yes"}
+    item.update(fields)
+    return item
+
+def write_output(tmp_path):
+    os.makedirs(tmp_path / "out", exist_ok=True)
+    (tmp_path / "out" / "a.md").write_text("done")
+
+def test_needs_build_reasons(tmp_path):
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+    item = article(tmp_path)
+    assert manifest.needs_build("markdown.yaml", article(tmp_path, generated="false")) == "marked generated: false"
+    assert manifest.needs_build("markdown.yaml", item) == "output missing"
+    write_output(tmp_path)
+    # Generated before the manifest existed: adopted as up to date
+    assert manifest.needs_build("markdown.yaml", item) is None
+    assert manifest.needs_build("markdown.yaml", article(tmp_path, description="new")) == "inputs changed"
+    assert manifest.needs_build("markdown.yaml", item, template="other template") == "inputs changed"
+
+def test_referenced_file_is_part_of_the_fingerprint(tmp_path):
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+    (tmp_path / "old.md").write_text("v1")
+    item = article(tmp_path, existing_filename="old.md", old_filepath=str(tmp_path))
+    write_output(tmp_path)
+    manifest.record("markdown.yaml", item)
+    assert manifest.needs_build("markdown.yaml", item) is None
+    (tmp_path / "old.md").write_text("version 2")
+    assert manifest.needs_build("markdown.yaml", item) == "inputs changed"
+
+def test_merge_keeps_entries_saved_by_others(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    write_output(tmp_path)
+    first, second = BuildManifest(path), BuildManifest(path)
+    first.load()
+    second.load()
+    first.record("markdown.yaml", article(tmp_path, pk="aaaaa"))
+    second.record("markdown.yaml", article(tmp_path, pk="bbbbb"))
+    first.save(merge=True)
+    second.save(merge=True)
+    with open(path) as f:
+        assert sorted(json.load(f)["items"]) == ["markdown.yaml:aaaaa", "markdown.yaml:bbbbb"]
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from src.config import config
+from src.utils import prompt_builder
+from src.utils.gemini_api import GeminiAPI
+from src.utils.llm_cache import llm_cache
+from src.utils.metrics import metrics
+from src.utils.prompt_builder import count_tokens, split_into_chunks
+
+@pytest.mark.parametrize("provider", ["gemini", "anthropic", "openai"])
+def test_long_line_is_split_within_budget(provider):
+    text = "short line\n" + "x" * 50_000 + "\n" + "another line\n"
+    chunks = split_into_chunks(text, 1000, provider)
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk, provider) <= 1000 for chunk in chunks)
+
+def test_lines_are_kept_whole_when_they_fit():
+    lines = [f"line {i} " + "word " * 20 + "\n" for i in range(100)]
+    chunks = split_into_chunks("".join(lines), 200, "gemini")
+    assert "".join(chunks) == "".join(lines)
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert all(count_tokens(chunk, "gemini") <= 200 for chunk in chunks)
+
+def test_chunks_are_summarised_concurrently_in_order(monkeypatch):
+    monkeypatch.setattr(config, "condense_chunk_tokens", 100)
+
+    class SlowAPI:
+        llm = "gemini"
+        in_flight = peak = 0
+
+        async def generate_text(self, prompt, batch=True):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.05)
+            self.in_flight -= 1
+            return prompt.split("(part ")[1].split(")")[0]
+
+    api = SlowAPI()
+    text = "".join(f"line {i} " + "word " * 30 + "\n" for i in range(20))
+    condensed = asyncio.run(prompt_builder.condense(api, text, 200, "gemini"))
+    assert api.peak > 1
+    parts = condensed.split("\n\n")
+    assert parts == [f"{index} of {len(parts)}" for index in range(1, len(parts) + 1)]
+
+def test_section_tokens_are_recorded_with_the_llm_call(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "records", [])
+    monkeypatch.setattr(llm_cache, "get", lambda key: None)
+    monkeypatch.setattr(llm_cache, "put", lambda *args: None)
+    api = GeminiAPI("gemini", with_chain=False)
+    api._client, api._model = object(), "model"
+
+    async def call_with_rate_limit(prompt):
+        return "text"
+
+    monkeypatch.setattr(api, "call_with_rate_limit", call_with_rate_limit)
+    sections = {"template": 120, "reference": 800, "total": 920}
+    assert asyncio.run(api.generate_text("prompt", sections=sections)) == "text"
+    call = metrics.records[-1]
+    assert call["template_tokens"] == 120 and call["reference_tokens"] == 800
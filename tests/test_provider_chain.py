@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from src.config import config
+from src.utils.provider_chain import CircuitBreaker, LatencyStats, ProviderChain
+
+class FakeAPI:
+    """Stands in for GeminiAPI: answers after `delay` seconds, or raises when `fail` is set."""
+    def __init__(self, llm, delay=0.0, fail=False):
+        self.llm = llm
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def call_with_rate_limit(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise Exception(f"{self.llm} is down")
+        return f"{self.llm}: {prompt}"
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(config, "breaker_min_calls", 2)
+    monkeypatch.setattr(config, "breaker_error_rate", 0.5)
+    monkeypatch.setattr(config, "breaker_max_p95", 0)
+    monkeypatch.setattr(config, "breaker_cooldown", 0)
+    monkeypatch.setattr(config, "hedge_default_delay", 0.05)
+    monkeypatch.setattr(config, "llm_call_deadline", 5)
+
+def test_breaker_opens_on_errors_and_closes_after_trial():
+    breaker = CircuitBreaker("a", LatencyStats())
+    breaker.record(0.1, False)
+    breaker.record(0.1, False)
+    assert breaker.state == "open"
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(0.1, True)
+    assert breaker.state == "closed"
+
+def test_breaker_failed_trial_opens_again():
+    breaker = CircuitBreaker("a", LatencyStats())
+    breaker.trip("test")
+    assert breaker.allow()
+    breaker.record(0.1, False)
+    assert breaker.state == "open"
+
+def test_available_does_not_claim_the_trial(monkeypatch):
+    monkeypatch.setattr(config, "breaker_cooldown", 60)
+    breaker = CircuitBreaker("a", LatencyStats())
+    breaker.trip("test")
+    assert not breaker.available()
+    monkeypatch.setattr(config, "breaker_cooldown", 0)
+    assert breaker.available()
+    assert breaker.state == "open"
+
+def test_fails_over_to_next_provider():
+    chain = ProviderChain([FakeAPI("a", fail=True), FakeAPI("b")])
+    assert asyncio.run(chain.generate_text("hi")) == "b: hi"
+
+def test_slow_primary_is_hedged():
+    slow, fast = FakeAPI("a", delay=1.0), FakeAPI("b")
+    chain = ProviderChain([slow, fast])
+    assert asyncio.run(chain.generate_text("hi")) == "b: hi"
+    assert chain.breakers["a"].state == "closed"
+
+def test_unstarted_hedge_does_not_take_the_trial():
+    primary, backup = FakeAPI("a"), FakeAPI("b")
+    chain = ProviderChain([primary, backup])
+    chain.breakers["b"].trip("test")
+    assert asyncio.run(chain.generate_text("hi")) == "a: hi"
+    assert backup.calls == 0
+    assert chain.breakers["b"].state == "open"
+    assert chain.breakers["b"].allow()
+
+def test_cancelled_trial_reopens_the_breaker():
+    primary, backup = FakeAPI("a", delay=0.2), FakeAPI("b", delay=1.0)
+    chain = ProviderChain([primary, backup])
+    chain.breakers["b"].trip("test")
+    # The hedge delay is over before a answers, so b's trial starts and loses
+    assert asyncio.run(chain.generate_text("hi")) == "a: hi"
+    assert backup.calls == 1
+    assert chain.breakers["b"].state == "open"
+    # With the cooldown over, b gets another trial and can close again
+    primary.fail = True
+    backup.delay = 0
+    assert asyncio.run(chain.generate_text("again")) == "b: again"
+    assert chain.breakers["b"].state == "closed"
+
+def test_all_open_tries_primary_anyway(monkeypatch):
+    monkeypatch.setattr(config, "breaker_cooldown", 60)
+    chain = ProviderChain([FakeAPI("a"), FakeAPI("b")])
+    for breaker in chain.breakers.values():
+        breaker.trip("test")
+    assert asyncio.run(chain.generate_text("hi")) == "a: hi"
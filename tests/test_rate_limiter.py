@@ -0,0 +1,62 @@
+import time
+import asyncio
+from types import SimpleNamespace
+from src.utils.rate_limiter import AdaptiveLimiter, TokenBucket, is_rate_limit_error
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(SimpleNamespace(status_code=429))
+    assert is_rate_limit_error(SimpleNamespace(code="429"))
+    assert is_rate_limit_error(SimpleNamespace(response=SimpleNamespace(status_code=429)))
+    assert not is_rate_limit_error(SimpleNamespace(status_code=500))
+    assert not is_rate_limit_error(Exception("boom"))
+
+def test_token_bucket_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(per_minute=600)
+        await bucket.acquire(600)
+        started = time.monotonic()
+        await bucket.acquire(5)
+        return time.monotonic() - started
+
+    # 600/min refills 10 per second, so 5 more take about half a second
+    assert 0.4 <= asyncio.run(run()) < 1.0
+
+def test_concurrency_halves_on_429_and_grows_back():
+    limiter = AdaptiveLimiter("test", max_concurrency=8)
+    assert limiter.limit == 8
+    limiter.in_flight = 1
+    limiter.release(rate_limited=True)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.in_flight += 1
+        limiter.release()
+    assert limiter.limit == 5
+
+def test_acquire_waits_for_a_free_slot():
+    async def run():
+        limiter = AdaptiveLimiter("test", max_concurrency=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            limiter.release()
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        return peak, limiter.in_flight
+
+    assert asyncio.run(run()) == (2, 0)
+
+def test_retry_after_sets_a_cooldown():
+    async def run():
+        limiter = AdaptiveLimiter("test", max_concurrency=1)
+        await limiter.acquire()
+        limiter.release(rate_limited=True, retry_after=0.3)
+        started = time.monotonic()
+        await limiter.acquire()
+        limiter.release()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.25
@@ -0,0 +1,45 @@
+from src.utils.script_analyzer import analyze_script
+
+def test_requests_calls_are_http_io():
+    metadata = analyze_script(
+        "import requests\n"
+        "data = requests.get('https://example.com').json()\n"
+        "requests.post('https://example.com', json=data)\n"
+    )
+    assert metadata["input"] == "Takes data fetched over HTTP."
+    assert metadata["output"] == "Sends data over HTTP."
+
+def test_sessions_and_clients_are_tracked_by_binding():
+    metadata = analyze_script(
+        "import httpx\n"
+        "from requests import Session\n"
+        "class Api:\n"
+        "    def __init__(self):\n"
+        "        self.session = Session()\n"
+        "    def fetch(self):\n"
+        "        return self.session.get('https://example.com')\n"
+        "async def push(data):\n"
+        "    async with httpx.AsyncClient() as http:\n"
+        "        await http.put('https://example.com', json=data)\n"
+    )
+    assert metadata["input"] == "Takes data fetched over HTTP."
+    assert metadata["output"] == "Sends data over HTTP."
+
+def test_other_clients_are_not_http():
+    metadata = analyze_script(
+        "import redis\n"
+        "client = redis.Redis()\n"
+        "session = {}\n"
+        "client.delete('key')\n"
+        "value = session.get('user')\n"
+    )
+    assert "input" not in metadata
+    assert "output" not in metadata
+
+def test_functions_imported_from_requests_are_http():
+    metadata = analyze_script("from requests import post as send\nsend('https://example.com')\n")
+    assert metadata["output"] == "Sends data over HTTP."
+
+def test_labels_come_from_imports():
+    metadata = analyze_script("import requests\nimport pandas as pd\n")
+    assert metadata["labels"] == ["#data_engineering", "#api", "#script"]
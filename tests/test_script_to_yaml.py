@@ -0,0 +1,72 @@
+import os
+import asyncio
+from src.config import config
+from src.utils import yaml_io
+from src.utils import script_to_yaml
+from src.utils.pk_allocator import PKAllocator
+
+def test_failed_scripts_use_no_pks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "pk_yaml_path", "pool/pk.yaml")
+    os.makedirs("src/templates")
+    os.makedirs("pool")
+    os.makedirs("scripts")
+    with open("src/templates/labels.yaml", 'w') as f:
+        f.write(yaml_io.dumps({"labels": ["#script", "#api"]}))
+    with open("pool/pk.yaml", 'w') as f:
+        f.write(yaml_io.dumps([{"pk": f"pk{i:03d}", "used": False} for i in range(10)]))
+    for name in ("a.py", "b.py", "c.py"):
+        with open(os.path.join("scripts", name), 'w') as f:
+            f.write(f"# {name}\n")
+
+    async def analyze(script_content, labels_file_path, available_labels=None):
+        if "b.py" in script_content:
+            raise Exception("analysis failed")
+        return {"description": "d", "objective": "o", "input": "i", "output": "o", "labels": ["#script"]}
+
+    monkeypatch.setattr(script_to_yaml, "analyze_script_with_llm", analyze)
+    entries = asyncio.run(script_to_yaml.generate_yaml_from_scripts("scripts", "entries.yaml", concurrency=2))
+
+    assert [(entry["new_filename"], entry["pk"], entry["diagram_1_pk"]) for entry in entries] == [
+        ("a.py", "pk000", "pk001"), ("c.py", "pk002", "pk003"),
+    ]
+    assert PKAllocator("pool/pk.yaml").available() == 6
+    used = [item["pk"] for item in yaml_io.load_file("pool/pk.yaml") if item["used"] == "yes"]
+    assert used == ["pk000", "pk001", "pk002", "pk003"]
+
+DOCUMENTED_SCRIPT = '''"""Copies the orders export into the reporting folder.
+
+Objective: Give analysts a daily snapshot.
+"""
+import argparse
+import pandas as pd
+parser = argparse.ArgumentParser()
+parser.add_argument("--date")
+args = parser.parse_args()
+df = pd.read_csv(args.date)
+df.to_csv("orders.csv")
+'''
+
+def test_llm_is_skipped_when_static_analysis_finds_every_field(monkeypatch):
+    async def generate_text(prompt):
+        raise AssertionError("the LLM should not be called")
+
+    monkeypatch.setattr(script_to_yaml.gemini_api, "generate_text", generate_text)
+    metadata = asyncio.run(script_to_yaml.analyze_script_with_llm(
+        DOCUMENTED_SCRIPT, None, available_labels=["#data_engineering", "#script"]))
+    assert metadata["labels"] == ["#data_engineering", "#script"]
+    assert metadata["objective"] == "Give analysts a daily snapshot."
+
+def test_topic_labels_are_asked_for_when_enabled(monkeypatch):
+    prompts = []
+
+    async def generate_text(prompt):
+        prompts.append(prompt)
+        return "---\nlabels:\n  - '#reporting'\n"
+
+    monkeypatch.setattr(config, "script_llm_topic_labels", True)
+    monkeypatch.setattr(script_to_yaml.gemini_api, "generate_text", generate_text)
+    metadata = asyncio.run(script_to_yaml.analyze_script_with_llm(
+        DOCUMENTED_SCRIPT, None, available_labels=["#data_engineering", "#reporting", "#script"]))
+    assert len(prompts) == 1 and "description" not in prompts[0].split("Script content:")[0]
+    assert metadata["labels"] == ["#reporting", "#data_engineering", "#script"]
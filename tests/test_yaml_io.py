@@ -0,0 +1,62 @@
+from src.config import config
+from src.utils import yaml_io
+
+MULTI = "# catalogue\n---\nkey: a\nvalue: 1\n---\nkey: b\nvalue: 2\n---\nkey: c\nvalue: 3\n"
+
+def test_is_multi_document(tmp_path):
+    multi, single = tmp_path / "multi.yaml", tmp_path / "single.yaml"
+    multi.write_text(MULTI)
+    single.write_text("---\n- key: a\n- key: b\n")
+    assert yaml_io.is_multi_document(str(multi))
+    assert not yaml_io.is_multi_document(str(single))
+    assert not yaml_io.is_multi_document(str(tmp_path / "missing.yaml"))
+
+def test_split_documents_keeps_preamble():
+    preamble, documents = yaml_io.split_documents(MULTI)
+    assert preamble == "# catalogue\n"
+    assert documents == ["---\nkey: a\nvalue: 1\n", "---\nkey: b\nvalue: 2\n", "---\nkey: c\nvalue: 3\n"]
+
+def test_patch_documents_rewrites_only_the_updated_ones(tmp_path):
+    path = tmp_path / "multi.yaml"
+    path.write_text(MULTI.replace("value: 3", "value: 3  # hand-written"))
+    yaml_io.patch_documents(str(path), {1: {"key": "b", "value": 20}})
+    text = path.read_text()
+    assert text.startswith("# catalogue\n---\nkey: a\nvalue: 1\n")
+    assert "value: 3  # hand-written" in text
+    assert [item["value"] for item in yaml_io.iter_items(str(path))] == [1, 20, 3]
+
+def test_catalogue_save_patches_dirty_items(tmp_path):
+    path = tmp_path / "multi.yaml"
+    path.write_text(MULTI)
+    catalogue = yaml_io.Catalogue.load(str(path))
+    assert catalogue.multi_document
+    catalogue.data[2]["value"] = 30
+    catalogue.mark_dirty(catalogue.data[2])
+    catalogue.save()
+    assert path.read_text().startswith("# catalogue\n")
+    assert [item["value"] for item in yaml_io.iter_items(str(path))] == [1, 2, 30]
+
+def test_append_items_keeps_each_format(tmp_path, monkeypatch):
+    multi, single = tmp_path / "multi.yaml", tmp_path / "single.yaml"
+    multi.write_text(MULTI)
+    single.write_text("- key: a\n")
+    yaml_io.append_items(str(multi), [{"key": "d"}])
+    yaml_io.append_items(str(single), [{"key": "b"}])
+    assert [item["key"] for item in yaml_io.iter_items(str(multi))] == ["a", "b", "c", "d"]
+    assert yaml_io.load_file(str(single)) == [{"key": "a"}, {"key": "b"}]
+
+    monkeypatch.setattr(config, "yaml_multi_document", True)
+    new = tmp_path / "new.yaml"
+    yaml_io.append_items(str(new), [{"key": "a"}])
+    assert yaml_io.is_multi_document(str(new))
+
+def test_convert_round_trip(tmp_path):
+    path = tmp_path / "catalogue.yaml"
+    items = [{"key": "a"}, {"key": "b"}]
+    path.write_text(yaml_io.dumps(items))
+    yaml_io.convert(str(path), multi_document=True)
+    assert yaml_io.is_multi_document(str(path))
+    assert list(yaml_io.iter_items(str(path))) == items
+    yaml_io.convert(str(path), multi_document=False)
+    assert not yaml_io.is_multi_document(str(path))
+    assert yaml_io.load_file(str(path)) == items